@@ -1,33 +1,54 @@
+import os
+
 from flask import Flask, request, jsonify, abort
 
+from greetings import GreetingStore, SQLiteGreetingStore
+from languages import Negotiator
+
 app = Flask(__name__)
 
-greetings = {
-            'en': 'hello', 
-            'es': 'Hola', 
-            'ar': 'مرحبا',
-            'ru': 'Привет',
-            'fi': 'Hei',
-            'he': 'שלום',
-            'ja': 'こんにちは'
-            }
+# GREETINGS_DB=greetings.db keeps greetings in a SQLite file that every
+# worker process shares; otherwise they live in this process only.
+if os.environ.get('GREETINGS_DB'):
+    greetings = SQLiteGreetingStore(os.environ['GREETINGS_DB'])
+else:
+    greetings = GreetingStore()
+
+# greeting for clients whose Accept-Language matches nothing
+DEFAULT_LANG = 'en'
+negotiator = Negotiator(default=None)
+
+
+def greetings_response(snapshot):
+    # the snapshot's body was encoded once, when it was published
+    return app.response_class(snapshot.body, mimetype='application/json')
 
 @app.route('/greeting', methods=['GET'])
 def greeting_all():
-    return jsonify({'greetings': greetings})
+    return greetings_response(greetings.snapshot())
 
 @app.route('/greeting/<lang>', methods=['GET'])
 def greeting_one(lang):
-    print(lang)
-    if(lang not in greetings):
+    # lang is a language tag, matched with fallbacks ('es-MX' -> 'es'), or
+    # 'auto' to negotiate from the Accept-Language header
+    snapshot = greetings.snapshot()
+    auto = lang == 'auto'
+    if(auto):
+        header = request.headers.get('Accept-Language', '')
+        lang = negotiator.resolve(header, snapshot) or DEFAULT_LANG
+    elif(lang not in snapshot.greetings):
+        lang = negotiator.resolve(lang, snapshot)
+    if(lang not in snapshot.greetings):
         abort(404)
-    return jsonify({'greeting': greetings[lang
-    ]})
+    response = jsonify({'greeting': snapshot.greetings[lang]})
+    response.headers['Content-Language'] = lang
+    if(auto):
+        response.vary.add('Accept-Language')
+    return response
 
 @app.route('/greeting', methods=['POST'])
 def greeting_add():
     info = request.get_json()
     if('lang' not in info or 'greeting' not in info):
         abort(422)
-    greetings[info['lang']] = info['greeting']
-    return jsonify({'greetings':greetings})
+    return greetings_response(greetings.add(info['lang'], info['greeting']))
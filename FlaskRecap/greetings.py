@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------------#
+# Greeting stores.
+#
+# Readers never lock: a store publishes its greetings as an immutable
+# Snapshot and replaces the whole snapshot on every write (copy on write),
+# so a reader holds either the old one or the new one, never half of each.
+# Each snapshot carries its JSON body, encoded once when it is published.
+#
+# GreetingStore keeps greetings in process memory. SQLiteGreetingStore keeps
+# them in a SQLite file shared by every worker process; a reader notices
+# another process's write through PRAGMA data_version and reloads.
+#----------------------------------------------------------------------------#
+
+import json
+import sqlite3
+import threading
+from types import MappingProxyType
+
+DEFAULT_GREETINGS = {
+    'en': 'hello',
+    'es': 'Hola',
+    'ar': 'مرحبا',
+    'ru': 'Привет',
+    'fi': 'Hei',
+    'he': 'שלום',
+    'ja': 'こんにちは'
+}
+
+
+class Snapshot(object):
+    __slots__ = ('version', 'greetings', 'body')
+
+    def __init__(self, version, greetings):
+        self.version = version
+        self.greetings = MappingProxyType(dict(greetings))
+        # what jsonify({'greetings': ...}) sends
+        self.body = (json.dumps({'greetings': dict(greetings)},
+                                sort_keys=True, separators=(',', ':')) +
+                     '\n').encode('utf-8')
+
+
+class GreetingStore(object):
+
+    def __init__(self, greetings=DEFAULT_GREETINGS):
+        self._write_lock = threading.Lock()
+        self._snapshot = Snapshot(1, greetings)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def get(self, lang):
+        return self.snapshot().greetings.get(lang)
+
+    def add(self, lang, greeting):
+        with self._write_lock:
+            current = self._snapshot
+            greetings = dict(current.greetings)
+            greetings[lang] = greeting
+            self._snapshot = Snapshot(current.version + 1, greetings)
+            return self._snapshot
+
+
+class SQLiteGreetingStore(GreetingStore):
+
+    def __init__(self, path, greetings=DEFAULT_GREETINGS, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._snapshot = Snapshot(0, {})
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        # the first process to open the file creates and seeds it; the
+        # others wait for it to finish
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS greeting '
+                               '(lang TEXT PRIMARY KEY, greeting TEXT NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS greeting_version '
+                               '(id INTEGER PRIMARY KEY CHECK (id = 1), '
+                               'version INTEGER NOT NULL)')
+            if connection.execute('INSERT OR IGNORE INTO greeting_version '
+                                  'VALUES (1, 1)').rowcount:
+                connection.executemany('INSERT INTO greeting VALUES (?, ?)',
+                                       greetings.items())
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._reload(connection)
+
+    def _connection(self):
+        # sqlite3 connections stay in the thread that opened them
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None)
+            # safe with WAL: a power cut can lose the last writes, but never
+            # corrupts the file
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.data_version = None
+        return connection
+
+    def _reload(self, connection):
+        # greetings and version are read in one transaction, so they match
+        connection.execute('BEGIN')
+        try:
+            version = connection.execute(
+                'SELECT version FROM greeting_version').fetchone()[0]
+            if version != self._snapshot.version:
+                greetings = connection.execute(
+                    'SELECT lang, greeting FROM greeting').fetchall()
+                snapshot = Snapshot(version, greetings)
+                with self._write_lock:
+                    if snapshot.version > self._snapshot.version:
+                        self._snapshot = snapshot
+        finally:
+            connection.execute('COMMIT')
+
+    def snapshot(self):
+        # data_version changes when another connection has committed since
+        # this one last looked; reading it does not touch the tables.
+        connection = self._connection()
+        data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._local.data_version:
+            self._reload(connection)
+            self._local.data_version = data_version
+        return self._snapshot
+
+    def add(self, lang, greeting):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR REPLACE INTO greeting VALUES (?, ?)',
+                               (lang, greeting))
+            connection.execute('UPDATE greeting_version '
+                               'SET version = version + 1')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._reload(connection)
+        return self._snapshot
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------------#
+# Accept-Language negotiation.
+#
+#   negotiator = Negotiator(default='en')
+#   negotiator.resolve('es-MX,es;q=0.9,en;q=0.5', greetings.snapshot())
+#   -> 'es'
+#
+# Language ranges are tried in q order (ties keep header order). Each range
+# matches an available language exactly (case-insensitively), then by its
+# primary subtag ('pt-BR' -> 'pt'), then any regional variant of it ('zh' ->
+# 'zh-TW'); '*' takes the default. Nothing matching gives the default too,
+# unless the default is None.
+#
+# Results are memoized per header string in a bounded LRU, so a repeated
+# header costs one dict lookup. The memo belongs to one snapshot version of
+# the store and is dropped when a greeting is added.
+#----------------------------------------------------------------------------#
+
+import threading
+from collections import OrderedDict
+
+
+def parse_accept_language(header):
+    # [(range, q)], best first, lowercased, without q=0 ranges.
+    ranges = []
+    for position, item in enumerate(header.split(',')):
+        parts = item.strip().split(';')
+        tag = parts[0].strip().lower()
+        if not tag:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranges.append((-q, position, tag))
+    ranges.sort()
+    return [(tag, -q) for q, position, tag in ranges]
+
+
+def match(tag, available):
+    # available maps lowercased tags to the store's own spelling.
+    if tag in available:
+        return available[tag]
+    primary = tag.split('-', 1)[0]
+    if primary in available:
+        return available[primary]
+    for candidate in sorted(available):
+        if candidate.startswith(primary + '-'):
+            return available[candidate]
+    return None
+
+
+def negotiate(header, languages, default=None):
+    available = {lang.lower(): lang for lang in languages}
+    for tag, q in parse_accept_language(header):
+        if tag == '*':
+            return default
+        lang = match(tag, available)
+        if lang is not None:
+            return lang
+    return default
+
+
+class Negotiator(object):
+
+    def __init__(self, default='en', maxsize=1024):
+        self.default = default
+        self.maxsize = maxsize
+        self._version = None
+        self._resolved = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, header, snapshot):
+        with self._lock:
+            if self._version == snapshot.version:
+                if header in self._resolved:
+                    self._resolved.move_to_end(header)
+                    return self._resolved[header]
+            else:
+                # greetings changed; what was resolved may be wrong now
+                self._version = snapshot.version
+                self._resolved.clear()
+
+        lang = negotiate(header, snapshot.greetings, self.default)
+
+        with self._lock:
+            if self._version == snapshot.version:
+                self._resolved[header] = lang
+                if len(self._resolved) > self.maxsize:
+                    self._resolved.popitem(last=False)
+        return lang
@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import pytest
+
+from flask import jsonify
+
+from FlaskRecap import app, greetings
+from greetings import DEFAULT_GREETINGS, GreetingStore, SQLiteGreetingStore
+from languages import Negotiator, negotiate, parse_accept_language
+
+WRITERS = 4
+WRITES = 200
+READERS = 4
+
+
+class GreetingStoreTestCase(unittest.TestCase):
+    """Readers racing writers must only ever see whole snapshots."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='flaskrecap-')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stress(self, writer_stores, reader_stores):
+        # Every write adds a new language, so a whole snapshot holds exactly
+        # one more greeting per version, and its body encodes exactly its
+        # greetings.
+        done = threading.Event()
+        torn = []
+
+        def write(store, writer):
+            for i in range(WRITES):
+                store.add('w{}-{}'.format(writer, i), str(i))
+
+        def read(store):
+            seen = 0
+            while not done.is_set() or seen < 10:
+                snapshot = store.snapshot()
+                greetings = dict(snapshot.greetings)
+                if json.loads(snapshot.body)['greetings'] != greetings or \
+                        len(greetings) != len(DEFAULT_GREETINGS) + \
+                        snapshot.version - 1:
+                    torn.append(snapshot.version)
+                seen += 1
+
+        readers = [threading.Thread(target=read, args=(store,))
+                   for store in reader_stores for _ in range(READERS)]
+        writers = [threading.Thread(target=write, args=(store, n))
+                   for n, store in enumerate(writer_stores)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(torn, [])
+        for store in reader_stores:
+            snapshot = store.snapshot()
+            self.assertEqual(snapshot.version,
+                             1 + WRITES * len(writer_stores))
+            self.assertEqual(snapshot.greetings['w0-{}'.format(WRITES - 1)],
+                             str(WRITES - 1))
+
+    def test_memory_store_no_torn_reads(self):
+        store = GreetingStore()
+        self.stress([store] * WRITERS, [store])
+
+    def test_sqlite_stores_share_writes(self):
+        # two stores on one file stand in for two worker processes
+        path = os.path.join(self.directory, 'greetings.db')
+        stores = [SQLiteGreetingStore(path), SQLiteGreetingStore(path)]
+        try:
+            self.stress(stores, stores)
+        finally:
+            for store in stores:
+                store.close()
+
+    def test_sqlite_store_persists(self):
+        path = os.path.join(self.directory, 'greetings.db')
+        SQLiteGreetingStore(path).add('de', 'Hallo')
+
+        store = SQLiteGreetingStore(path)
+        self.assertEqual(store.get('de'), 'Hallo')
+        self.assertEqual(store.get('en'), 'hello')
+
+
+class LanguagesTestCase(unittest.TestCase):
+
+    def test_parse_orders_by_q(self):
+        ranges = parse_accept_language('en;q=0.5, es-MX, fr;q=0, pt-BR;q=0.9')
+
+        self.assertEqual(ranges, [('es-mx', 1.0), ('pt-br', 0.9), ('en', 0.5)])
+
+    def test_negotiate_fallbacks(self):
+        languages = ['en', 'es', 'zh-TW']
+
+        self.assertEqual(negotiate('es-MX', languages), 'es')
+        self.assertEqual(negotiate('zh', languages), 'zh-TW')
+        self.assertEqual(negotiate('de, en;q=0.1', languages), 'en')
+        self.assertEqual(negotiate('de', languages, default='en'), 'en')
+        self.assertIsNone(negotiate('de', languages))
+
+    def test_negotiator_forgets_on_new_snapshot(self):
+        store = GreetingStore()
+        negotiator = Negotiator(default=None, maxsize=2)
+
+        self.assertIsNone(negotiator.resolve('pt-BR', store.snapshot()))
+        store.add('pt', 'Olá')
+        self.assertEqual(negotiator.resolve('pt-BR', store.snapshot()), 'pt')
+
+    def test_negotiator_is_bounded(self):
+        store = GreetingStore()
+        negotiator = Negotiator(maxsize=2)
+        for header in ('es', 'ru', 'fi'):
+            negotiator.resolve(header, store.snapshot())
+
+        self.assertEqual(list(negotiator._resolved), ['ru', 'fi'])
+
+
+class FlaskRecapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client
+
+    def test_greeting_all(self):
+        res = self.client().get('/greeting')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['greetings']['es'], 'Hola')
+        with app.app_context():
+            expected = jsonify({'greetings': dict(greetings.snapshot().greetings)})
+        self.assertEqual(res.data, expected.data)
+
+    def test_greeting_add(self):
+        res = self.client().post('/greeting', json={'lang': 'pt', 'greeting': 'Olá'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['greetings']['pt'], 'Olá')
+        self.assertEqual(self.client().get('/greeting/pt').get_json(),
+                         {'greeting': 'Olá'})
+
+    def test_greeting_regional_variant(self):
+        res = self.client().get('/greeting/es-MX')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json(), {'greeting': 'Hola'})
+        self.assertEqual(res.headers['Content-Language'], 'es')
+
+    def test_greeting_accept_language(self):
+        res = self.client().get('/greeting/auto', headers={
+            'Accept-Language': 'de-CH, ru;q=0.8, en;q=0.5'})
+
+        self.assertEqual(res.get_json(), {'greeting': 'Привет'})
+        self.assertIn('Accept-Language', res.headers['Vary'])
+
+    def test_greeting_accept_language_default(self):
+        res = self.client().get('/greeting/auto', headers={'Accept-Language': 'de'})
+
+        self.assertEqual(res.get_json(), {'greeting': 'hello'})
+
+    def test_greeting_missing(self):
+        res = self.client().get('/greeting/xx')
+
+        self.assertEqual(res.status_code, 404)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,142 @@
+"""Loaders for the apps under benchmark.
+
+Each loader points the project at `database_url`, imports it, seeds a
+synthetic dataset of roughly `rows` rows and returns the app, its
+SQLAlchemy engine and the endpoints to drive. The projects share module
+names (`app`, `models`), so every app is loaded in its own process.
+"""
+import json
+import os
+import random
+
+from harness import add_to_path
+
+BATCH_SIZE = 10000
+
+
+def insert_batched(db, table, rows):
+    """executemany inserts in fixed size batches, one commit per batch."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+
+
+def load_fyyur(database_url, rows, seed=0):
+    os.environ['DATABASE_URL'] = database_url
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    from generate import generate
+
+    n_entities = max(rows // 10, 1)
+    with fyyur.app.app_context():
+        fyyur.db.drop_all()
+        fyyur.db.create_all()
+        generate(fyyur.db, (fyyur.Venue, fyyur.Artist, fyyur.Show,
+                            fyyur.Location),
+                 venues=n_entities, artists=n_entities, shows=rows,
+                 seed=seed, batch_size=BATCH_SIZE, log=lambda msg: None)
+        engine = fyyur.db.engine
+
+    endpoints = [
+        {'name': 'GET /venues', 'method': 'GET', 'path': '/venues'},
+        {'name': 'GET /artists', 'method': 'GET', 'path': '/artists'},
+        {'name': 'GET /shows', 'method': 'GET', 'path': '/shows'},
+        {'name': 'GET /venues/<id>', 'method': 'GET', 'path': '/venues/1'},
+        {'name': 'GET /artists/<id>', 'method': 'GET', 'path': '/artists/1'},
+        {'name': 'POST /venues/search', 'method': 'POST',
+         'path': '/venues/search', 'form': {'search_term': 'Blue'}},
+        {'name': 'POST /artists/search', 'method': 'POST',
+         'path': '/artists/search', 'form': {'search_term': 'Blue'}},
+    ]
+    return fyyur.app, engine, endpoints
+
+
+def load_trivia(database_url, rows, seed=0):
+    os.environ['DATABASE_URL'] = database_url
+    add_to_path('projects', '02_trivia_api', 'starter', 'backend')
+    from flaskr import create_app
+    from models import db, Question, Category
+
+    rng = random.Random(seed)
+    categories = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+                  'Sports']
+    app = create_app()
+
+    def questions():
+        for i in range(1, rows + 1):
+            yield {
+                'id': i, 'question': 'Synthetic question {}?'.format(i),
+                'answer': 'Answer {}'.format(i),
+                'category': str(rng.randint(1, len(categories))),
+                'difficulty': rng.randint(1, 5),
+            }
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        insert_batched(db, Category.__table__,
+                       ({'id': i + 1, 'type': t}
+                        for i, t in enumerate(categories)))
+        insert_batched(db, Question.__table__, questions())
+        engine = db.engine
+
+    endpoints = [
+        {'name': 'GET /categories', 'method': 'GET', 'path': '/categories'},
+        {'name': 'GET /questions', 'method': 'GET', 'path': '/questions'},
+        {'name': 'GET /questions?page=2', 'method': 'GET',
+         'path': '/questions?page=2'},
+        {'name': 'GET /categories/<id>/questions', 'method': 'GET',
+         'path': '/categories/1/questions'},
+        {'name': 'POST /questions (search)', 'method': 'POST',
+         'path': '/questions', 'json': {'searchTerm': 'question 1'}},
+        {'name': 'POST /quizzes', 'method': 'POST', 'path': '/quizzes',
+         'json': {'previous_questions': [], 'quiz_category': {'id': 0}}},
+    ]
+    return app, engine, endpoints
+
+
+def load_coffee(database_url, rows, seed=0):
+    os.environ['DATABASE_URL'] = database_url
+    add_to_path('projects', '03_coffee_shop_full_stack', 'starter_code',
+                'backend')
+    from src.api import app
+    from src.database.models import db, Drink
+
+    rng = random.Random(seed)
+    colors = ['brown', 'white', 'black', 'grey', 'tan']
+
+    def drinks():
+        for i in range(1, rows + 1):
+            recipe = [{'name': 'part {}'.format(p), 'color': rng.choice(colors),
+                       'parts': rng.randint(1, 3)} for p in range(2)]
+            yield {'id': i, 'title': 'Drink {}'.format(i),
+                   'recipe': json.dumps(recipe)}
+
+    # src.api resets the tables on import only while its
+    # db_drop_and_create_all() line is left uncommented, so reset them here
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        insert_batched(db, Drink.__table__, drinks())
+        engine = db.engine
+
+    # /drinks-detail and the write endpoints need an Auth0 token, so only the
+    # public listing is driven here.
+    endpoints = [
+        {'name': 'GET /drinks', 'method': 'GET', 'path': '/drinks'},
+    ]
+    return app, engine, endpoints
+
+
+LOADERS = {
+    'fyyur': load_fyyur,
+    'trivia': load_trivia,
+    'coffee': load_coffee,
+}
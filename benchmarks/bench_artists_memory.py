@@ -0,0 +1,114 @@
+"""Memory and time-to-first-byte of fyyur's /artists as the table grows.
+
+For every size the artist table is seeded in one process and measured in a
+fresh one, so the peak RSS reported is the request path's and not the
+seeding's:
+
+    python benchmarks/bench_artists_memory.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from harness import add_to_path, percentile
+
+URLS = ['/artists', '/artists?limit=1000']
+
+
+def seed(database_url, rows):
+    os.environ['DATABASE_URL'] = database_url
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    from generate import generate
+    with fyyur.app.app_context():
+        fyyur.db.create_all()
+        generate(fyyur.db, (fyyur.Venue, fyyur.Artist, fyyur.Show,
+                            fyyur.Location),
+                 venues=1, artists=rows, shows=0, log=lambda msg: None)
+
+
+def measure(database_url, iterations):
+    os.environ['DATABASE_URL'] = database_url
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    client = fyyur.app.test_client()
+    client.get('/artists').get_data()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results = {}
+    for url in URLS:
+        first_byte, total, peaks = [], [], []
+        for _ in range(iterations):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            response = client.get(url, buffered=False)
+            chunks = response.iter_encoded()
+            next(chunks)
+            first_byte.append(time.perf_counter() - t0)
+            for _ in chunks:
+                pass
+            total.append(time.perf_counter() - t0)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            response.close()
+        results[url] = {
+            'first_byte_ms': percentile(sorted(first_byte), 50) * 1000,
+            'total_ms': percentile(sorted(total), 50) * 1000,
+            'peak_kib': max(peaks) / 1024.0,
+        }
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    results['rss_mib'] = rss_after / 1024.0
+    results['rss_growth_mib'] = (rss_after - rss_before) / 1024.0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    parser.add_argument('--seed', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--measure', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        seed(args.database_url, args.seed)
+        return
+    if args.measure:
+        print(json.dumps(measure(args.database_url, args.iterations)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='fsnd-bench-')
+    print('{:>9} {:<20} {:>10} {:>10} {:>11} {:>9} {:>12}'.format(
+        'artists', 'url', 'ttfb ms', 'total ms', 'peak KiB', 'RSS MiB',
+        'RSS growth'))
+    for size in args.sizes:
+        database_url = 'sqlite:///' + os.path.join(
+            workdir, 'artists_{}.db'.format(size))
+        me = [sys.executable, os.path.abspath(__file__),
+              '--database-url', database_url]
+        subprocess.run(me + ['--seed', str(size)], check=True)
+        output = subprocess.run(
+            me + ['--measure', '--iterations', str(args.iterations)],
+            check=True, stdout=subprocess.PIPE).stdout
+        results = json.loads(output.decode().strip().splitlines()[-1])
+        for url in URLS:
+            r = results[url]
+            print('{:>9} {:<20} {:>10.2f} {:>10.2f} {:>11.1f} {:>9.1f} '
+                  '{:>12.1f}'.format(size, url, r['first_byte_ms'],
+                                     r['total_ms'], r['peak_kib'],
+                                     results['rss_mib'],
+                                     results['rss_growth_mib']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Concurrent-request throughput of fyyur's async JSON API against the
+current WSGI views.
+
+The WSGI views run on a threaded Werkzeug server; the API runs on uvicorn.
+Each server gets its own process, and the load comes from a pool of client
+threads in this one. The pairs compare whole request paths (the WSGI side
+also renders HTML), which is what a caller sees:
+
+    python benchmarks/bench_async_api.py --rows 10000 --concurrency 1 8 32
+
+Needs the API's extra requirements: SQLAlchemy 1.4+, asgiref, uvicorn and
+aiosqlite (or asyncpg with --database-url postgresql://...).
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from harness import QuietRequestHandler, add_to_path, percentile
+
+PAIRS = [
+    ('venue detail', '/venues/1', '/api/venues/1'),
+    ('artist detail', '/artists/1', '/api/artists/1'),
+    ('artist list', '/artists', '/api/artists'),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(kind, port):
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    if kind == 'asgi':
+        import uvicorn
+        uvicorn.run('api:application', host='127.0.0.1', port=port,
+                    log_level='warning')
+    else:
+        from werkzeug.serving import make_server
+        import app as fyyur
+        make_server('127.0.0.1', port, fyyur.app, threaded=True,
+                    request_handler=QuietRequestHandler).serve_forever()
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server on port {} did not start'.format(port))
+
+
+def load(port, path, concurrency, seconds):
+    # Every thread issues requests back to back until time runs out.
+    samples, errors = [], []
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        while time.perf_counter() < deadline:
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+            t0 = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+            finally:
+                connection.close()
+            samples.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return len(samples) / elapsed, percentile(samples, 95), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--database-url')
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'],
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='fsnd-bench-'), 'fyyur.db')
+    os.environ['DATABASE_URL'] = database_url
+    # the loader drops and reseeds the tables
+    subprocess.run([sys.executable, '-c',
+                    'from apps import load_fyyur; load_fyyur({!r}, {})'.format(
+                        database_url, args.rows)],
+                   check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    ports, servers = {}, []
+    for kind in ('wsgi', 'asgi'):
+        ports[kind] = free_port()
+        servers.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', kind,
+             '--port', str(ports[kind])], stdout=subprocess.DEVNULL))
+    try:
+        for port in ports.values():
+            wait_for(port)
+        print('{:<14} {:>5} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+            'endpoint', 'conc', 'wsgi rps', 'wsgi p95', 'asgi rps',
+            'asgi p95', 'errors'))
+        for name, wsgi_path, asgi_path in PAIRS:
+            for concurrency in args.concurrency:
+                wsgi = load(ports['wsgi'], wsgi_path, concurrency,
+                            args.seconds)
+                asgi = load(ports['asgi'], asgi_path, concurrency,
+                            args.seconds)
+                print('{:<14} {:>5} {:>10.1f} {:>8.1f}ms {:>10.1f} '
+                      '{:>8.1f}ms {:>8}'.format(
+                          name, concurrency, wsgi[0], wsgi[1] * 1000,
+                          asgi[0], asgi[1] * 1000, wsgi[2] + asgi[2]))
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Token verification throughput for BasicFlaskAuth's /images.
+
+Tokens are RS256-signed with a locally generated key and checked against
+a fake JWKS file (a file:// URL standing in for the tenant's
+/.well-known/jwks.json), so nothing touches the network. Two setups:
+
+    cached       fsnd_common.auth with the file pinned (AUTH0_JWKS_FILE): its
+                 keys are loaded once and kept parsed, so a request costs
+                 one signature check
+    per-request  the old verify_decode_jwt: fetch and parse the JWKS and
+                 build the RSA key from the JWK on every request
+
+    python benchmarks/bench_auth.py --iterations 2000
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+from urllib.request import urlopen
+
+from harness import DRIVERS, ROOT_DIR, add_to_path, format_table, run_endpoint
+
+KID = 'bench-key'
+
+
+class NoSQL:
+    # /images has no database; run_endpoint still wants a counter.
+    count = 0
+
+    def reset(self):
+        pass
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location(
+        'basic_flask_auth', os.path.join(ROOT_DIR, 'BasicFlaskAuth', 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def per_request_verify(auth, jwks_url):
+    # verify_decode_jwt as it was, against the fake JWKS.
+    from jose import jwt
+    from fsnd_common.auth import AuthError
+
+    def verify_decode_jwt(token):
+        jwks = json.loads(urlopen(jwks_url).read())
+        unverified_header = jwt.get_unverified_header(token)
+        for key in jwks['keys']:
+            if key['kid'] == unverified_header['kid']:
+                rsa_key = {'kty': key['kty'], 'kid': key['kid'],
+                           'use': key['use'], 'n': key['n'], 'e': key['e']}
+                return jwt.decode(token, rsa_key, algorithms=auth.algorithms,
+                                  audience=auth.audience, issuer=auth.issuer)
+        raise AuthError({'code': 'invalid_header',
+                         'description': 'Unable to find the appropriate key.'},
+                        400)
+    return verify_decode_jwt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    add_to_path()
+    from fsnd_common import testing
+    from fsnd_common.auth import FileJWKS
+
+    pem, jwks = testing.rsa_keys(KID)
+    path = os.path.join(tempfile.mkdtemp(prefix='fsnd-bench-'), 'jwks.json')
+    with open(path, 'w') as f:
+        json.dump(jwks, f)
+    jwks_url = 'file://' + path
+
+    basic = load_app()
+    auth = basic.auth
+    auth.keys = FileJWKS(path, auth.algorithms)
+    token = testing.mint_token(pem, KID, auth.issuer, auth.audience,
+                               ['get:image'])
+    endpoint = {'name': 'GET /images', 'method': 'GET', 'path': '/images',
+                'headers': {'Authorization': 'Bearer ' + token}}
+
+    setups = [('cached', auth.verify_decode_jwt),
+              ('per-request', per_request_verify(auth, jwks_url))]
+    results = []
+    # /images prints every payload it is given
+    with contextlib.redirect_stdout(io.StringIO()):
+        for transport, driver_class in sorted(DRIVERS.items()):
+            driver = driver_class(basic.app)
+            try:
+                for name, verify in setups:
+                    auth.verify_decode_jwt = verify
+                    result = run_endpoint(driver, NoSQL(), endpoint,
+                                          args.iterations)
+                    result['key'] = '{}:{}:{}'.format(
+                        name, transport, endpoint['name'])
+                    results.append(result)
+            finally:
+                driver.close()
+    sys.stdout.write(format_table(results) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""CORS preflight throughput for trivia: the precomputed CORS middleware
+against the old flask_cors plus after_request setup.
+
+Drives a browser-style preflight (OPTIONS with Origin and
+Access-Control-Request-*) and a simple cross-origin GET through Flask's
+test client and a real WSGI server, and prints the CORS headers each setup
+sends back:
+
+    python benchmarks/bench_cors.py --iterations 2000
+"""
+import argparse
+import os
+import tempfile
+
+from harness import DRIVERS, SQLCounter, format_table, run_endpoint
+
+ORIGIN = 'http://localhost:3000'
+ENDPOINTS = [
+    {'name': 'OPTIONS /questions (preflight)', 'method': 'OPTIONS',
+     'path': '/questions',
+     'headers': {'Origin': ORIGIN, 'Access-Control-Request-Method': 'POST',
+                 'Access-Control-Request-Headers': 'content-type'}},
+    {'name': 'GET /categories', 'method': 'GET', 'path': '/categories',
+     'headers': {'Origin': ORIGIN}},
+]
+
+
+def legacy_app(create_app):
+    # create_app() as it was: flask_cors plus an after_request hook that
+    # adds its own Allow-Headers / Allow-Methods on top.
+    from flask_cors import CORS
+    app = create_app()
+    app.wsgi_app = app.wsgi_app.wsgi_app
+    # flask_cors reads the same CORS_* config keys, which it did not have
+    for key in [key for key in app.config if key.startswith('CORS_')]:
+        del app.config[key]
+    CORS(app)
+
+    @app.after_request
+    def after_request(response):
+        response.headers.add('Access-Control-Allow-Headers',
+                             'Content-Type, Authorization')
+        response.headers.add('Access-Control-Allow-Methods',
+                             'Get, POST, PATCH, DELETE, OPTIONS')
+        return response
+    return app
+
+
+def cors_headers(app, endpoint):
+    response = app.test_client().open(
+        endpoint['path'], method=endpoint['method'],
+        headers=endpoint['headers'])
+    return response.status_code, [
+        (name, value) for name, value in response.headers.items()
+        if name.lower().startswith('access-control-')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    from apps import load_trivia
+    app, engine, _ = load_trivia(
+        args.database_url or 'sqlite:///' + os.path.join(
+            tempfile.mkdtemp(prefix='fsnd-bench-'), 'trivia.db'), 100)
+    from flaskr import create_app
+    apps = [('middleware', app), ('flask_cors', legacy_app(create_app))]
+    counter = SQLCounter(engine)
+
+    for name, setup in apps:
+        for endpoint in ENDPOINTS:
+            status, headers = cors_headers(setup, endpoint)
+            print('{} {} -> {}'.format(name, endpoint['name'], status))
+            for header in headers:
+                print('    {}: {}'.format(*header))
+    print()
+
+    results = []
+    for transport, driver_class in sorted(DRIVERS.items()):
+        for name, setup in apps:
+            driver = driver_class(setup)
+            try:
+                for endpoint in ENDPOINTS:
+                    result = run_endpoint(driver, counter, endpoint,
+                                          args.iterations)
+                    result['key'] = '{}:{}:{}'.format(
+                        name, transport, endpoint['name'])
+                    results.append(result)
+            finally:
+                driver.close()
+    print(format_table(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Time to delete a fyyur venue with many shows, through the ORM and through
+the set-based delete pipeline.
+
+Every iteration seeds a fresh venue with --shows shows and deletes it. The
+ORM mode is the old delete_venue (session.delete through the artists
+relationship); the pipeline mode is DELETE /venues/<id>. The ORM deletes
+secondary rows one (venue, artist) pair at a time and raises StaleDataError
+once an artist has more than one show at the venue, so its failures are
+counted rather than fatal:
+
+    python benchmarks/bench_delete_venue.py --shows 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from harness import SQLCounter, add_to_path, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='fsnd-bench-'), 'fyyur.db')
+    os.environ['DATABASE_URL'] = database_url
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    from generate import generate
+    db, Venue = fyyur.db, fyyur.Venue
+    client = fyyur.app.test_client()
+
+    def seed():
+        with fyyur.app.app_context():
+            generate(db, (fyyur.Venue, fyyur.Artist, fyyur.Show,
+                          fyyur.Location), venues=1,
+                     artists=args.artists, shows=args.shows,
+                     log=lambda msg: None)
+            return db.session.query(db.func.max(Venue.id)).scalar()
+
+    def orm_delete(venue_id):
+        with fyyur.app.app_context():
+            try:
+                db.session.delete(Venue.query.get(venue_id))
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                return False
+        return True
+
+    def pipeline_delete(venue_id):
+        response = client.delete('/venues/{}'.format(venue_id))
+        return response.get_json()['shows_deleted'] == args.shows
+
+    with fyyur.app.app_context():
+        db.create_all()
+        counter = SQLCounter(db.engine)
+
+    print('{:<10} {:>10} {:>10} {:>12} {:>8}'.format(
+        'mode', 'p50 ms', 'max ms', 'statements', 'failed'))
+    for mode, delete in (('orm', orm_delete), ('pipeline', pipeline_delete)):
+        timings, statements, failed = [], [], 0
+        for _ in range(args.iterations):
+            venue_id = seed()
+            counter.reset()
+            t0 = time.perf_counter()
+            if not delete(venue_id):
+                failed += 1
+            timings.append(time.perf_counter() - t0)
+            statements.append(counter.count)
+        timings.sort()
+        print('{:<10} {:>10.1f} {:>10.1f} {:>12} {:>8}'.format(
+            mode, percentile(timings, 50) * 1000, timings[-1] * 1000,
+            max(statements), failed))
+
+
+if __name__ == '__main__':
+    main()
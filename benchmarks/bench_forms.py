@@ -0,0 +1,95 @@
+"""Construct, render and validate throughput of fyyur's venue and artist
+forms against equivalent plain WTForms select fields.
+
+The plain forms rebuild their choice lists for every instance, render every
+<option> through the widget and validate with a linear scan, as fyyur's
+forms did before the choice registries:
+
+    python benchmarks/bench_forms.py --iterations 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+from harness import add_to_path
+
+from werkzeug.datastructures import MultiDict
+
+VENUE_DATA = MultiDict([
+    ('name', 'The Musical Hop'), ('city', 'San Francisco'), ('state', 'CA'),
+    ('address', '1015 Folsom Street'), ('phone', '123-123-1234'),
+    ('genres', 'Jazz'), ('genres', 'Reggae'), ('genres', 'Swing'),
+    ('seeking_talent', 'Yes'), ('seeking_description', ''),
+    ('image_link', ''), ('facebook_link', ''), ('website', ''),
+])
+
+
+def legacy_form(form_class):
+    # The same form, with every registry field swapped for a plain
+    # SelectField built from a fresh list.
+    from wtforms import SelectField, SelectMultipleField
+    attrs = {}
+    for name in dir(form_class):
+        unbound = getattr(form_class, name)
+        registry = getattr(unbound, 'kwargs', {}).get('registry')
+        if registry is None:
+            continue
+        kwargs = dict(unbound.kwargs)
+        del kwargs['registry']
+        kwargs['choices'] = [list(choice) for choice in registry.choices]
+        field = (SelectMultipleField if 'Multiple' in unbound.field_class.__name__
+                 else SelectField)
+        attrs[name] = field(*unbound.args, **kwargs)
+    return type('Legacy' + form_class.__name__, (form_class,), attrs)
+
+
+def rate(fn, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='fsnd-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir,
+                                                             'fyyur.db')
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    from forms import VenueForm, ArtistForm
+    fyyur.app.config['WTF_CSRF_ENABLED'] = False
+    # flask_wtf.Form warns about its rename on every instantiation
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    venue = fyyur.Venue(name='The Musical Hop', city='San Francisco',
+                        state='CA', address='1015 Folsom Street',
+                        genres=['Jazz', 'Reggae'], seeking_talent=True)
+
+    print('{:<8} {:<10} {:>12} {:>12} {:>8}'.format(
+        'form', 'operation', 'legacy/s', 'registry/s', 'speedup'))
+    for form_class in (VenueForm, ArtistForm):
+        forms = {'legacy': legacy_form(form_class), 'registry': form_class}
+        operations = [
+            ('construct', lambda cls: lambda: cls()),
+            ('render', lambda cls: lambda: [str(f) for f in cls()]),
+            ('edit', lambda cls: lambda: [str(f) for f in cls(obj=venue)]),
+            ('validate', lambda cls: lambda: cls(VENUE_DATA).validate()),
+        ]
+        with fyyur.app.test_request_context():
+            for name, make in operations:
+                results = {mode: rate(make(cls), args.iterations)
+                           for mode, cls in forms.items()}
+                print('{:<8} {:<10} {:>12.0f} {:>12.0f} {:>7.1f}x'.format(
+                    form_class.__name__[:-4], name, results['legacy'],
+                    results['registry'],
+                    results['registry'] / results['legacy']))
+
+
+if __name__ == '__main__':
+    main()
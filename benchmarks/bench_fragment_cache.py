@@ -0,0 +1,67 @@
+"""Template render time of fyyur listing pages with and without the
+fragment cache.
+
+Render time is measured between Flask's before_render_template and
+template_rendered signals, so the view's queries are not included:
+
+    python benchmarks/bench_fragment_cache.py --rows 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import before_render_template, template_rendered
+
+from harness import percentile
+from apps import load_fyyur
+
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='fsnd-bench-')
+    database_url = 'sqlite:///' + os.path.join(workdir, 'fyyur.db')
+    app, engine, endpoints = load_fyyur(database_url, args.rows)
+    cache = app.extensions['fragment_cache']
+    client = app.test_client()
+
+    timings = []
+    started = {}
+
+    def on_before(sender, template, context, **extra):
+        started['t'] = time.perf_counter()
+
+    def on_rendered(sender, template, context, **extra):
+        timings.append(time.perf_counter() - started['t'])
+
+    before_render_template.connect(on_before, app)
+    template_rendered.connect(on_rendered, app)
+
+    print('{:<12} {:>12} {:>12} {:>8} {:>9}'.format(
+        'page', 'nocache p50', 'warm p50', 'speedup', 'hit ratio'))
+    for page in PAGES:
+        results = {}
+        for mode in ('nocache', 'warm'):
+            app.jinja_env.fragment_cache = None if mode == 'nocache' else cache
+            cache.clear()
+            client.get(page).get_data()
+            cache.reset_stats()
+            del timings[:]
+            for _ in range(args.iterations):
+                client.get(page).get_data()
+            results[mode] = percentile(sorted(timings), 50)
+        ratios = [s['ratio'] for s in cache.stats().values()]
+        print('{:<12} {:>10.2f}ms {:>10.2f}ms {:>7.1f}x {:>9.2f}'.format(
+            page, results['nocache'] * 1000, results['warm'] * 1000,
+            results['nocache'] / results['warm'],
+            min(ratios) if ratios else 0.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Genre facet counts for fyyur artists: one aggregate query against the
+in-memory bitmap index.
+
+    python benchmarks/bench_genre_facets.py --artists 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from harness import add_to_path, percentile
+
+SELECTIONS = [(), ('Jazz',), ('Jazz', 'Blues'), ('Rock n Roll', 'Punk', 'Pop')]
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return percentile(samples, 50), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + \
+        os.path.join(tempfile.mkdtemp(prefix='fsnd-bench-'), 'fyyur.db')
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    from generate import generate
+    from genres import GenreIndex, genre_counts
+    db = fyyur.db
+
+    with fyyur.app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(db, (fyyur.Venue, fyyur.Artist, fyyur.Show,
+                      fyyur.Location), venues=1,
+                 artists=args.artists, shows=0, log=lambda msg: None)
+        index = GenreIndex()
+        t0 = time.perf_counter()
+        index.load(db.session.query(fyyur.Artist.id, fyyur.Artist.genres))
+        print('index loaded in {:.1f}ms'.format(
+            (time.perf_counter() - t0) * 1000))
+
+        print('{:<32} {:>12} {:>12} {:>9}'.format(
+            'selected genres', 'sql', 'bitmap', 'speedup'))
+        for selection in SELECTIONS:
+            sql, expected = timed(
+                lambda: genre_counts(db, 'artist', selection), args.iterations)
+            bitmap, counts = timed(
+                lambda: index.counts(selection), args.iterations * 100)
+            assert counts == expected
+            print('{:<32} {:>10.1f}ms {:>10.1f}us {:>8.0f}x'.format(
+                ', '.join(selection) or '(none)', sql * 1000,
+                bitmap * 1000000, sql / bitmap))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Fyyur area listing and city lookups over the location index.
+
+Seeds --venues venues across --cities cities and times the full /venues
+area listing, one city's listing, the same city lookup on the unindexed
+venue.city / venue.state strings it replaced, and a "near me" search:
+
+    python benchmarks/bench_locations.py --venues 100000 --cities 20000
+
+--legacy also times the old listing (two queries per city plus one per
+venue); expect minutes at the default sizes.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from harness import SQLCounter, add_to_path, percentile
+
+
+def legacy_listing(fyyur):
+    # venues() before the location table, minus the rendering.
+    Venue, Show, db = fyyur.Venue, fyyur.Show, fyyur.db
+    data = []
+    for city in db.session.query(Venue.city).group_by('city').all():
+        example = Venue.query.filter_by(city=city.city).first()
+        venues = []
+        for venue in Venue.query.filter_by(city=city.city).all():
+            venues.append({
+                'id': venue.id, 'name': venue.name,
+                'num_upcoming_shows': Show.query.filter_by(
+                    venue_id=venue.id).filter(
+                        Show.start_time >= datetime.now()).count()})
+        data.append({'city': example.city, 'state': example.state,
+                     'venues': venues})
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=100000)
+    parser.add_argument('--cities', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--legacy', action='store_true')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + \
+        os.path.join(tempfile.mkdtemp(prefix='fsnd-bench-'), 'fyyur.db')
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    import app as fyyur
+    from generate import generate, city_pool
+    db, Venue = fyyur.db, fyyur.Venue
+    # a mid-table city: the head of the pool holds most of the venues
+    city, state, latitude, longitude = city_pool(args.cities)[
+        args.cities // 2]
+
+    with fyyur.app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(db, (fyyur.Venue, fyyur.Artist, fyyur.Show,
+                      fyyur.Location), venues=args.venues, artists=1000,
+                 shows=args.shows, cities=args.cities, log=print)
+        counter = SQLCounter(db.engine)
+    client = fyyur.app.test_client()
+
+    def unindexed_city():
+        with fyyur.app.app_context():
+            return db.session.query(Venue.id, Venue.name).filter(
+                Venue.state == state, Venue.city == city).all()
+
+    def legacy():
+        with fyyur.app.app_context():
+            legacy_listing(fyyur)
+
+    cases = [
+        ('/venues (all areas)', lambda: client.get('/venues').get_data()),
+        ('/venues?state&city', lambda: client.get(
+            '/venues', query_string={'state': state, 'city': city}
+        ).get_data()),
+        ('city on venue strings', unindexed_city),
+        ('/venues/near 50km', lambda: client.get(
+            '/venues/near', query_string={'lat': latitude, 'lng': longitude}
+        ).get_data()),
+    ]
+    if args.legacy:
+        cases.append(('legacy listing', legacy))
+
+    print('{:<24} {:>10} {:>10} {:>12}'.format(
+        'case', 'p50 ms', 'max ms', 'statements'))
+    for name, fn in cases:
+        fn()
+        samples = []
+        iterations = 1 if fn is legacy else args.iterations
+        for _ in range(iterations):
+            counter.reset()
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+        samples.sort()
+        print('{:<24} {:>10.1f} {:>10.1f} {:>12}'.format(
+            name, percentile(samples, 50) * 1000, samples[-1] * 1000,
+            counter.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Time a request thread spends logging, inline file handler vs. log queue.
+
+Several threads each log a run of info lines and one error with a
+traceback, as request handlers do. The `inline` setup is Fyyur's old
+error.log handler: a FileHandler with a text Formatter, written by the
+logging thread itself. The `queue` setup is fsnd_common.logs: the thread
+only enqueues, and a listener thread writes JSON lines to a rotating file.
+--slow-ms makes every write sleep, standing in for a slow or busy disk:
+
+    python benchmarks/bench_logging.py --threads 8 --lines 2000 --slow-ms 0.2
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from harness import add_to_path, percentile
+
+
+def slow_down(handler, delay):
+    emit = handler.emit
+
+    def slow_emit(record):
+        time.sleep(delay)
+        emit(record)
+    if delay:
+        handler.emit = slow_emit
+
+
+def inline(path, delay):
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+    slow_down(handler, delay)
+    return handler, handler.close
+
+
+def queued(path, delay):
+    from fsnd_common.logs import JSONFormatter, LogPipeline
+    target = RotatingFileHandler(path, maxBytes=10 * 1024 * 1024, backupCount=2)
+    target.setFormatter(JSONFormatter())
+    slow_down(target, delay)
+    pipeline = LogPipeline([target], queue_size=100000)
+
+    def close():
+        pipeline.stop()
+        target.close()
+    return pipeline.handler, close
+
+
+def run(setup, threads, lines, delay, directory):
+    logger = logging.getLogger('bench_logging.' + setup.__name__)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler, close = setup(os.path.join(directory, setup.__name__ + '.log'), delay)
+    logger.addHandler(handler)
+    timings = []
+
+    def work():
+        own = []
+        for i in range(lines):
+            started = time.perf_counter()
+            if i % 100 == 99:
+                try:
+                    raise ValueError(i)
+                except ValueError:
+                    logger.exception('database error')
+            else:
+                logger.info('GET /venues/%d 200', i)
+            own.append(time.perf_counter() - started)
+        timings.extend(own)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    logged = time.perf_counter() - started
+    close()
+    written = time.perf_counter() - started
+    logger.removeHandler(handler)
+
+    p99 = percentile(sorted(timings), 99)
+    print('{:<8} {:>12.1f} {:>12.1f} {:>10.0f} {:>10.0f}'.format(
+        setup.__name__, sum(timings) / len(timings) * 1e6, p99 * 1e6,
+        logged * 1000, written * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--slow-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    add_to_path('.')
+    directory = tempfile.mkdtemp()
+    try:
+        print('{:<8} {:>12} {:>12} {:>10} {:>10}'.format(
+            'setup', 'mean us', 'p99 us', 'logged ms', 'written ms'))
+        for setup in (inline, queued):
+            run(setup, args.threads, args.lines, args.slow_ms / 1000.0, directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
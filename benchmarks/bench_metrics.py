@@ -0,0 +1,84 @@
+"""Cost of recording metrics with fsnd_common.metrics.
+
+Times Histogram.observe() from 1 and 8 threads, against the same
+histogram kept in one list behind a lock, and then the requests per second
+Flask's test client gets from a one-route app with and without
+init_metrics():
+
+    python benchmarks/bench_metrics.py --observations 200000 --requests 20000
+"""
+import argparse
+import threading
+import time
+from bisect import bisect_left
+
+from harness import add_to_path
+
+
+class LockedHistogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.values = [0.0] * (len(buckets) + 3)
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            self.values[bisect_left(self.buckets, value)] += 1
+            self.values[-2] += value
+            self.values[-1] += 1
+
+
+def time_observe(histogram, threads, observations):
+    per_thread = observations // threads
+
+    def work():
+        observe = histogram.observe
+        for i in range(per_thread):
+            observe(('index',), (i % 100) / 1000.0)
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (per_thread * threads) * 1e9
+
+
+def requests_per_second(app, requests):
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/')
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--observations', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    add_to_path('.')
+    from flask import Flask
+    from fsnd_common.metrics import LATENCY_BUCKETS, Histogram, Registry, init_metrics
+
+    print('{:<24} {:>8} {:>12}'.format('observe()', 'threads', 'ns/call'))
+    for threads in (1, 8):
+        sharded = Histogram('bench_seconds', 'Bench.', ('endpoint',), registry=Registry())
+        locked = LockedHistogram(LATENCY_BUCKETS)
+        for name, histogram in (('per-thread shards', sharded), ('one list + lock', locked)):
+            print('{:<24} {:>8} {:>12.0f}'.format(
+                name, threads, time_observe(histogram, threads, args.observations)))
+
+    print('\n{:<24} {:>12}'.format('GET / (test client)', 'requests/s'))
+    for name, instrumented in (('without metrics', False), ('with metrics', True)):
+        app = Flask(name.replace(' ', '_'))
+        app.add_url_rule('/', 'index', lambda: 'ok')
+        if instrumented:
+            init_metrics(app, database=False)
+        print('{:<24} {:>12,.0f}'.format(name, requests_per_second(app, args.requests)))
+
+
+if __name__ == '__main__':
+    main()
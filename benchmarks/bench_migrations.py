@@ -0,0 +1,175 @@
+"""How long a migration keeps a big table from taking writes.
+
+Generates a show table of --rows rows, then runs three migration steps on
+it, each as its own migration transaction: backfill a new column, make it
+NOT NULL, and index it. The `plain` run uses op.execute/alter_column/
+create_index as autogenerate writes them; the `online` run uses Fyyur's
+online_migrations helpers. Meanwhile a probe thread updates one random row
+every 10ms on a connection of its own; the longest any probe write waited
+is the step's lock time:
+
+    python benchmarks/bench_migrations.py --rows 500000 --pause-ms 20
+    python benchmarks/bench_migrations.py --database-url postgresql://localhost/bench
+
+Without --database-url it runs on a temporary SQLite file. SQLite locks the
+whole database for every write and its busy handler polls, so there only
+the backfill changes: the probe gets in between batches (given a pause)
+rather than after the whole UPDATE, and each batch pays for a commit. On
+PostgreSQL a batch locks only its own rows, and the online DDL holds its
+strong locks for moments rather than for a scan of the table.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from harness import add_to_path, percentile
+
+
+class Probe(object):
+    # one-row writes against the table while a step runs
+
+    def __init__(self, engine, rows, every=0.01):
+        self.engine = engine
+        self.rows = rows
+        self.every = every
+        self.waits = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        from sqlalchemy import text
+        update = text('UPDATE bench_show SET artist_id = artist_id '
+                      'WHERE venue_id = :venue_id AND artist_id = :artist_id '
+                      'AND start_time = :start_time')
+        with self.engine.connect() as connection:
+            while not self.stopped.is_set():
+                venue_id, artist_id, start_time = key(random.randrange(self.rows))
+                started = time.perf_counter()
+                connection.execute(update, venue_id=venue_id, artist_id=artist_id,
+                                   start_time=start_time)
+                self.waits.append(time.perf_counter() - started)
+                self.stopped.wait(self.every)
+
+    def __enter__(self):
+        self.thread.start()
+        # let it take its first write before the step starts
+        time.sleep(self.every * 2)
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def key(n):
+    # 100 venues x 100 artists x as many days as it takes
+    return n % 100, n // 100 % 100, 'day {:06d}'.format(n // 10000)
+
+
+def create_table(engine, rows):
+    from sqlalchemy import text
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE IF EXISTS bench_show'))
+        connection.execute(text(
+            'CREATE TABLE bench_show (venue_id INTEGER NOT NULL, artist_id INTEGER NOT NULL, '
+            'start_time VARCHAR(20) NOT NULL, ends_at VARCHAR(30), '
+            'PRIMARY KEY (venue_id, artist_id, start_time))'))
+        insert = text('INSERT INTO bench_show (venue_id, artist_id, start_time) '
+                      'VALUES (:venue_id, :artist_id, :start_time)')
+        for start in range(0, rows, 50000):
+            connection.execute(insert, [
+                dict(zip(('venue_id', 'artist_id', 'start_time'), key(n)))
+                for n in range(start, min(start + 50000, rows))])
+        if engine.dialect.name == 'postgresql':
+            connection.execute(text('ANALYZE bench_show'))
+
+
+def plain_steps(op):
+    from sqlalchemy import String
+
+    def not_null():
+        # batch mode rebuilds the table on SQLite; elsewhere it is one ALTER
+        with op.batch_alter_table('bench_show') as batch:
+            batch.alter_column('ends_at', existing_type=String(30), nullable=False)
+    return (
+        ('backfill', lambda: op.execute(
+            "UPDATE bench_show SET ends_at = start_time || ' 23:00'")),
+        ('not null', not_null),
+        ('index', lambda: op.create_index('ix_bench_show_ends_at', 'bench_show', ['ends_at'])),
+    )
+
+
+def online_steps(op, batch_size, pause):
+    import online_migrations
+    return (
+        ('backfill', lambda: online_migrations.backfill(
+            'bench_show', "ends_at = start_time || ' 23:00'", where='ends_at IS NULL',
+            key=('venue_id', 'artist_id', 'start_time'), batch_size=batch_size,
+            pause=pause)),
+        ('not null', lambda: online_migrations.set_not_null('bench_show', 'ends_at')),
+        ('index', lambda: online_migrations.create_index(
+            'ix_bench_show_ends_at', 'bench_show', ['ends_at'])),
+    )
+
+
+def run(name, engine, rows, batch_size, pause):
+    from alembic import op
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    create_table(engine, rows)
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        with Operations.context(context):
+            steps = plain_steps(op) if name == 'plain' else online_steps(op, batch_size, pause)
+            for step, migrate in steps:
+                with Probe(engine, rows) as probe:
+                    started = time.perf_counter()
+                    with context.begin_transaction():
+                        migrate()
+                    took = time.perf_counter() - started
+                waits = sorted(probe.waits)
+                print('{:<8} {:<10} {:>10.0f} {:>8} {:>12.1f} {:>12.1f}'.format(
+                    name, step, took * 1000, len(waits),
+                    percentile(waits, 99) * 1000, waits[-1] * 1000 if waits else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--pause-ms', type=float, default=0.0,
+                        help='sleep between backfill batches')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    add_to_path('projects', '01_fyyur', 'starter_code')
+    from sqlalchemy import create_engine
+
+    directory = None
+    url = args.database_url
+    if not url:
+        directory = tempfile.mkdtemp()
+        url = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    # the probe waits for locks instead of failing on them
+    connect_args = {'timeout': 600} if url.startswith('sqlite') else {}
+    engine = create_engine(url, connect_args=connect_args)
+    try:
+        print('{:<8} {:<10} {:>10} {:>8} {:>12} {:>12}'.format(
+            'run', 'step', 'step ms', 'probes', 'p99 wait ms', 'lock ms'))
+        for name in ('plain', 'online'):
+            run(name, engine, args.rows, args.batch_size, args.pause_ms / 1000.0)
+    finally:
+        with engine.begin() as connection:
+            connection.execute('DROP TABLE IF EXISTS bench_show')
+        engine.dispose()
+        if directory:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Accept-Language negotiation throughput for FlaskRecap greetings.
+
+Resolves a rotating mix of real-world Accept-Language headers against the
+greeting store, first with direct resolve() calls and then through
+GET /greeting/auto on Flask's test client, with the negotiator's LRU on
+and off (maxsize 0):
+
+    python benchmarks/bench_negotiation.py --requests 100000
+"""
+import argparse
+import itertools
+import time
+
+from harness import add_to_path
+
+HEADERS = [
+    'en-US,en;q=0.9',
+    'es-MX,es;q=0.9,en;q=0.8',
+    'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'ja-JP,ja;q=0.9',
+    'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'de-DE,de;q=0.9,en;q=0.8',
+    'fr-CA,fr;q=0.9,en;q=0.5',
+    'he-IL,he;q=0.9,en-US;q=0.8',
+    'fi-FI,fi;q=0.9,sv;q=0.8,en;q=0.7',
+    'ar-EG,ar;q=0.9,en;q=0.8',
+    'zh-CN,zh;q=0.9',
+    '*',
+]
+
+
+def per_second(count, elapsed):
+    return '{:>12,.0f}/s'.format(count / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+
+    add_to_path('FlaskRecap')
+    import FlaskRecap
+    from languages import Negotiator
+
+    snapshot = FlaskRecap.greetings.snapshot()
+    for name, maxsize in (('lru', 1024), ('no cache', 0)):
+        negotiator = Negotiator(default=None, maxsize=maxsize)
+        headers = itertools.cycle(HEADERS)
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            negotiator.resolve(next(headers), snapshot)
+        print('resolve()          {:<9}{}'.format(
+            name, per_second(args.requests, time.perf_counter() - started)))
+
+        FlaskRecap.negotiator = negotiator
+        client = FlaskRecap.app.test_client()
+        headers = itertools.cycle(HEADERS)
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            response = client.get('/greeting/auto',
+                                  headers={'Accept-Language': next(headers)})
+            errors += response.status_code != 200
+        print('GET /greeting/auto {:<9}{}  errors {}'.format(
+            name, per_second(args.requests, time.perf_counter() - started),
+            errors))
+
+
+if __name__ == '__main__':
+    main()
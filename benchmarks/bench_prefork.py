@@ -0,0 +1,134 @@
+"""Per-worker cold start and first-request latency for trivia, built per
+worker against forked from a preloaded, warmed-up master.
+
+    cold     every worker is a fresh process that imports flaskr and calls
+             create_app() (which runs create_all), as before
+    preload  wsgi.py builds and warms the app once, then each worker is
+             os.fork()ed from it and resets its engine pool, which is what
+             gunicorn does with preload_app
+
+"ready" is the time from process start (cold) or fork (preload) until the
+worker can serve; the requests are GET /questions through the test client:
+
+    python benchmarks/bench_prefork.py --rows 10000 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import percentile
+
+BACKEND = ('projects', '02_trivia_api', 'starter', 'backend')
+
+
+def requests(app):
+    # latency of the first and the second GET /questions
+    client = app.test_client()
+    timings = []
+    for _ in range(2):
+        t0 = time.perf_counter()
+        response = client.get('/questions')
+        response.get_data()
+        assert response.status_code == 200, response.status_code
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def cold_worker(started):
+    from harness import add_to_path
+    add_to_path(*BACKEND)
+    from flaskr import create_app
+    app = create_app()
+    ready = time.perf_counter() - started
+    print(json.dumps([ready] + requests(app)))
+
+
+def preload_workers(workers):
+    from harness import add_to_path
+    add_to_path(*BACKEND)
+    import wsgi
+    from fsnd_common.prefork import dispose_after_fork
+    results = [wsgi.boot_seconds]
+    for _ in range(workers):
+        read_end, write_end = os.pipe()
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            dispose_after_fork(wsgi.engine)
+            ready = time.perf_counter() - forked_at
+            with os.fdopen(write_end, 'w') as f:
+                f.write(json.dumps([ready] + requests(wsgi.app)))
+            os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as f:
+            results.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    print(json.dumps(results))
+
+
+def report(mode, workers):
+    readies = sorted(w[0] for w in workers)
+    firsts = sorted(w[1] for w in workers)
+    seconds = sorted(w[2] for w in workers)
+    print('{:<8} {:>8} {:>11.1f} {:>11.1f} {:>11.1f} {:>11.2f}'.format(
+        mode, len(workers), percentile(readies, 50) * 1000,
+        readies[-1] * 1000, percentile(firsts, 50) * 1000,
+        percentile(seconds, 50) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--database-url')
+    parser.add_argument('--child', choices=['cold', 'preload'],
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == 'cold':
+        cold_worker(float(os.environ['BENCH_STARTED']))
+        return
+    if args.child == 'preload':
+        preload_workers(args.workers)
+        return
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='fsnd-bench-'), 'trivia.db')
+    os.environ['DATABASE_URL'] = database_url
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, '-c',
+                    'from apps import load_trivia; load_trivia({!r}, {})'
+                    .format(database_url, args.rows)], check=True, cwd=here)
+
+    def child(mode, env=None):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode,
+             '--workers', str(args.workers)], check=True, cwd=here,
+            stdout=subprocess.PIPE, env=dict(os.environ, **(env or {}))
+        ).stdout.decode()
+        # the result is the last line printed
+        return json.loads(output.strip().splitlines()[-1])
+
+    cold = []
+    for _ in range(args.workers):
+        # perf_counter is CLOCK_MONOTONIC, so it is comparable across
+        # processes; this includes interpreter start-up
+        cold.append(child('cold', {'BENCH_STARTED': str(time.perf_counter())}))
+    preload = child('preload')
+
+    print('preloaded master built and warmed up in {:.1f}ms'.format(
+        preload[0] * 1000))
+    print('{:<8} {:>8} {:>11} {:>11} {:>11} {:>11}'.format(
+        'mode', 'workers', 'ready ms', 'ready max', '1st req ms',
+        '2nd req ms'))
+    report('cold', cold)
+    report('preload', preload[1:])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Bytes on the wire and CPU per request for trivia /questions and coffee
+shop /drinks-detail.
+
+Every endpoint is driven in three modes, each with the client accepting
+no compression, gzip and (when the brotli module is installed) brotli:
+
+    flask     stdlib json, uncompressed, rebuilt on every request (as before)
+    compress  fastest installed encoder, compressed on every request
+    cached    pre-encoded body and compressed variants from the response cache
+
+    python benchmarks/bench_responses.py --rows 1000 --requests 500
+
+/drinks-detail needs an Auth0 token, so token verification is replaced by
+a stub that grants get:drinks-detail.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import ROOT_DIR, add_to_path
+
+MODES = [
+    ('flask', {'JSON_ENCODER': 'json', 'COMPRESS_MIN_SIZE': None,
+               'RESPONSE_CACHE': False}),
+    ('compress', {'JSON_ENCODER': 'auto', 'COMPRESS_MIN_SIZE': 1024,
+                  'RESPONSE_CACHE': False}),
+    ('cached', {'JSON_ENCODER': 'auto', 'COMPRESS_MIN_SIZE': 1024,
+                'RESPONSE_CACHE': True}),
+]
+
+
+def load(app_name, database_url, rows):
+    from apps import load_coffee, load_trivia
+    if app_name == 'trivia':
+        app, _, _ = load_trivia(database_url, rows)
+        return app, '/questions', {}
+    app, _, _ = load_coffee(database_url, rows)
+    from src.auth import auth
+    auth.auth.verify_decode_jwt = lambda token: {
+        'permissions': ['get:drinks-detail']}
+    return app, '/drinks-detail', {'Authorization': 'Bearer bench'}
+
+
+def wire_bytes(response):
+    head = sum(len(key) + len(value) + 4 for key, value in
+               response.headers.items())
+    return head + len(response.get_data())
+
+
+def measure(app_name, database_url, rows, requests):
+    add_to_path()
+    app, path, headers = load(app_name, database_url, rows)
+    from fsnd_common.responses import ENCODERS, ENCODINGS
+    client = app.test_client()
+    encodings = ('identity',) + ENCODINGS
+
+    for mode, config in MODES:
+        app.config.update(config)
+        app.extensions['response_cache'].clear()
+        for encoding in encodings:
+            request_headers = dict(headers, **{'Accept-Encoding': encoding})
+            response = client.get(path, headers=request_headers)
+            assert response.status_code == 200, response.status_code
+            size = wire_bytes(response)
+            t0 = time.process_time()
+            for _ in range(requests):
+                client.get(path, headers=request_headers).get_data()
+            cpu = (time.process_time() - t0) / requests
+            print('{:<8} {:<14} {:<9} {:<9} {:>12} {:>10.0f}'.format(
+                app_name, path, mode, encoding, size, cpu * 1000000))
+    print('(encoder for "auto": {})'.format(
+        'orjson' if 'orjson' in ENCODERS else 'json'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--app', choices=['trivia', 'coffee'], nargs='+',
+                        default=['trivia', 'coffee'])
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    if len(args.app) == 1:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(
+            tempfile.mkdtemp(prefix='fsnd-bench-'), args.app[0] + '.db')
+        measure(args.app[0], database_url, args.rows, args.requests)
+        return
+
+    print('{:<8} {:<14} {:<9} {:<9} {:>12} {:>10}'.format(
+        'app', 'endpoint', 'mode', 'accept', 'wire bytes', 'cpu us'))
+    sys.stdout.flush()
+    # both apps read DATABASE_URL at import time, so each gets its own
+    # process
+    for app_name in args.app:
+        command = [sys.executable, os.path.abspath(__file__), '--app',
+                   app_name, '--rows', str(args.rows), '--requests',
+                   str(args.requests)]
+        if args.database_url:
+            command += ['--database-url', args.database_url]
+        subprocess.run(command, check=True, cwd=ROOT_DIR)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Shared helpers for the endpoint benchmarks.
+
+Latency statistics, SQL statement counting, the two request drivers
+(Flask's test client and a real WSGI server on localhost) and the
+baseline comparison used to catch regressions.
+"""
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from sqlalchemy import event
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def add_to_path(*parts):
+    """Puts a project directory on sys.path so its modules import by name."""
+    path = os.path.join(ROOT_DIR, *parts)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return path
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class SQLCounter:
+    """Counts statements issued on an engine between two reset() calls."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context,
+                    executemany):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+class ClientDriver:
+    """Drives the app in-process through Flask's test client."""
+    name = 'client'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        try:
+            response = self.client.open(path, method=method, json=json_body,
+                                        data=form, headers=headers)
+        except Exception:
+            # Apps running with DEBUG propagate errors instead of a 500.
+            return 500
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class WSGIServerDriver:
+    """Serves the app on a real socket and talks to it over HTTP."""
+    name = 'wsgi'
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True,
+                                  request_handler=QuietRequestHandler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        body = None
+        headers = dict(headers or {})
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+DRIVERS = {
+    'client': ClientDriver,
+    'wsgi': WSGIServerDriver,
+}
+
+
+def run_endpoint(driver, counter, endpoint, iterations, warmup=3,
+                 max_seconds=30.0):
+    """Times one endpoint and returns its summary.
+
+    Stops early once `max_seconds` is spent so that pathological endpoints
+    still report how far they got instead of hanging the run.
+    """
+    kwargs = {
+        'json_body': endpoint.get('json'),
+        'form': endpoint.get('form'),
+        'headers': endpoint.get('headers'),
+    }
+    for _ in range(warmup):
+        driver.request(endpoint['method'], endpoint['path'], **kwargs)
+
+    samples = []
+    errors = 0
+    counter.reset()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        status = driver.request(endpoint['method'], endpoint['path'], **kwargs)
+        samples.append(time.perf_counter() - t0)
+        if status >= 400:
+            errors += 1
+        if time.perf_counter() - started > max_seconds:
+            break
+    elapsed = time.perf_counter() - started
+
+    samples.sort()
+    return {
+        'endpoint': endpoint['name'],
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'sql_per_request': round(counter.count / float(len(samples)), 2),
+    }
+
+
+def result_key(app_name, rows, transport, endpoint):
+    return '{}:{}:{}:{}'.format(app_name, rows, transport, endpoint)
+
+
+def load_baseline(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    baseline = load_baseline(path)
+    for result in results:
+        baseline[result['key']] = result
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Returns a list of human readable regressions against the baseline.
+
+    Latency regresses when p95 grows by more than `tolerance`; the SQL count
+    is deterministic, so any increase there is flagged.
+    """
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['key'])
+        if previous is None:
+            continue
+        if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {}ms -> {}ms'.format(
+                result['key'], previous['p95_ms'], result['p95_ms']))
+        if result['sql_per_request'] > previous['sql_per_request']:
+            regressions.append('{}: SQL/request {} -> {}'.format(
+                result['key'], previous['sql_per_request'],
+                result['sql_per_request']))
+        if result['errors'] > previous['errors']:
+            regressions.append('{}: errors {} -> {}'.format(
+                result['key'], previous['errors'], result['errors']))
+    return regressions
+
+
+def format_table(results):
+    header = ('endpoint', 'req', 'err', 'p50 ms', 'p95 ms', 'p99 ms',
+              'req/s', 'sql/req')
+    rows = [header]
+    for r in results:
+        rows.append((r['key'], str(r['requests']), str(r['errors']),
+                     str(r['p50_ms']), str(r['p95_ms']), str(r['p99_ms']),
+                     str(r['throughput_rps']), str(r['sql_per_request'])))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(widths[i])
+                               for i, cell in enumerate(row)) for row in rows)
@@ -0,0 +1,120 @@
+"""Endpoint latency benchmark for fyyur, trivia and the coffee shop.
+
+Seeds each app with synthetic data, drives its endpoints through the Flask
+test client and/or a real WSGI server, and reports p50/p95/p99 latency,
+throughput and SQL statements per request. Results can be stored as a
+baseline and later runs compared against it:
+
+    python benchmarks/run.py --rows 1000 --save-baseline
+    python benchmarks/run.py --rows 1000 --compare
+
+Every app runs in its own subprocess since the projects share module names.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from harness import (DRIVERS, SQLCounter, compare, format_table,
+                     load_baseline, result_key, run_endpoint, save_baseline)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+APPS = ['fyyur', 'trivia', 'coffee']
+
+
+def run_app(args):
+    """Benchmarks a single app in this process and writes JSON results."""
+    from apps import LOADERS
+
+    # an access line per request would be timed along with the endpoint
+    os.environ['LOG_REQUESTS'] = '0'
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///{}'.format(
+            os.path.join(args.workdir, 'bench_{}.db'.format(args.app)))
+    app, engine, endpoints = LOADERS[args.app](database_url, args.rows,
+                                               seed=args.seed)
+    counter = SQLCounter(engine)
+
+    results = []
+    for transport in args.transport:
+        driver = DRIVERS[transport](app)
+        try:
+            for endpoint in endpoints:
+                result = run_endpoint(driver, counter, endpoint,
+                                      args.iterations,
+                                      max_seconds=args.max_seconds)
+                result['key'] = result_key(args.app, args.rows, transport,
+                                           endpoint['name'])
+                results.append(result)
+        finally:
+            driver.close()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', choices=APPS + ['all'], default='all')
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='rows in the largest table (e.g. 1000, 100000, '
+                             '1000000)')
+    parser.add_argument('--transport', nargs='+', choices=sorted(DRIVERS),
+                        default=['client', 'wsgi'])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--max-seconds', type=float, default=30.0,
+                        help='time budget per endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url',
+                        help='defaults to a throwaway SQLite file per app; '
+                             'point at a local Postgres to compare')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative p95 growth before failing')
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.output:
+        run_app(args)
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix='fsnd-bench-')
+    apps = APPS if args.app == 'all' else [args.app]
+    results = []
+    for name in apps:
+        output = os.path.join(workdir, '{}.json'.format(name))
+        cmd = [sys.executable, os.path.abspath(__file__), '--app', name,
+               '--rows', str(args.rows), '--iterations', str(args.iterations),
+               '--max-seconds', str(args.max_seconds),
+               '--seed', str(args.seed), '--output', output,
+               '--workdir', workdir, '--transport'] + args.transport
+        if args.database_url:
+            cmd += ['--database-url', args.database_url]
+        subprocess.run(cmd, check=True, cwd=HERE)
+        with open(output) as f:
+            results.extend(json.load(f))
+
+    print(format_table(results))
+
+    status = 0
+    if args.compare:
+        regressions = compare(results, load_baseline(args.baseline),
+                              args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        status = 1 if regressions else 0
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print('baseline written to {}'.format(args.baseline))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+#----------------------------------------------------------------------------#
+# Helpers shared by the project APIs.
+#
+# The projects are not installable packages, so each app puts the repository
+# root on sys.path before importing from here.
+#----------------------------------------------------------------------------#
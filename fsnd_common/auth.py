@@ -0,0 +1,297 @@
+#----------------------------------------------------------------------------#
+# Auth0 bearer tokens, verified locally.
+#
+#   auth = Auth('dev-zuj7kdfn.auth0.com', audience='coffee')
+#
+#   @app.route('/drinks-detail')
+#   @auth.requires_auth('get:drinks-detail')
+#   def get_drinks_detail(payload):
+#       ...
+#
+# The tenant's JWKS is fetched on first use and every signing key in it is
+# parsed into a key object once, so verifying a token costs one signature
+# check: no network round trip and no JWK to RSA conversion per request. A
+# token signed with a kid the set does not know makes it refetch the JWKS,
+# at most once per refresh interval, which is how rotated keys are picked up.
+#
+# Deployments that cannot reach the tenant pin the keys instead, through the
+# environment (see keys_from_environ):
+#
+#   AUTH0_JWKS_FILE=/etc/fsnd/jwks.json   read at startup and reloaded by a
+#                                         watcher thread when the file changes
+#   AUTH0_JWKS='{"keys": [...]}'          the document itself
+#
+# Pinned keys are never fetched, so no request waits on the network.
+#----------------------------------------------------------------------------#
+
+import json
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from urllib.request import urlopen
+
+from flask import request
+from jose import jwk, jwt
+from jose.exceptions import JOSEError
+
+from .metrics import AUTH_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class AuthError(Exception):
+    def __init__(self, error, status_code):
+        self.error = error
+        self.status_code = status_code
+
+
+def get_token_auth_header():
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+
+    parts = auth.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
+
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+
+    return parts[1]
+
+
+def check_permissions(permission, payload, status_code=403):
+    if 'permissions' not in payload:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Permissions not included in JWT.'
+        }, 400)
+
+    if permission not in payload['permissions']:
+        raise AuthError({
+            'code': 'unauthorized',
+            'description': 'Permission not found.'
+        }, status_code)
+    return True
+
+
+class JWKS(object):
+    # The signing keys of a JWKS document, by kid, as jose key objects.
+
+    def __init__(self, url, algorithms=('RS256',), refresh_interval=60):
+        self.url = url
+        self.algorithms = tuple(algorithms)
+        self.refresh_interval = refresh_interval
+        self.fetched_at = None
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def load(self, document):
+        keys = {}
+        for key in document.get('keys', []):
+            alg = key.get('alg', self.algorithms[0])
+            if 'kid' not in key or key.get('use', 'sig') != 'sig' or \
+                    alg not in self.algorithms:
+                continue
+            try:
+                keys[key['kid']] = jwk.construct(key, alg)
+            except JOSEError:
+                continue
+        self._keys = keys
+        self.fetched_at = time.time()
+
+    def fetch(self):
+        with urlopen(self.url, timeout=10) as response:
+            self.load(json.loads(response.read()))
+
+    def get(self, kid):
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        with self._lock:
+            # another thread may have refreshed while this one waited
+            key = self._keys.get(kid)
+            if key is None and (self.fetched_at is None or time.time() -
+                                self.fetched_at > self.refresh_interval):
+                self.fetch()
+                key = self._keys.get(kid)
+        return key
+
+
+class StaticJWKS(JWKS):
+    # Keys pinned from a JWKS document; an unknown kid is simply unknown.
+
+    def __init__(self, document, algorithms=('RS256',)):
+        super(StaticJWKS, self).__init__(None, algorithms)
+        self.load(document)
+
+    def get(self, kid):
+        return self._keys.get(kid)
+
+
+class FileJWKS(StaticJWKS):
+    # Keys pinned from a JWKS file. A watcher thread stats the file every
+    # poll_interval seconds and reloads it when it changes; a file that does
+    # not parse (say, caught half written) keeps the previous keys until it
+    # changes again. Threads do not survive fork, so the watcher
+    # is started by the first lookup in each process.
+
+    def __init__(self, path, algorithms=('RS256',), poll_interval=1.0):
+        JWKS.__init__(self, None, algorithms)
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self._stat = self._broken = None
+        self._watcher_pid = None
+        self._stop = threading.Event()
+        # a missing or broken file at startup is a configuration error
+        self.reload()
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def reload(self):
+        # Loads the file if it changed since the last load; returns whether
+        # it did.
+        signature = self._signature()
+        if signature in (self._stat, self._broken):
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.load(json.load(f))
+        except ValueError:
+            # not retried until the file changes again
+            self._broken = signature
+            raise
+        self._stat = signature
+        return True
+
+    def watch(self):
+        self._watcher_pid = os.getpid()
+        if self.poll_interval:
+            threading.Thread(target=self._watch, name='jwks-watcher',
+                             daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.reload():
+                    logger.info('Reloaded JWKS from %s', self.path)
+            except (OSError, ValueError) as e:
+                logger.warning('Keeping previous JWKS, cannot load %s: %s',
+                               self.path, e)
+
+    def close(self):
+        self._stop.set()
+
+    def get(self, kid):
+        if self._watcher_pid != os.getpid():
+            with self._lock:
+                # the first lookups of a process may race to start it
+                if self._watcher_pid != os.getpid():
+                    self.watch()
+        return self._keys.get(kid)
+
+
+def keys_from_environ(url, algorithms=('RS256',), environ=os.environ):
+    # Pinned keys when AUTH0_JWKS_FILE or AUTH0_JWKS is set, else the JWKS
+    # at url.
+    if environ.get('AUTH0_JWKS_FILE'):
+        return FileJWKS(environ['AUTH0_JWKS_FILE'], algorithms)
+    if environ.get('AUTH0_JWKS'):
+        return StaticJWKS(json.loads(environ['AUTH0_JWKS']), algorithms)
+    return JWKS(url, algorithms)
+
+
+class Auth(object):
+
+    def __init__(self, domain, audience, algorithms=('RS256',), keys=None,
+                 forbidden_status=403):
+        self.issuer = 'https://{}/'.format(domain)
+        self.audience = audience
+        self.algorithms = list(algorithms)
+        self.keys = keys or keys_from_environ(
+            self.issuer + '.well-known/jwks.json', algorithms)
+        # coffee shop clients expect 401 for a missing permission
+        self.forbidden_status = forbidden_status
+
+    def verify_decode_jwt(self, token):
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except JOSEError:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+        if 'kid' not in unverified_header:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Authorization malformed.'
+            }, 401)
+
+        key = self.keys.get(unverified_header['kid'])
+        if key is None:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to find the appropriate key.'
+            }, 400)
+        try:
+            return jwt.decode(token, key, algorithms=self.algorithms,
+                              audience=self.audience, issuer=self.issuer)
+        except jwt.ExpiredSignatureError:
+            raise AuthError({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+        except jwt.JWTClaimsError:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+    def requires_auth(self, permission=''):
+        def requires_auth_decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                token = get_token_auth_header()
+                started = time.perf_counter()
+                try:
+                    payload = self.verify_decode_jwt(token)
+                except AuthError as e:
+                    AUTH_DURATION.observe((e.error['code'],), time.perf_counter() - started)
+                    raise AuthError(e.error, 401)
+                except Exception:
+                    AUTH_DURATION.observe(('unverified jwt',), time.perf_counter() - started)
+                    raise AuthError({
+                        'code': 'unverified jwt',
+                        'description': 'Unable to verify jwt token'
+                    }, 401)
+                AUTH_DURATION.observe(('ok',), time.perf_counter() - started)
+
+                check_permissions(permission, payload, self.forbidden_status)
+
+                return f(payload, *args, **kwargs)
+            return wrapper
+        return requires_auth_decorator
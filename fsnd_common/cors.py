@@ -0,0 +1,98 @@
+#----------------------------------------------------------------------------#
+# CORS headers with precomputed header blocks.
+#
+#   init_cors(app)
+#
+# wraps app.wsgi_app in a middleware that builds its headers once, from the
+# CORS_* config at the time of the call:
+#
+# - Preflights (OPTIONS with Access-Control-Request-Method) are answered with
+#   a 204 before Flask is entered at all, and carry Access-Control-Max-Age so
+#   browsers reuse the answer instead of preflighting every request.
+# - Every other response gets the Access-Control-* block set exactly once:
+#   whatever the view or an extension added under those names is replaced.
+#
+# With CORS_ORIGINS = '*' the block is the same for every request. With a
+# list of origins, an allowed Origin is echoed back (each origin's block is
+# prepared up front), others get no CORS headers, and all get Vary: Origin.
+#----------------------------------------------------------------------------#
+
+DEFAULTS = {
+    'CORS_ORIGINS': '*',
+    'CORS_ALLOW_HEADERS': ('Content-Type', 'Authorization'),
+    'CORS_ALLOW_METHODS': ('GET', 'POST', 'PATCH', 'DELETE', 'OPTIONS'),
+    'CORS_EXPOSE_HEADERS': (),
+    # seconds; browsers cap this (Chrome at 2 hours, Firefox at 24)
+    'CORS_MAX_AGE': 86400,
+}
+
+
+class CORSMiddleware(object):
+
+    def __init__(self, wsgi_app, origins='*', allow_headers=(),
+                 allow_methods=(), expose_headers=(), max_age=None):
+        self.wsgi_app = wsgi_app
+        self.vary = origins != '*'
+        simple, preflight = [], [
+            ('Access-Control-Allow-Methods', ', '.join(allow_methods)),
+            ('Access-Control-Allow-Headers', ', '.join(allow_headers)),
+        ]
+        if expose_headers:
+            simple.append(('Access-Control-Expose-Headers',
+                           ', '.join(expose_headers)))
+        if max_age is not None:
+            preflight.append(('Access-Control-Max-Age', str(max_age)))
+
+        # origin -> (headers for ordinary responses, for preflights); the
+        # '*' entry is used for every origin when origins is '*'.
+        self.blocks = {}
+        for origin in (['*'] if origins == '*' else origins):
+            allow = [('Access-Control-Allow-Origin', origin)]
+            self.blocks[origin] = (
+                allow + simple,
+                allow + preflight + [('Content-Length', '0')] +
+                ([('Vary', 'Origin')] if self.vary else []))
+
+    def block(self, environ):
+        if not self.vary:
+            return self.blocks['*']
+        return self.blocks.get(environ.get('HTTP_ORIGIN'))
+
+    def __call__(self, environ, start_response):
+        block = self.block(environ)
+        if block is None and not self.vary:
+            return self.wsgi_app(environ, start_response)
+        if block is not None and environ['REQUEST_METHOD'] == 'OPTIONS' \
+                and 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' in environ:
+            start_response('204 No Content', list(block[1]))
+            return []
+
+        def cors_start_response(status, headers, exc_info=None):
+            headers = [(name, value) for name, value in headers
+                       if not name.lower().startswith('access-control-')]
+            if self.vary:
+                # also for origins that are not allowed, so that a shared
+                # cache never hands their response to an allowed origin
+                vary = [value for name, value in headers
+                        if name.lower() == 'vary']
+                headers = [(name, value) for name, value in headers
+                           if name.lower() != 'vary']
+                headers.append(('Vary', ', '.join(vary + ['Origin'])))
+            if block is not None:
+                headers.extend(block[0])
+            return start_response(status, headers, exc_info)
+
+        return self.wsgi_app(environ, cors_start_response)
+
+
+def init_cors(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    config = app.config
+    app.wsgi_app = CORSMiddleware(
+        app.wsgi_app, origins=config['CORS_ORIGINS'],
+        allow_headers=config['CORS_ALLOW_HEADERS'],
+        allow_methods=config['CORS_ALLOW_METHODS'],
+        expose_headers=config['CORS_EXPOSE_HEADERS'],
+        max_age=config['CORS_MAX_AGE'])
+    return app.wsgi_app
@@ -0,0 +1,241 @@
+#----------------------------------------------------------------------------#
+# Logging that never blocks a request.
+#
+#   init_logging(app)
+#
+# sends app.logger's records through a bounded queue to a QueueListener
+# thread, which writes them as JSON lines to LOG_FILE (rotated by size) or,
+# without one, to stderr. A request thread only formats the message and
+# enqueues it; when the queue is full the record is dropped and counted
+# rather than waited on.
+#
+# Every line logged during a request carries its request_id (the incoming
+# X-Request-ID, or a new one; echoed on the response), and with LOG_REQUESTS
+# each request ends with a line holding its status, latency_ms and the number
+# of SQL statements it ran (sql_count). Those access lines are off unless
+# LOG_REQUESTS=1 is set: one per request swamps stderr under any real load.
+#
+# Records below WARNING with the same message template are sampled: one in
+# LOG_SAMPLE_EVERY is written, marked with "sampled": N. Warnings and errors
+# are always written.
+#----------------------------------------------------------------------------#
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+import weakref
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULTS = {
+    'LOG_FILE': os.environ.get('LOG_FILE'),
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO'),
+    'LOG_MAX_BYTES': 10 * 1024 * 1024,
+    'LOG_BACKUP_COUNT': 5,
+    'LOG_QUEUE_SIZE': 10000,
+    'LOG_SAMPLE_EVERY': int(os.environ.get('LOG_SAMPLE_EVERY', 1)),
+    'LOG_REQUESTS': os.environ.get('LOG_REQUESTS') == '1',
+}
+
+# attributes every LogRecord has; anything else was passed as `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message'}
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) +
+                    '.{:03d}Z'.format(int(record.msecs)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # Passes one in `every` records below `level` per message template, or
+    # per `_sample_key` when the record has one (access lines: per endpoint).
+    # Past `max_keys` templates the counts start over, so messages built
+    # without a template (say, f-strings) cannot grow it without bound.
+
+    def __init__(self, every=1, level=logging.WARNING, max_keys=10000):
+        super(SamplingFilter, self).__init__()
+        self.every = every
+        self.level = level
+        self.max_keys = max_keys
+        self._seen = {}
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno >= self.level:
+            return True
+        key = (record.name, getattr(record, '_sample_key', record.msg))
+        # the count may race between threads; an occasional extra or missing
+        # sample is fine
+        if key not in self._seen and len(self._seen) >= self.max_keys:
+            self._seen.clear()
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        if seen % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class RequestContextFilter(logging.Filter):
+    # Adds the current request's id to records logged while it runs.
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g and \
+                not hasattr(record, 'request_id'):
+            record.request_id = g.request_id
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+
+    def __init__(self, queue):
+        super(NonBlockingQueueHandler, self).__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Runs in the request thread: merge args and render the traceback
+        # now, while they are valid, and leave the JSON to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline(object):
+
+    def __init__(self, handlers, queue_size=10000, sample_every=1):
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        self.handler.addFilter(RequestContextFilter())
+        self.handler.addFilter(SamplingFilter(sample_every))
+        self.listener = None
+        self.start()
+        _pipelines.add(self)
+
+    def start(self):
+        self.listener = QueueListener(self.handler.queue, *self.handlers,
+                                      respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        # drains the queue before returning
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def flush(self):
+        # writes out everything logged so far
+        self.stop()
+        self.start()
+
+    def after_fork(self):
+        # The listener thread did not survive the fork, and the queue may
+        # have been copied with a lock held; a worker starts afresh.
+        self.handler.queue = queue.Queue(self.queue_size)
+        self.start()
+
+
+_pipelines = weakref.WeakSet()
+
+
+def _restart_after_fork():
+    for pipeline in list(_pipelines):
+        pipeline.after_fork()
+
+
+def _stop_all():
+    for pipeline in list(_pipelines):
+        pipeline.stop()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(_stop_all)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+
+
+def _request_started():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+
+
+def init_logging(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    config = app.config
+
+    if config['LOG_FILE']:
+        target = RotatingFileHandler(config['LOG_FILE'],
+                                     maxBytes=config['LOG_MAX_BYTES'],
+                                     backupCount=config['LOG_BACKUP_COUNT'],
+                                     delay=True)
+    else:
+        target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(JSONFormatter())
+
+    pipeline = LogPipeline([target], config['LOG_QUEUE_SIZE'],
+                           config['LOG_SAMPLE_EVERY'])
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(pipeline.handler)
+    app.logger.setLevel(config['LOG_LEVEL'])
+    app.extensions['log_pipeline'] = pipeline
+
+    app.before_request(_request_started)
+
+    @app.after_request
+    def log_request(response):
+        if 'request_id' not in g:
+            return response
+        response.headers.setdefault('X-Request-ID', g.request_id)
+        if config['LOG_REQUESTS']:
+            app.logger.info('%s %s %s', request.method, request.path,
+                            response.status_code, extra={
+                                'status': response.status_code,
+                                'latency_ms': round((time.perf_counter() -
+                                                     g.request_started) * 1000, 3),
+                                'sql_count': g.sql_count,
+                                '_sample_key': (request.method, request.endpoint),
+                            })
+        return response
+
+    return pipeline
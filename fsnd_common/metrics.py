@@ -0,0 +1,423 @@
+#----------------------------------------------------------------------------#
+# Runtime metrics in the Prometheus text format.
+#
+#   metrics = init_metrics(app)        # serves GET /metrics
+#
+# Records, per endpoint, request counts by status, a latency histogram, the
+# requests in flight, and the number and total time of SQL statements; bearer
+# token verification time (fsnd_common.auth); and hits and misses of the
+# response cache (fsnd_common.responses) and of anything else that counts
+# into CACHE_REQUESTS.
+#
+# Recording takes no lock. Every thread adds into its own shard: a dict of
+# preallocated lists, one per labelled series, so an observation is a dict
+# lookup and a few list increments. A scrape sums the shards.
+#
+# With METRICS_DIR set, as it should be under gunicorn, each worker process
+# also writes its totals to METRICS_DIR/metrics_<pid>.json, at most every
+# METRICS_FLUSH_INTERVAL seconds and when it exits, and a scrape, whichever
+# worker answers it, adds up every file there. Counters of workers that have
+# exited are kept; their gauges are not. Empty the directory when the server
+# starts (clear_directory()).
+#----------------------------------------------------------------------------#
+
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+
+DEFAULTS = {
+    'METRICS_PATH': '/metrics',
+    'METRICS_DIR': os.environ.get('METRICS_DIR'),
+    'METRICS_FLUSH_INTERVAL': 1.0,
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Shard(object):
+    __slots__ = ('thread', 'series')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.series = {}
+
+
+_registries = weakref.WeakSet()
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = {}
+        self.reset()
+        _registries.add(self)
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError('metric {} is already registered'.format(metric.name))
+        self.metrics[metric.name] = metric
+        metric.registry = self
+
+    def reset(self):
+        # forget everything recorded so far, as a forked worker must, and
+        # the lock too, which another thread may have held at the fork
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard(threading.current_thread())
+            with self._lock:
+                # a server that starts a thread per request and is never
+                # scraped would otherwise pile up shards
+                self._retire_dead()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_dead(self):
+        # call with the lock held
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                # it will never write again; keep its counts, not it
+                add_series(self._retired, shard.series)
+        self._shards = live
+
+    def collect(self):
+        # {(name, labels): values} summed over every thread's shard
+        with self._lock:
+            self._retire_dead()
+            live = self._shards
+            totals = {key: list(values) for key, values in self._retired.items()}
+        for shard in live:
+            # a thread may add a series while this runs; copying the dict
+            # is atomic, walking it is not
+            add_series(totals, shard.series.copy())
+        return totals
+
+
+def add_series(totals, series):
+    for key, values in series.items():
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                total[i] += value
+
+
+REGISTRY = Registry()
+
+
+class Metric(object):
+    kind = None
+    size = 1
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def values(self, labels=()):
+        # this thread's list for the series; labels is a tuple of strings
+        # in labelnames order
+        shard = getattr(self.registry._local, 'shard', None) or self.registry.shard()
+        key = (self.name, labels)
+        values = shard.series.get(key)
+        if values is None:
+            values = shard.series[key] = [0.0] * self.size
+        return values
+
+    def samples(self, labels, values):
+        yield self.name, labels, values[0]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        self.values(labels)[0] += amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        self.values(labels)[0] += amount
+
+    def dec(self, labels=(), amount=1):
+        self.values(labels)[0] -= amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        # a count per bucket, one for +Inf, then sum and count
+        self.size = len(self.buckets) + 3
+        super(Histogram, self).__init__(name, documentation, labelnames, registry)
+
+    def observe(self, labels, value):
+        values = self.values(labels)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), values):
+            cumulative += count
+            yield self.name + '_bucket', labels + (('le', bound),), cumulative
+        yield self.name + '_sum', labels, values[-2]
+        yield self.name + '_count', labels, values[-1]
+
+
+REQUESTS = Counter(
+    'http_requests_total', 'Requests answered, by endpoint, method and status.',
+    ('endpoint', 'method', 'status'))
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, by endpoint.',
+    ('endpoint', 'method'))
+IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Requests being handled.')
+DB_STATEMENTS = Counter(
+    'db_statements_total', 'SQL statements executed, by endpoint.', ('endpoint',))
+DB_DURATION = Counter(
+    'db_statement_duration_seconds_total', 'Time spent executing SQL statements, by endpoint.',
+    ('endpoint',))
+AUTH_DURATION = Histogram(
+    'auth_verification_duration_seconds', 'Time spent verifying a bearer token, by outcome.',
+    ('outcome',), buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                           0.05, 0.1, 0.25, 1.0))
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups, by cache, entry name and result (hit or miss).',
+    ('cache', 'name', 'result'))
+
+
+def endpoint_label():
+    if not has_request_context():
+        return ''
+    return request.endpoint or '<unmatched>'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def exposition(totals, registry=REGISTRY):
+    by_metric = {}
+    for (name, labels), values in totals.items():
+        by_metric.setdefault(name, []).append((tuple(labels), values))
+
+    lines = []
+    for name in sorted(by_metric):
+        metric = registry.metrics[name]
+        lines.append('# HELP {} {}'.format(name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(name, metric.kind))
+        for labels, values in sorted(by_metric[name]):
+            pairs = tuple(zip(metric.labelnames, labels))
+            for sample, sample_labels, value in metric.samples(pairs, values):
+                text = ','.join('{}="{}"'.format(label, escape(
+                    format_value(label_value) if label == 'le' else label_value))
+                    for label, label_value in sample_labels)
+                lines.append('{}{} {}'.format(
+                    sample, '{' + text + '}' if text else '', format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear_directory(directory):
+    # call once as the server starts, before any worker writes
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+            os.remove(path)
+
+
+class Metrics(object):
+
+    def __init__(self, directory=None, flush_interval=1.0, registry=REGISTRY):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.registry = registry
+        self._flushed_at = time.monotonic()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, pid=None):
+        return os.path.join(self.directory, 'metrics_{}.json'.format(pid or os.getpid()))
+
+    def flush(self):
+        # writes this process's totals for the other workers to read
+        if not self.directory:
+            return
+        totals = self.registry.collect()
+        self._flushed_at = time.monotonic()
+        document = {'pid': os.getpid(),
+                    'series': [[name, list(labels), values]
+                               for (name, labels), values in totals.items()]}
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix='.metrics_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(document, f)
+        os.replace(temporary, self.path())
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        # this process's live totals, plus the last ones every other
+        # process wrote
+        totals = self.registry.collect()
+        if not self.directory:
+            return totals
+        own = self.path()
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                # a worker is replacing it, or it was just removed
+                continue
+            alive = pid_alive(document['pid'])
+            series = {}
+            for name, labels, values in document['series']:
+                metric = self.registry.metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                series[(name, tuple(labels))] = values
+            add_series(totals, series)
+        return totals
+
+    def exposition(self):
+        return exposition(self.collect(), self.registry)
+
+
+_instances = []
+
+
+def _after_fork():
+    for registry in list(_registries):
+        registry.reset()
+    for metrics in _instances:
+        metrics._flushed_at = time.monotonic()
+
+
+def _flush_all():
+    for metrics in _instances:
+        try:
+            metrics.flush()
+        except OSError:
+            pass
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+atexit.register(_flush_all)
+
+
+_statements_counted = []
+
+
+def count_statements():
+    # SQL statement count and time for every engine, once per process
+    if _statements_counted:
+        return
+    _statements_counted.append(True)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('metrics_started')
+        if not stack:
+            return
+        started = stack.pop()
+        labels = (endpoint_label(),)
+        DB_STATEMENTS.inc(labels)
+        DB_DURATION.inc(labels, time.perf_counter() - started)
+
+
+def _request_started():
+    g.metrics_started = time.perf_counter()
+    IN_PROGRESS.inc()
+
+
+def _request_finished(exc):
+    # only when after_request did not run
+    if g.pop('metrics_started', None) is not None:
+        IN_PROGRESS.dec()
+
+
+def init_metrics(app, database=True):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    config = app.config
+    metrics = Metrics(config['METRICS_DIR'], config['METRICS_FLUSH_INTERVAL'])
+    _instances.append(metrics)
+    app.extensions['metrics'] = metrics
+    if database:
+        count_statements()
+
+    app.before_request(_request_started)
+    app.teardown_request(_request_finished)
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or '<unmatched>'
+        REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+        REQUEST_DURATION.observe((endpoint, request.method), time.perf_counter() - started)
+        # done here rather than at teardown, so that the flush below does
+        # not leave this request in flight in the file
+        IN_PROGRESS.dec()
+        metrics.maybe_flush()
+        return response
+
+    if config['METRICS_PATH']:
+        def metrics_view():
+            return app.response_class(metrics.exposition(), content_type=CONTENT_TYPE)
+        app.add_url_rule(config['METRICS_PATH'], 'metrics', metrics_view)
+    return metrics
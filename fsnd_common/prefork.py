@@ -0,0 +1,46 @@
+#----------------------------------------------------------------------------#
+# Sharing one app between forked worker processes.
+#
+# With gunicorn's preload_app the app, its engine and whatever was warmed up
+# are built once in the master and inherited by every worker. Pooled
+# connections must not be: two processes talking over one socket corrupt
+# each other's sessions, and closing an inherited connection ends the
+# session its owner is still using. So:
+#
+# - the master disposes the engine after warming up, before any fork;
+# - each worker calls dispose_after_fork() to start from an empty pool;
+# - register_fork_guard() catches any connection that still crosses a fork.
+#----------------------------------------------------------------------------#
+
+import os
+
+from sqlalchemy import event, exc
+
+
+def register_fork_guard(engine):
+    # Connections remember the pid that opened them. One checked out in
+    # another process is detached, without being closed, and the pool
+    # replaces it with a fresh connection.
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                'Connection record belongs to pid {}, checked out in pid '
+                '{}'.format(connection_record.info['pid'], pid))
+
+
+def dispose_after_fork(engine):
+    # A new, empty pool for this worker. The inherited one is dropped rather
+    # than disposed, since disposing would close connections the master owns.
+    try:
+        engine.dispose(close=False)
+    except TypeError:
+        # SQLAlchemy < 1.4.33; recreate() keeps the pool's event listeners.
+        engine.pool = engine.pool.recreate()
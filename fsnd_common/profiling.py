@@ -0,0 +1,376 @@
+#----------------------------------------------------------------------------#
+# Profiles of slow requests, for production.
+#
+#   init_profiling(app)       # does nothing unless PROFILE_DIR is set
+#
+# With PROFILE_DIR set, a sampler thread watches the requests in flight.
+# Once a request has run for PROFILE_THRESHOLD_MS it samples that request's
+# stack every PROFILE_INTERVAL_MS until the request ends, and the samples
+# are written to PROFILE_DIR as a speedscope file (open it on
+# https://www.speedscope.app) or, with PROFILE_FORMAT = 'collapsed', as
+# collapsed stacks for flamegraph.pl. A sample taken while a SQL statement
+# runs ends in an "SQL: ..." frame. Next to each profile, <name>.sql.txt
+# lists every statement the request issued, with its start offset and time.
+#
+# A request whose PROFILE_HEADER (X-Profile) equals PROFILE_SECRET is
+# profiled from its first line instead, with cProfile (a pstats .prof file)
+# or, with PROFILE_HEADER_MODE = 'sample', by the sampler. Without a
+# secret the header is ignored.
+#
+# Only the newest PROFILE_MAX_FILES profiles are kept. Files are written by
+# the sampler thread, not by the request.
+#----------------------------------------------------------------------------#
+
+import cProfile
+import glob
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+
+DEFAULTS = {
+    'PROFILE_DIR': os.environ.get('PROFILE_DIR'),
+    'PROFILE_THRESHOLD_MS': 1000,
+    'PROFILE_INTERVAL_MS': 5,
+    'PROFILE_FORMAT': 'speedscope',
+    'PROFILE_HEADER': 'X-Profile',
+    'PROFILE_SECRET': os.environ.get('PROFILE_SECRET'),
+    'PROFILE_HEADER_MODE': 'cprofile',
+    'PROFILE_MAX_FILES': 100,
+    'PROFILE_MAX_STATEMENTS': 1000,
+}
+
+FORMATS = ('speedscope', 'collapsed')
+HEADER_MODES = ('cprofile', 'sample')
+
+
+class RequestProfile(object):
+
+    def __init__(self, method, path, trigger, max_statements):
+        self.method = method
+        self.path = path
+        self.endpoint = None
+        self.status = None
+        self.trigger = trigger
+        self.started = time.perf_counter()
+        self.finished = None
+        self.last_sample = None
+        # [(stack, weight_seconds)], stack as a tuple of frame keys, root first
+        self.samples = []
+        self.statements = []
+        self.statements_dropped = 0
+        self.max_statements = max_statements
+        self.current_sql = None
+        self.profiler = None
+
+    def statement_started(self, statement):
+        self.current_sql = (time.perf_counter(), statement)
+
+    def statement_finished(self):
+        started, statement = self.current_sql
+        self.current_sql = None
+        if len(self.statements) < self.max_statements:
+            self.statements.append((started - self.started,
+                                    time.perf_counter() - started, statement))
+        else:
+            self.statements_dropped += 1
+
+    @property
+    def duration(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+
+def frame_stack(frame):
+    # (filename, function, line) per frame, outermost first
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def sql_frame(statement):
+    return ('', 'SQL: ' + ' '.join(statement.split())[:120], 0)
+
+
+def frame_name(key):
+    filename, function, line = key
+    if not filename:
+        return function
+    return '{} ({}:{})'.format(function, os.path.basename(filename), line)
+
+
+def speedscope(profile):
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, weight in profile.samples:
+        indices = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                filename, function, line = key
+                frame = {'name': frame_name(key)}
+                if filename:
+                    frame.update(file=filename, line=line)
+                frames.append(frame)
+            indices.append(index[key])
+        samples.append(indices)
+        weights.append(round(weight * 1000, 3))
+    name = '{} {} {:.0f}ms'.format(profile.method, profile.path, profile.duration * 1000)
+    return json.dumps({
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'fsnd_common.profiling',
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sum(weights), 3),
+            'samples': samples,
+            'weights': weights,
+        }],
+    })
+
+
+def collapsed(profile):
+    # "root;child;leaf <microseconds>" per distinct stack
+    totals = {}
+    for stack, weight in profile.samples:
+        line = ';'.join(frame_name(key).replace(';', ':') for key in stack)
+        totals[line] = totals.get(line, 0) + weight
+    return ''.join('{} {}\n'.format(line, int(round(weight * 1e6)))
+                   for line, weight in totals.items())
+
+
+def statements_report(profile):
+    lines = ['{} {} -> {} ({}) {:.1f}ms, profiled: {}'.format(
+        profile.method, profile.path, profile.status, profile.endpoint,
+        profile.duration * 1000, profile.trigger)]
+    lines.append('{} SQL statements'.format(
+        len(profile.statements) + profile.statements_dropped))
+    for offset, duration, statement in profile.statements:
+        lines.append('+{:9.1f}ms {:8.1f}ms  {}'.format(
+            offset * 1000, duration * 1000, ' '.join(statement.split())))
+    if profile.statements_dropped:
+        lines.append('... {} more not recorded'.format(profile.statements_dropped))
+    return '\n'.join(lines) + '\n'
+
+
+class Profiler(object):
+
+    def __init__(self, directory, threshold, interval, format='speedscope',
+                 max_files=100, max_statements=1000):
+        if format not in FORMATS:
+            raise ValueError('PROFILE_FORMAT must be one of {}'.format(FORMATS))
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.format = format
+        self.max_files = max_files
+        self.max_statements = max_statements
+        # thread ident -> RequestProfile of the request it is serving
+        self.active = {}
+        self.finished = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, trigger=None):
+        # the sampler thread belongs to one process; a forked worker starts
+        # its own
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.active = {}
+                    self.finished = deque()
+                    self._wake = threading.Event()
+                    threading.Thread(target=self._run, name='profiler',
+                                     daemon=True).start()
+                    self._pid = os.getpid()
+        profile = RequestProfile(request.method, request.path, trigger or 'slow',
+                                 self.max_statements)
+        if trigger == 'header':
+            profile.last_sample = profile.started
+        self.active[threading.get_ident()] = profile
+        self._wake.set()
+        return profile
+
+    def finish(self, profile, status):
+        profile.finished = time.perf_counter()
+        profile.status = status
+        profile.endpoint = request.endpoint
+        self.active.pop(threading.get_ident(), None)
+        if profile.samples or profile.profiler is not None:
+            self.finished.append(profile)
+            self._wake.set()
+
+    def next_wait(self):
+        # seconds until a request in flight is due for a sample, or None
+        # when none is; a request that starts later is due later still
+        now = time.perf_counter()
+        wait = None
+        for profile in list(self.active.values()):
+            if profile.profiler is not None:
+                continue
+            if profile.last_sample is not None:
+                return self.interval
+            due = max(profile.started + self.threshold - now, 0)
+            wait = due if wait is None else min(wait, due)
+        return wait
+
+    def _run(self):
+        # sleeps until a request is due; starting and finishing a request
+        # wake it to look again
+        wake = self._wake
+        while True:
+            wake.wait(0 if self.finished else self.next_wait())
+            wake.clear()
+            self.sample()
+            while self.finished:
+                self.write(self.finished.popleft())
+
+    def sample(self):
+        now = time.perf_counter()
+        frames = None
+        for ident, profile in list(self.active.items()):
+            if profile.profiler is not None:
+                continue
+            if profile.last_sample is None:
+                if now - profile.started < self.threshold:
+                    continue
+                profile.last_sample = now
+                continue
+            if frames is None:
+                frames = sys._current_frames()
+            frame = frames.get(ident)
+            if frame is None or profile.finished is not None:
+                continue
+            stack = frame_stack(frame)
+            current_sql = profile.current_sql
+            if current_sql is not None:
+                stack.append(sql_frame(current_sql[1]))
+            profile.samples.append((tuple(stack), now - profile.last_sample))
+            profile.last_sample = now
+
+    def write(self, profile):
+        self._count += 1
+        base = os.path.join(self.directory, '{}-{}-{:.0f}ms-{}-{}'.format(
+            time.strftime('%Y%m%dT%H%M%S'),
+            re.sub(r'[^A-Za-z0-9_.-]', '_', profile.endpoint or 'unmatched'),
+            profile.duration * 1000, os.getpid(), self._count))
+        try:
+            if profile.profiler is not None:
+                profile.profiler.dump_stats(base + '.prof')
+            elif self.format == 'speedscope':
+                with open(base + '.speedscope.json', 'w') as f:
+                    f.write(speedscope(profile))
+            else:
+                with open(base + '.collapsed', 'w') as f:
+                    f.write(collapsed(profile))
+            with open(base + '.sql.txt', 'w') as f:
+                f.write(statements_report(profile))
+            self.prune()
+        except OSError:
+            # a full or missing disk must not take the sampler down
+            pass
+
+    def prune(self):
+        profiles = sorted(glob.glob(os.path.join(self.directory, '*.sql.txt')),
+                          key=os.path.getmtime)
+        for path in profiles[:max(len(profiles) - self.max_files, 0)]:
+            base = path[:-len('.sql.txt')]
+            for stale in glob.glob(glob.escape(base) + '.*'):
+                os.remove(stale)
+
+
+_statements_recorded = []
+
+
+def record_statements():
+    # once per process; only requests being profiled pay for more than a
+    # lookup of g
+    if _statements_recorded:
+        return
+    _statements_recorded.append(True)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            profile = g.get('profile')
+            if profile is not None:
+                profile.statement_started(statement)
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            profile = g.get('profile')
+            if profile is not None and profile.current_sql is not None:
+                profile.statement_finished()
+
+
+def init_profiling(app, database=True):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    config = app.config
+    if not config['PROFILE_DIR']:
+        return None
+    if config['PROFILE_HEADER_MODE'] not in HEADER_MODES:
+        raise ValueError('PROFILE_HEADER_MODE must be one of {}'.format(HEADER_MODES))
+
+    profiler = Profiler(config['PROFILE_DIR'], config['PROFILE_THRESHOLD_MS'] / 1000.0,
+                        config['PROFILE_INTERVAL_MS'] / 1000.0, config['PROFILE_FORMAT'],
+                        config['PROFILE_MAX_FILES'], config['PROFILE_MAX_STATEMENTS'])
+    app.extensions['profiler'] = profiler
+    if database:
+        record_statements()
+    header = config['PROFILE_HEADER']
+    secret = config['PROFILE_SECRET']
+    if secret:
+        secret = secret.encode('utf-8')
+    cprofile = config['PROFILE_HEADER_MODE'] == 'cprofile'
+
+    @app.before_request
+    def start_profile():
+        value = request.headers.get(header) if secret else None
+        # bytes: compare_digest rejects str holding anything but ASCII
+        if value is not None and hmac.compare_digest(value.encode('utf-8'), secret):
+            g.profile = profiler.start('header')
+            if cprofile:
+                g.profile.profiler = cProfile.Profile()
+                g.profile.profiler.enable()
+        else:
+            g.profile = profiler.start()
+
+    @app.after_request
+    def record_status(response):
+        if 'profile' in g:
+            g.profile.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        if profile.profiler is not None:
+            profile.profiler.disable()
+        profiler.finish(profile, profile.status or 500)
+
+    return profiler
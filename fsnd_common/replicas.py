@@ -0,0 +1,160 @@
+#----------------------------------------------------------------------------#
+# Read replicas for Flask-SQLAlchemy apps.
+#
+#   if app.config.get('SQLALCHEMY_REPLICA_URIS'):
+#       init_replicas(app, db)        # after db.init_app(app)
+#
+# SQLALCHEMY_REPLICA_URIS (or $DATABASE_REPLICA_URLS, comma separated) lists
+# the replicas; each becomes a bind, replica_0, replica_1, ... init_replicas
+# gives db a routing session: a GET, HEAD or OPTIONS request picks one of
+# the replicas at random and db.session reads from it for the whole
+# request. Every other request uses the primary.
+#
+# Read-your-writes: a write request that succeeds (status below 400) sets
+# the REPLICA_COOKIE cookie, and for REPLICA_STICKY_SECONDS after it that
+# client's reads go to the primary too, so a redirect after a POST shows
+# what was just written. Make it longer than the replicas usually lag.
+#
+# A read request that writes after all is moved to the primary at its first
+# flush, and stays there. Views that must read the primary anyway (say, to
+# show the current row version before an edit) are decorated with
+# @use_primary. Only db.session is routed: db.engine and sessions given a
+# bind of their own, as in the tests, always use the primary.
+#
+# The routing session extends Flask-SQLAlchemy 2.x's SignallingSession,
+# which 3.x replaced; it is only imported by init_replicas, so apps without
+# replicas run on either.
+#----------------------------------------------------------------------------#
+
+import os
+import random
+import time
+from functools import wraps
+
+from flask import g, has_request_context, request
+
+DEFAULTS = {
+    'SQLALCHEMY_REPLICA_URIS': [url for url in os.environ.get(
+        'DATABASE_REPLICA_URLS', '').split(',') if url],
+    'REPLICA_STICKY_SECONDS': 10,
+    'REPLICA_COOKIE': 'db_primary_until',
+}
+
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+_session_class = []
+
+
+def routing_session_class():
+    if _session_class:
+        return _session_class[0]
+    try:
+        from flask_sqlalchemy import SignallingSession
+    except ImportError:
+        raise RuntimeError('read replicas need Flask-SQLAlchemy 2.x')
+
+    class RoutingSession(SignallingSession):
+
+        def __init__(self, db, autocommit=False, autoflush=True, **options):
+            self.routed = options.get('bind') is None
+            SignallingSession.__init__(self, db, autocommit, autoflush, **options)
+
+        def get_bind(self, mapper=None, clause=None):
+            if self.routed and has_request_context():
+                bind = g.get('db_bind')
+                if bind is not None:
+                    if not self._flushing:
+                        return self.app.extensions['replicas'].engine(bind)
+                    # what this request reads from now on must include its write
+                    g.db_bind = None
+            return SignallingSession.get_bind(self, mapper, clause)
+
+    _session_class.append(RoutingSession)
+    return RoutingSession
+
+
+def route_session(db):
+    # swaps db.session for a routing session with the same scope
+    from sqlalchemy import orm
+    session_class = routing_session_class()
+    if db.session.session_factory.class_ is session_class:
+        return
+    scopefunc = db.session.registry.scopefunc
+    db.session.remove()
+    db.session = orm.scoped_session(
+        orm.sessionmaker(class_=session_class, db=db, query_cls=db.Query),
+        scopefunc=scopefunc)
+
+
+def use_primary(view):
+    # reads of this view go to the primary even when a replica is configured
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_bind = None
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter(object):
+
+    def __init__(self, app, db, binds, sticky_seconds, cookie):
+        self.app = app
+        self.db = db
+        self.binds = binds
+        self.sticky_seconds = sticky_seconds
+        self.cookie = cookie
+
+    def engine(self, bind):
+        return self.db.get_engine(self.app, bind=bind)
+
+    def engines(self):
+        return [self.engine(bind) for bind in self.binds]
+
+    def sticky(self):
+        try:
+            return float(request.cookies.get(self.cookie, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def choose(self):
+        # the bind the request reads from; None for the primary
+        if not self.binds or request.method not in READ_METHODS or self.sticky():
+            return None
+        return random.choice(self.binds)
+
+
+def init_replicas(app, db):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    config = app.config
+    urls = config['SQLALCHEMY_REPLICA_URIS']
+    if isinstance(urls, str):
+        urls = [url for url in urls.split(',') if url]
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    names = []
+    for index, url in enumerate(urls):
+        name = 'replica_{}'.format(index)
+        binds[name] = url
+        names.append(name)
+    config['SQLALCHEMY_BINDS'] = binds or None
+
+    router = ReplicaRouter(app, db, names, config['REPLICA_STICKY_SECONDS'],
+                           config['REPLICA_COOKIE'])
+    app.extensions['replicas'] = router
+    if not names:
+        return router
+    route_session(db)
+
+    @app.before_request
+    def route_reads():
+        g.db_bind = router.choose()
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            response.set_cookie(router.cookie, str(time.time() + router.sticky_seconds),
+                                max_age=router.sticky_seconds, httponly=True,
+                                samesite='Lax')
+        return response
+
+    return router
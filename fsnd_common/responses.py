@@ -0,0 +1,212 @@
+#----------------------------------------------------------------------------#
+# JSON responses: fast encoding, compression and pre-encoded bodies.
+#
+#   responses = init_responses(app)
+#
+#   @app.route('/questions')
+#   def get_questions():
+#       return responses.response(('questions', page), build_page)
+#
+# jsonify() is a drop-in for flask.jsonify that encodes with orjson when it
+# is installed and with the stdlib json module otherwise. Every JSON body
+# above COMPRESS_MIN_SIZE is compressed with brotli (when installed) or gzip,
+# whichever the client prefers. ResponseCache keeps the encoded body of a
+# cacheable endpoint, and each compressed variant of it, so a hit costs
+# neither a query nor an encode nor a compress; writes clear() it.
+#----------------------------------------------------------------------------#
+
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, request
+from flask.json import JSONEncoder
+
+from .metrics import CACHE_REQUESTS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    # 'auto' picks orjson when it is installed.
+    'JSON_ENCODER': 'auto',
+    # Bodies smaller than this are sent as they are; None turns compression
+    # off.
+    'COMPRESS_MIN_SIZE': 1024,
+    'COMPRESS_MIMETYPES': ('application/json', 'text/html', 'text/plain',
+                           'text/css', 'application/javascript'),
+    # Levels for bodies compressed per request. Cached bodies are compressed
+    # once, so they always get the maximum.
+    'COMPRESS_GZIP_LEVEL': 6,
+    'COMPRESS_BR_QUALITY': 4,
+    'RESPONSE_CACHE': True,
+    'RESPONSE_CACHE_SIZE': 1000,
+    # Each worker has its own cache and only sees its own writes; entries
+    # older than this are rebuilt so writes made by other workers show up.
+    'RESPONSE_CACHE_TTL': 60,
+}
+
+_flask_encoder = JSONEncoder()
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False,
+                      default=_flask_encoder.default).encode('utf-8')
+
+
+def _orjson_dumps(obj):
+    # Dates go through Flask's encoder so both encoders produce the same
+    # output; the categories maps are keyed by int ids.
+    return orjson.dumps(obj, default=_flask_encoder.default,
+                        option=orjson.OPT_NON_STR_KEYS |
+                        orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+ENCODERS = {'json': _stdlib_dumps}
+if orjson is not None:
+    ENCODERS['orjson'] = _orjson_dumps
+ENCODERS['auto'] = ENCODERS.get('orjson', _stdlib_dumps)
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def dumps(obj):
+    # JSON bytes with the encoder configured for the current app.
+    return ENCODERS[current_app.config['JSON_ENCODER']](obj)
+
+
+def jsonify(*args, **kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() takes either args or kwargs, not both')
+    data = args[0] if len(args) == 1 else (args or kwargs)
+    return current_app.response_class(
+        dumps(data), mimetype=current_app.config['JSONIFY_MIMETYPE'])
+
+
+def compress(body, encoding, best=False):
+    config = current_app.config
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else
+                               config['COMPRESS_BR_QUALITY'])
+    # wbits=31 writes a gzip container without gzip.compress()'s timestamp,
+    # so the same body always compresses to the same bytes.
+    compressor = zlib.compressobj(9 if best else config['COMPRESS_GZIP_LEVEL'],
+                                  zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def negotiate(size):
+    # The encoding to send a body of `size` bytes with, or None.
+    min_size = current_app.config['COMPRESS_MIN_SIZE']
+    if min_size is None or size < min_size:
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress_response(response):
+    # after_request hook for everything that was not served pre-encoded.
+    if response.mimetype not in current_app.config['COMPRESS_MIMETYPES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.direct_passthrough or response.is_streamed or \
+            'Content-Encoding' in response.headers or \
+            not 200 <= response.status_code < 300 or \
+            response.status_code == 204:
+        return response
+    body = response.get_data()
+    encoding = negotiate(len(body))
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class EncodedBody(object):
+
+    def __init__(self, body):
+        self.created = time.time()
+        self.variants = {None: body}
+
+    def encoded(self, encoding):
+        # Two requests may both compress a missing variant; they produce the
+        # same bytes, so the race is harmless.
+        variant = self.variants.get(encoding)
+        if variant is None:
+            variant = compress(self.variants[None], encoding, best=True)
+            self.variants[encoding] = variant
+        return variant
+
+
+class ResponseCache(object):
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.created > ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key, entry, generation):
+        with self._lock:
+            # A clear() while the body was being built means it may already
+            # be stale; serve it this once but do not keep it.
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def response(self, key, build):
+        # `build` returns the payload for jsonify(), or aborts; aborted
+        # requests are not cached.
+        config = current_app.config
+        if not config['RESPONSE_CACHE']:
+            return jsonify(build())
+        entry = self._get(key, config['RESPONSE_CACHE_TTL'])
+        CACHE_REQUESTS.inc(('response', key[0] if isinstance(key, tuple) else key,
+                            'miss' if entry is None else 'hit'))
+        if entry is None:
+            generation = self._generation
+            entry = EncodedBody(dumps(build()))
+            self._set(key, entry, generation)
+        encoding = negotiate(len(entry.variants[None]))
+        response = current_app.response_class(
+            entry.encoded(encoding), mimetype=config['JSONIFY_MIMETYPE'])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+def init_responses(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    app.after_request(compress_response)
+    cache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'])
+    app.extensions['response_cache'] = cache
+    return cache
@@ -0,0 +1,346 @@
+import io
+import json
+import logging
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import pytest
+
+# run as a script, only fsnd_common itself would be on the path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from fsnd_common.logs import JSONFormatter, LogPipeline, SamplingFilter
+from fsnd_common.metrics import Counter, Gauge, Histogram, Metrics, Registry, exposition
+from fsnd_common.profiling import init_profiling
+from fsnd_common.replicas import init_replicas
+from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, current_app, g, request
+from sqlalchemy import create_engine, event
+
+
+class LogsTestCase(unittest.TestCase):
+    """The logging pipeline, without an app"""
+
+    def test_info_lines_sampled(self):
+        logger = logging.getLogger('test_info_lines_sampled')
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(SamplingFilter(every=10))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            for i in range(100):
+                logger.info('info %d', i)
+                logger.warning('warning %d', i)
+        finally:
+            logger.removeHandler(handler)
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+        self.assertEqual(len([line for line in lines if line['level'] == 'WARNING']), 100)
+        sampled = [line for line in lines if line['level'] == 'INFO']
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0]['sampled'], 10)
+
+    def test_sampling_keys_bounded(self):
+        sampler = SamplingFilter(every=10, max_keys=5)
+        for i in range(100):
+            # a message built without a template is a key of its own
+            sampler.filter(logging.makeLogRecord({'msg': 'info {}'.format(i),
+                                                  'levelno': logging.INFO}))
+
+        self.assertLessEqual(len(sampler._seen), 5)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        pipeline = LogPipeline([logging.NullHandler()], queue_size=1)
+        pipeline.stop()
+        logger = logging.getLogger('test_full_queue_drops_instead_of_blocking')
+        logger.addHandler(pipeline.handler)
+        try:
+            for i in range(10):
+                logger.error('error %d', i)
+        finally:
+            logger.removeHandler(pipeline.handler)
+
+        self.assertEqual(pipeline.handler.dropped, 9)
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Registries, summed over threads and processes"""
+
+    def test_metrics_summed_across_threads(self):
+        registry = Registry()
+        latency = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0),
+                            registry=registry)
+        in_flight = Gauge('in_flight', 'In flight.', registry=registry)
+
+        def work():
+            for i in range(10000):
+                in_flight.inc()
+                latency.observe(('a',), (0.05, 0.5, 5.0)[i % 3])
+                in_flight.dec()
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        text = exposition(registry.collect(), registry)
+
+        self.assertIn('latency_seconds_bucket{route="a",le="0.1"} 26672', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="1"} 53336', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="+Inf"} 80000', text)
+        self.assertIn('latency_seconds_count{route="a"} 80000', text)
+        self.assertIn('in_flight 0', text)
+
+    def test_dead_thread_shards_retired(self):
+        registry = Registry()
+        served = Counter('served_total', 'Served.', registry=registry)
+        for _ in range(20):
+            thread = threading.Thread(target=served.inc)
+            thread.start()
+            thread.join()
+
+        # no scrape yet; each new thread folded in the ones before it
+        self.assertEqual(len(registry._shards), 1)
+        self.assertIn('served_total 20', exposition(registry.collect(), registry))
+
+    def test_metrics_summed_across_processes(self):
+        registry = Registry()
+        served = Counter('served_total', 'Served.', registry=registry)
+        busy = Gauge('busy', 'Busy.', registry=registry)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        metrics = Metrics(directory, registry=registry)
+        served.inc(amount=5)
+        busy.inc()
+
+        for _ in range(3):
+            pid = os.fork()
+            if pid == 0:
+                # a worker starts from zero, not from the master's counts
+                served.inc(amount=10)
+                busy.inc()
+                metrics.flush()
+                os._exit(0)
+            os.waitpid(pid, 0)
+        text = metrics.exposition()
+
+        self.assertIn('served_total 35', text)
+        # the workers have exited, so only this process's gauge counts
+        self.assertIn('busy 1\n', text)
+
+
+
+def spend(seconds):
+    """Sleeps for `seconds`. A request past the profiling threshold then
+    waits, for up to 5s more, until the sampler has caught it here twice,
+    so a sampler thread that is slow to get scheduled cannot miss a part."""
+    profile = g.get('profile')
+    samples = len(profile.samples) if profile is not None else 0
+    time.sleep(seconds)
+    if profile is None or profile.profiler is not None or \
+            profile.duration < current_app.extensions['profiler'].threshold:
+        return
+    deadline = time.time() + 5
+    while len(profile.samples) < samples + 2 and time.time() < deadline:
+        time.sleep(0.001)
+
+
+class ProfilingTestCase(unittest.TestCase):
+    """Slow requests profiled by the sampler, or with cProfile on request"""
+
+    def profiled_app(self, **config):
+        """A one-route app that profiles into a fresh directory. GET /slow
+        runs for at least `seconds`, half of it in SQL."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app = Flask('profiled')
+        app.config.update(PROFILE_DIR=directory, PROFILE_THRESHOLD_MS=50,
+                          PROFILE_INTERVAL_MS=2)
+        app.config.update(config)
+        engine = create_engine('sqlite://')
+        event.listen(engine, 'connect', lambda connection, record:
+                     connection.create_function('pause', 1, spend))
+
+        def python_part(seconds):
+            spend(seconds)
+
+        @app.route('/slow/<float:seconds>')
+        def slow(seconds):
+            python_part(seconds / 2)
+            with engine.connect() as connection:
+                connection.execute('SELECT pause({})'.format(seconds / 2))
+            return 'done'
+        init_profiling(app)
+        return app, directory
+
+    def profiles(self, directory, count=1):
+        """Waits for the sampler thread to write `count` profiles."""
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            written = sorted(os.listdir(directory))
+            if len([name for name in written if name.endswith('.sql.txt')]) >= count:
+                return written
+            time.sleep(0.01)
+        return sorted(os.listdir(directory))
+
+    def test_slow_request_profiled(self):
+        app, directory = self.profiled_app()
+        app.test_client().get('/slow/0.3')
+        written = self.profiles(directory)
+
+        profile, statements = written
+        self.assertTrue(profile.endswith('.speedscope.json'))
+        self.assertIn('-slow-', profile)
+        with open(os.path.join(directory, profile)) as f:
+            document = json.load(f)
+        names = [frame['name'] for frame in document['shared']['frames']]
+        self.assertTrue(any(name.startswith('python_part') for name in names))
+        self.assertIn('SQL: SELECT pause(0.15)', names)
+        # the first 50ms are not sampled
+        duration_ms = int(document['profiles'][0]['name'].rsplit(' ', 1)[1][:-2])
+        weights = sum(document['profiles'][0]['weights'])
+        self.assertGreater(weights, 0)
+        self.assertLessEqual(weights, duration_ms - 50 + 1)
+        with open(os.path.join(directory, statements)) as f:
+            report = f.read()
+        self.assertIn('GET /slow/0.3 -> 200 (slow)', report)
+        self.assertIn('SELECT pause(0.15)', report)
+
+    def test_fast_request_not_profiled(self):
+        # far above what the request takes, however busy the machine
+        app, directory = self.profiled_app(PROFILE_THRESHOLD_MS=5000)
+        app.test_client().get('/slow/0.01')
+
+        # an unsampled request is never handed to the sampler to write
+        self.assertEqual(list(app.extensions['profiler'].finished), [])
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_collapsed_stacks(self):
+        app, directory = self.profiled_app(PROFILE_FORMAT='collapsed')
+        app.test_client().get('/slow/0.3')
+        profile = self.profiles(directory)[0]
+
+        self.assertTrue(profile.endswith('.collapsed'))
+        with open(os.path.join(directory, profile)) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(any(line.rsplit(' ', 1)[0].endswith(';SQL: SELECT pause(0.15)')
+                            for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    def test_profile_header_runs_cprofile(self):
+        app, directory = self.profiled_app(PROFILE_SECRET='let-me-see',
+                                           PROFILE_THRESHOLD_MS=5000)
+        client = app.test_client()
+        client.get('/slow/0.02', headers={'X-Profile': 'wrong'})
+        client.get('/slow/0.02', headers={'X-Profile': 'let-me-see'})
+        profile = self.profiles(directory)[0]
+
+        self.assertTrue(profile.endswith('.prof'))
+        stats = pstats.Stats(os.path.join(directory, profile))
+        self.assertIn('python_part', [function for _, _, function in stats.stats])
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_profile_header_not_ascii(self):
+        app, directory = self.profiled_app(PROFILE_SECRET='let-me-see')
+        res = app.test_client().get('/slow/0.01', headers={'X-Profile': 'café'})
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_profiling_off_without_directory(self):
+        app = Flask('unprofiled')
+
+        self.assertIsNone(init_profiling(app))
+        self.assertEqual(app.before_request_funcs, {})
+
+
+
+class ReplicasTestCase(unittest.TestCase):
+    """Reads routed to a replica, writes and what follows them to the primary"""
+
+    def replicated_app(self, **config):
+        """A notes app on two SQLite files, the replica lagging behind: it
+        has only the note 'seen on replica', the primary only 'seen on
+        primary'. GET /notes lists the notes; POST /notes and GET /touch
+        add one."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        primary, replica = (os.path.join(directory, name) for name in ('primary.db', 'replica.db'))
+        app = Flask('replicated')
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + primary,
+                          SQLALCHEMY_REPLICA_URIS=['sqlite:///' + replica],
+                          SQLALCHEMY_TRACK_MODIFICATIONS=False, **config)
+        db = SQLAlchemy(app)
+        init_replicas(app, db)
+
+        class Note(db.Model):
+            id = db.Column(db.Integer, primary_key=True)
+            text = db.Column(db.String)
+
+        for path in (primary, replica):
+            engine = create_engine('sqlite:///' + path)
+            db.Model.metadata.create_all(engine)
+            engine.execute(Note.__table__.insert(),
+                           text='seen on ' + os.path.basename(path)[:-3])
+            engine.dispose()
+
+        def notes():
+            return ','.join(note.text for note in Note.query.order_by(Note.id))
+
+        @app.route('/notes')
+        def list_notes():
+            return notes()
+
+        @app.route('/notes', methods=['POST'])
+        @app.route('/touch')
+        def add_note():
+            db.session.add(Note(text=request.method))
+            db.session.commit()
+            return notes(), 201
+
+        self.addCleanup(db.session.remove)
+        return app
+
+    def test_reads_go_to_replica(self):
+        app = self.replicated_app()
+        res = app.test_client().get('/notes')
+
+        self.assertEqual(res.data, b'seen on replica')
+
+    def test_writes_go_to_primary_and_stick(self):
+        app = self.replicated_app()
+        client = app.test_client()
+        res = client.post('/notes')
+
+        self.assertEqual(res.data, b'seen on primary,POST')
+        self.assertIn('db_primary_until=', res.headers['Set-Cookie'])
+        self.assertEqual(client.get('/notes').data, b'seen on primary,POST')
+        self.assertEqual(app.test_client().get('/notes').data, b'seen on replica')
+
+    def test_stickiness_expires(self):
+        app = self.replicated_app(REPLICA_STICKY_SECONDS=0.2)
+        client = app.test_client()
+        client.post('/notes')
+        time.sleep(0.3)
+
+        self.assertEqual(client.get('/notes').data, b'seen on replica')
+
+    def test_read_request_that_writes_moves_to_primary(self):
+        app = self.replicated_app()
+        res = app.test_client().get('/touch')
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data, b'seen on primary,GET')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,267 @@
+#----------------------------------------------------------------------------#
+# Test databases shared by the backends' conftest.py files.
+#
+# database_url(name) picks the database a backend's tests run against:
+#
+# - TEST_DATABASE_URL when set, formatted with {name} and {worker};
+# - else a throwaway Postgres cluster when initdb / pg_ctl are installed
+#   (FSND_TEST_POSTGRES=0 skips it), one per test process;
+# - else a SQLite file, one per test process.
+#
+# Under pytest-xdist every worker is its own process and so gets its own
+# database, seeded once. rollback(db) then runs each test inside a
+# transaction and a SAVEPOINT on a single connection and rolls both back
+# afterwards; app code that commits only releases the savepoint, which is
+# started again.
+#
+# rsa_keys() and mint_token() stand in for an Auth0 tenant: tokens signed
+# with a local key pair, checked against a JWKS document built from it.
+# captured_logs(app) collects what an app logs through fsnd_common.logs, and
+# metric(client, sample) reads one sample off its /metrics.
+#----------------------------------------------------------------------------#
+
+import atexit
+import base64
+import glob
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+
+_postgres = None
+_sqlite_dir = None
+
+
+def worker_id():
+    return os.environ.get('PYTEST_XDIST_WORKER', 'main')
+
+
+def _find_postgres():
+    if os.environ.get('FSND_TEST_POSTGRES') == '0':
+        return None
+    if shutil.which('initdb') and shutil.which('pg_ctl'):
+        return ''
+    # Debian and Ubuntu keep the server binaries off PATH.
+    found = sorted(glob.glob('/usr/lib/postgresql/*/bin/initdb'))
+    return os.path.dirname(found[-1]) if found else None
+
+
+class EphemeralPostgres(object):
+    # A cluster in a temporary directory, listening on a unix socket only,
+    # with fsync off; removed when the process exits.
+
+    def __init__(self, bin_dir=''):
+        self.directory = tempfile.mkdtemp(prefix='fsnd-pg-')
+        self.data = os.path.join(self.directory, 'data')
+        self.pg_ctl = os.path.join(bin_dir, 'pg_ctl')
+        subprocess.run([os.path.join(bin_dir, 'initdb'), '-D', self.data,
+                        '-U', 'postgres', '-A', 'trust', '--no-sync'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([self.pg_ctl, '-D', self.data, '-w', '-l',
+                        os.path.join(self.directory, 'postgres.log'), '-o',
+                        "-k {} -c listen_addresses='' -F".format(
+                            self.directory), 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        atexit.register(self.stop)
+
+    def url(self, name='postgres'):
+        return 'postgresql://postgres@/{}?host={}'.format(name, self.directory)
+
+    def create_database(self, name):
+        engine = create_engine(self.url(), isolation_level='AUTOCOMMIT')
+        with engine.connect() as connection:
+            connection.execute('CREATE DATABASE {}'.format(name))
+        engine.dispose()
+        return self.url(name)
+
+    def stop(self):
+        subprocess.run([self.pg_ctl, '-D', self.data, '-m', 'immediate',
+                        'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def database_url(name):
+    global _postgres, _sqlite_dir
+    url = os.environ.get('TEST_DATABASE_URL')
+    if url:
+        return url.format(name=name, worker=worker_id())
+    if _postgres is None:
+        bin_dir = _find_postgres()
+        _postgres = EphemeralPostgres(bin_dir) if bin_dir is not None \
+            else False
+    if _postgres:
+        return _postgres.create_database(name)
+    if _sqlite_dir is None:
+        _sqlite_dir = tempfile.mkdtemp(prefix='fsnd-test-')
+        atexit.register(shutil.rmtree, _sqlite_dir, True)
+    return 'sqlite:///' + os.path.join(
+        _sqlite_dir, '{}-{}.db'.format(name, worker_id()))
+
+
+def prepare(engine):
+    # pysqlite opens transactions itself and breaks SAVEPOINT; hand
+    # transaction control back to SQLAlchemy.
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.execute('BEGIN')
+
+    # connections opened before the listeners were added
+    engine.dispose()
+
+
+def copy_rows(path, table):
+    # The rows of a `COPY public.<table> (...) FROM stdin;` block in a
+    # pg_dump file, as dicts.
+    rows, columns = [], None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if columns is None:
+                if line.startswith('COPY public.{} ('.format(table)):
+                    columns = line[line.index('(') + 1:line.index(')')]
+                    columns = [c.strip() for c in columns.split(',')]
+                continue
+            if line == '\\.':
+                break
+            values = [None if value == '\\N' else value
+                      for value in line.split('\t')]
+            rows.append(dict(zip(columns, values)))
+    return rows
+
+
+def seed(db, table, rows):
+    # Inserts rows with explicit ids and moves the Postgres sequence past
+    # them.
+    if not rows:
+        return
+    db.session.execute(table.insert(), rows)
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+            "(SELECT MAX(id) FROM {0}))".format(table.name))
+    db.session.commit()
+
+
+@contextmanager
+def rollback(db):
+    # Swaps db.session for one bound to a connection whose transaction is
+    # rolled back on exit.
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    session = db.create_scoped_session(
+        options={'bind': connection, 'binds': {}})
+    session.begin_nested()
+
+    def restart_savepoint(sess, trans):
+        if trans.nested and not trans._parent.nested:
+            sess.expire_all()
+            sess.begin_nested()
+    event.listen(session(), 'after_transaction_end', restart_savepoint)
+
+    # Flask-SQLAlchemy removes the session when each app context ends, which
+    # would drop the savepoint; expiring makes the next request reload what
+    # it reads, as a fresh session would.
+    session.remove = session.expire_all
+    original, db.session = db.session, session
+    try:
+        yield session
+    finally:
+        db.session = original
+        # Ends the savepoint without starting another. SQLAlchemy 1.3 leaves
+        # it open on the connection when the session closes, and rolling back
+        # the transaction under it then warns "Reset agent is not active".
+        event.remove(session(), 'after_transaction_end', restart_savepoint)
+        if session().transaction is not None and session().transaction.nested:
+            session().transaction.rollback()
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def _b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def rsa_keys(kid='test-key', bits=2048):
+    # A new RS256 key pair: the private key as PEM, and a JWKS document
+    # holding the public half under kid.
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        # python-rsa, which python-jose depends on; slow, but always there
+        import rsa
+        public, private = rsa.newkeys(bits)
+        pem = private.save_pkcs1().decode('ascii')
+        n, e = public.n, public.e
+    else:
+        private = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=bits)
+        pem = private.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()).decode('ascii')
+        numbers = private.public_key().public_numbers()
+        n, e = numbers.n, numbers.e
+    jwks = {'keys': [{'kty': 'RSA', 'use': 'sig', 'alg': 'RS256', 'kid': kid,
+                      'n': _b64_uint(n), 'e': _b64_uint(e)}]}
+    return pem, jwks
+
+
+def mint_token(pem, kid, issuer, audience, permissions=(), expires_in=3600,
+               **claims):
+    from jose import jwt
+
+    now = int(time.time())
+    claims = dict({'iss': issuer, 'aud': audience, 'sub': 'test|user',
+                   'iat': now, 'exp': now + expires_in,
+                   'permissions': list(permissions)}, **claims)
+    return jwt.encode(claims, pem, algorithm='RS256', headers={'kid': kid})
+
+
+@contextmanager
+def captured_logs(app):
+    # The JSON lines app logs inside the block, parsed; the list is filled
+    # when the block ends.
+    from fsnd_common.logs import JSONFormatter
+
+    pipeline = app.extensions['log_pipeline']
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter())
+    pipeline.stop()
+    handlers, pipeline.handlers = pipeline.handlers, [handler]
+    pipeline.start()
+    lines = []
+    try:
+        yield lines
+        pipeline.flush()
+    finally:
+        pipeline.stop()
+        pipeline.handlers = handlers
+        pipeline.start()
+    lines.extend(json.loads(line) for line in stream.getvalue().splitlines())
+
+
+def metric(client, sample):
+    # The value of one sample line on /metrics, 0 when absent.
+    res = client.get('/metrics')
+    for line in res.data.decode().splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.split(' ')[-1])
+    return 0.0
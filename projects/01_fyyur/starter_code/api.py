@@ -0,0 +1,230 @@
+#----------------------------------------------------------------------------#
+# Async JSON API.
+#
+# Read-only JSON for venues, artists and shows on the same models as the
+# HTML views, served over ASGI with SQLAlchemy's asyncio extension so a
+# worker keeps serving other requests while it waits on the database:
+#
+#   $ uvicorn api:application
+#
+# Detail endpoints run their independent queries concurrently, each on its
+# own pooled connection. Every path outside /api/ is handed to the Flask app
+# through asgiref's WSGI adapter, so one server can serve both.
+#
+# Needs SQLAlchemy 1.4+, asgiref, an ASGI server such as uvicorn, and the
+# async driver for the database: aiosqlite or asyncpg.
+#----------------------------------------------------------------------------#
+
+import asyncio
+import json
+import re
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select, func, and_, or_, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException, BadRequest, NotFound, MethodNotAllowed
+
+from app import app as flask_app, Venue, Artist, Show, encode_cursor, decode_cursor
+
+
+def async_url(url):
+    # Same database, async driver.
+    for prefix, driver in (('sqlite://', 'sqlite+aiosqlite://'),
+                           ('postgres://', 'postgresql+asyncpg://'),
+                           ('postgresql://', 'postgresql+asyncpg://')):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    return url
+
+
+engine = create_async_engine(
+    flask_app.config.get('API_DATABASE_URL') or async_url(flask_app.config['SQLALCHEMY_DATABASE_URI']))
+wsgi_app = WsgiToAsgi(flask_app)
+routes = []
+
+
+def route(pattern):
+    def register(handler):
+        routes.append((re.compile('^' + pattern + '$'), handler))
+        return handler
+    return register
+
+
+async def fetch(statement):
+    async with engine.connect() as connection:
+        result = await connection.execute(statement)
+        return [dict(row) for row in result.mappings()]
+
+
+def page_size(args):
+    try:
+        size = int(args.get('limit', [flask_app.config['API_PER_PAGE']])[0])
+    except ValueError:
+        size = flask_app.config['API_PER_PAGE']
+    return max(1, min(size, flask_app.config['API_MAX_PER_PAGE']))
+
+
+def paginate(rows, size, key):
+    # Pages are fetched with one extra row; its presence means there is a
+    # next page, which resumes after the last row returned.
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+def format_time(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def upcoming_count(column, entity_id, now):
+    return select(func.count()).where(column == entity_id, Show.start_time >= now).scalar_subquery()
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@route(r'/api/venues')
+async def list_venues(args):
+    size = page_size(args)
+    statement = select(Venue.id, Venue.name, Venue.city, Venue.state,
+                       upcoming_count(Show.venue_id, Venue.id, datetime.now()).label('num_upcoming_shows')) \
+        .order_by(Venue.name, Venue.id).limit(size + 1)
+    if 'after' in args:
+        name, venue_id = decode_cursor(args['after'][0], (str, int))
+        statement = statement.where(or_(Venue.name > name, and_(Venue.name == name, Venue.id > venue_id)))
+    venues, cursor = paginate(await fetch(statement), size, lambda v: (v['name'], v['id']))
+    return {'success': True, 'venues': venues, 'next': cursor}
+
+
+@route(r'/api/venues/(?P<venue_id>\d+)')
+async def get_venue(args, venue_id):
+    venue_id = int(venue_id)
+    now = datetime.now()
+    shows = select(Show.artist_id, Artist.name.label('artist_name'),
+                   Artist.image_link.label('artist_image_link'), Show.start_time) \
+        .join(Artist, Artist.id == Show.artist_id).where(Show.venue_id == venue_id)
+    venues, upcoming, past = await asyncio.gather(
+        fetch(select(Venue.__table__).where(Venue.id == venue_id)),
+        fetch(shows.where(Show.start_time >= now).order_by(Show.start_time)),
+        fetch(shows.where(Show.start_time < now).order_by(Show.start_time.desc())))
+    if not venues:
+        raise NotFound()
+    return {'success': True, 'venue': detail(venues[0], upcoming, past)}
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@route(r'/api/artists')
+async def list_artists(args):
+    size = page_size(args)
+    statement = select(Artist.id, Artist.name, Artist.city, Artist.state,
+                       upcoming_count(Show.artist_id, Artist.id, datetime.now()).label('num_upcoming_shows')) \
+        .order_by(Artist.name, Artist.id).limit(size + 1)
+    if 'after' in args:
+        name, artist_id = decode_cursor(args['after'][0], (str, int))
+        statement = statement.where(or_(Artist.name > name, and_(Artist.name == name, Artist.id > artist_id)))
+    artists, cursor = paginate(await fetch(statement), size, lambda a: (a['name'], a['id']))
+    return {'success': True, 'artists': artists, 'next': cursor}
+
+
+@route(r'/api/artists/(?P<artist_id>\d+)')
+async def get_artist(args, artist_id):
+    artist_id = int(artist_id)
+    now = datetime.now()
+    shows = select(Show.venue_id, Venue.name.label('venue_name'),
+                   Venue.image_link.label('venue_image_link'), Show.start_time) \
+        .join(Venue, Venue.id == Show.venue_id).where(Show.artist_id == artist_id)
+    artists, upcoming, past = await asyncio.gather(
+        fetch(select(Artist.__table__).where(Artist.id == artist_id)),
+        fetch(shows.where(Show.start_time >= now).order_by(Show.start_time)),
+        fetch(shows.where(Show.start_time < now).order_by(Show.start_time.desc())))
+    if not artists:
+        raise NotFound()
+    return {'success': True, 'artist': detail(artists[0], upcoming, past)}
+
+
+def detail(entity, upcoming, past):
+    for show in upcoming + past:
+        show['start_time'] = format_time(show['start_time'])
+    entity.update(upcoming_shows=upcoming, upcoming_shows_count=len(upcoming),
+                  past_shows=past, past_shows_count=len(past))
+    return entity
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@route(r'/api/shows')
+async def list_shows(args):
+    # Upcoming shows in start time order; ?past=1 lists past shows, latest
+    # first.
+    size = page_size(args)
+    past = args.get('past', ['0'])[0] not in ('0', 'false', '')
+    key = tuple_(Show.start_time, Show.venue_id, Show.artist_id)
+    statement = select(Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+                       Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+                       Show.start_time) \
+        .join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+    now = datetime.now()
+    if past:
+        statement = statement.where(Show.start_time < now).order_by(
+            Show.start_time.desc(), Show.venue_id.desc(), Show.artist_id.desc())
+    else:
+        statement = statement.where(Show.start_time >= now).order_by(
+            Show.start_time, Show.venue_id, Show.artist_id)
+    if 'after' in args:
+        start_time, venue_id, artist_id = decode_cursor(args['after'][0], (str, int, int))
+        try:
+            after = tuple_(datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S.%f"), venue_id, artist_id)
+        except (TypeError, ValueError):
+            raise BadRequest()
+        statement = statement.where(key < after if past else key > after)
+    shows, cursor = paginate(await fetch(statement.limit(size + 1)), size,
+                             lambda s: (s['start_time'].strftime("%Y-%m-%d %H:%M:%S.%f"),
+                                        s['venue_id'], s['artist_id']))
+    for show in shows:
+        show['start_time'] = format_time(show['start_time'])
+    return {'success': True, 'shows': shows, 'next': cursor}
+
+
+#----------------------------------------------------------------------------#
+# ASGI.
+#----------------------------------------------------------------------------#
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if not scope['path'].startswith('/api/') and scope['path'] != '/api':
+        return await wsgi_app(scope, receive, send)
+
+    args = parse_qs(scope['query_string'].decode('latin-1'))
+    try:
+        for pattern, handler in routes:
+            match = pattern.match(scope['path'].rstrip('/'))
+            if match:
+                if scope['method'] not in ('GET', 'HEAD'):
+                    raise MethodNotAllowed()
+                status, body = 200, await handler(args, **match.groupdict())
+                break
+        else:
+            raise NotFound()
+    except HTTPException as e:
+        status, body = e.code, {'success': False, 'error': e.code, 'message': e.name.lower()}
+
+    payload = json.dumps(body).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(payload)).encode('latin-1')),
+    ]})
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else payload})
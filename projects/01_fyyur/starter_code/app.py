@@ -2,28 +2,114 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
+import sys
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
+import base64
+import click
+from flask import Blueprint, Flask, current_app, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context
+from flask.cli import with_appcontext
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from werkzeug.datastructures import MultiDict
 from datetime import datetime
+
+# fsnd_common lives at the repository root
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from fsnd_common.logs import init_logging
+from fsnd_common.metrics import init_metrics
+from fsnd_common.profiling import init_profiling
+from fsnd_common.replicas import use_primary
+from cache import init_cache
+from models import db, Show, Location, Venue, Artist
+from scheduling import find_conflicts
+from genres import GenreIndex, genre_filter, genre_counts
+from locations import bounding_box, distance_km
+from itertools import groupby
+
+# babel, dateutil, forms (WTForms) and Flask-Migrate (alembic) are imported
+# where they are first needed; see "Startup" in the README.
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-
-migrate = Migrate(app, db)
+bp = Blueprint('fyyur', __name__)
+genre_indexes = {'venue': GenreIndex(), 'artist': GenreIndex()}
+
+
+class LazyMigrate(object):
+    # Stands in for Flask-Migrate in app.extensions['migrate']. Only the
+    # `flask db` commands read it; the first read imports Flask-Migrate,
+    # which replaces this with the real config.
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+
+    def __getattr__(self, name):
+        from flask_migrate import Migrate
+        Migrate(self.app, self.db)
+        return getattr(self.app.extensions['migrate'], name)
+
+
+def create_app(config='config'):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    db.init_app(app)
+    # GET requests read from SQLALCHEMY_REPLICA_URIS when it lists any; see
+    # fsnd_common/replicas.py
+    if app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        from fsnd_common.replicas import init_replicas
+        init_replicas(app, db)
+    app.extensions['migrate'] = LazyMigrate(app, db)
+    init_cache(app)
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.register_blueprint(bp)
+    app.cli.add_command(startup_report)
+
+    # JSON lines through a background thread; see fsnd_common/logs.py
+    if not app.debug:
+        app.config.setdefault('LOG_FILE', os.environ.get('LOG_FILE', 'error.log'))
+    init_logging(app)
+    # request, SQL and fragment cache metrics on /metrics; see fsnd_common/metrics.py
+    init_metrics(app)
+    # profiles of slow requests, only when PROFILE_DIR is set; see "Profiling"
+    # in the README
+    init_profiling(app)
+    return app
+
+
+@click.command('startup-report')
+@click.option('--top', default=15, help='Number of imports to list.')
+@click.option('--budget-ms', type=float, help='Defaults to STARTUP_BUDGET_MS.')
+@with_appcontext
+def startup_report(top, budget_ms):
+    """Import and cold start times of a fresh worker (see startup.py)."""
+    import startup
+    if budget_ms is None:
+        budget_ms = current_app.config['STARTUP_BUDGET_MS']
+    if not startup.report(top, budget_ms):
+        raise SystemExit(1)
+
+
+def __getattr__(name):
+    # `app` is built on first use, so importing this module for its models
+    # or helpers builds nothing, while `from app import app`, FLASK_APP=app
+    # and gunicorn app:app keep working.
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    if name == 'cache':
+        app = globals()['app'] if 'app' in globals() else __getattr__('app')
+        return app.extensions['fragment_cache']
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def fragment_cache():
+    return current_app.extensions['fragment_cache']
 
 #----------------------------------------------------------------------------#
 # Helper.
@@ -34,65 +120,345 @@ def isPast(datetime):
     now = datetime.now()
     return datetime < now
 
-#----------------------------------------------------------------------------#
-# Models.
-#----------------------------------------------------------------------------#
-
-
-class Show(db.Model):
-    __tablename__ = 'show'
-
-    venue_id = db.Column(db.Integer, db.ForeignKey(
-        'venue.id'), primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey(
-        'artist.id'), primary_key=True)
-    start_time = db.Column(db.DateTime, nullable=False,
-                           default=datetime.now, primary_key=True)
-
-    def __repr__(self):
-        return f'<Show: Venue {self.venue_id} & Artist {self.artist_id} starts @ {self.start_time}>'
-
-
-class Venue(db.Model):
-    __tablename__ = 'venue'
 
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    address = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    website = db.Column(db.String(500))
-    seeking_talent = db.Column(db.Boolean, nullable=False)
-    seeking_description = db.Column(db.String())
-    artists = db.relationship('Artist', secondary="show",
-                              backref=db.backref('venues'))
+def stream_template(template_name, **context):
+    # render_template, but yields the page in chunks as the template runs
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
 
-    def __repr__(self):
-        return f'<Venue {self.id}: {self.name} @ {self.city}>'
+    def generate():
+        before_render_template.send(app, template=template, context=context)
+        stream = template.stream(context)
+        stream.enable_buffering(16)
+        for chunk in stream:
+            yield chunk
+        template_rendered.send(app, template=template, context=context)
+    return generate()
 
 
-class Artist(db.Model):
-    __tablename__ = 'artist'
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
 
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    website = db.Column(db.String(500))
-    seeking_venue = db.Column(db.Boolean, nullable=False)
-    seeking_description = db.Column(db.String())
 
-    def __repr__(self):
-        return f'<Artist {self.id}: {self.name} @ {self.city}>'
+def decode_cursor(cursor, types):
+    # the values encode_cursor() packed, checked against types; a cursor that
+    # does not decode to them is a 400, not a bad query
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        abort(400)
+    if not isinstance(values, list) or len(values) != len(types):
+        abort(400)
+    for value, type_ in zip(values, types):
+        if not isinstance(value, type_) or isinstance(value, bool):
+            abort(400)
+    return values
+
+
+class KeysetPage(object):
+    # Iterates one page of (name, id) ordered rows straight off the cursor.
+    # next_cursor is only known once the loop has run past the last row.
+
+    def __init__(self, query, per_page):
+        self.query = query.limit(per_page + 1)
+        self.per_page = per_page
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, row in enumerate(self.query.yield_per(500)):
+            if count == self.per_page:
+                self.next_cursor = encode_cursor(last.name, last.id)
+                break
+            last = row
+            yield row
+
+
+def schedule_shows(rows, partial=False):
+    # Books many shows in one transaction. Venue and artist ids are checked
+    # with one query, and overlapping bookings are found against the shows
+    # near the batch's time window in one more. Returns (created, errors)
+    # where errors maps row index -> messages; with partial=False any error
+    # rejects the whole batch.
+    errors = {}
+    candidates = []
+    for index, row in enumerate(rows):
+        try:
+            start_time = row['start_time']
+            if not isinstance(start_time, datetime):
+                import dateutil.parser
+                start_time = dateutil.parser.parse(start_time)
+            if start_time.tzinfo is not None:
+                # shows are stored in naive local time, as datetime.now() gives
+                start_time = start_time.astimezone().replace(tzinfo=None)
+            candidates.append((index, int(row['venue_id']), int(row['artist_id']), start_time))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            errors[index] = ['venue_id, artist_id and start_time are required']
+    if not candidates:
+        return 0, errors
+
+    if db.engine.dialect.name == 'postgresql':
+        # Serializes concurrent schedulers between the check and the insert;
+        # plain reads of the show table are not blocked.
+        db.session.execute('LOCK TABLE show IN SHARE ROW EXCLUSIVE MODE')
+
+    venue_ids = {c[1] for c in candidates}
+    artist_ids = {c[2] for c in candidates}
+    found = set(db.session.query(db.literal('venue'), Venue.id).filter(Venue.id.in_(venue_ids))
+                .union_all(db.session.query(db.literal('artist'), Artist.id).filter(Artist.id.in_(artist_ids)))
+                .all())
+
+    duration = current_app.config['SHOW_DURATION']
+    times = [c[3] for c in candidates]
+    booked = db.session.query(Show.venue_id, Show.artist_id, Show.start_time).filter(
+        Show.start_time > min(times) - duration,
+        Show.start_time < max(times) + duration,
+        db.or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids))).all()
+
+    for index, venue_id, artist_id, start_time in candidates:
+        if ('venue', venue_id) not in found:
+            errors.setdefault(index, []).append('venue {} does not exist'.format(venue_id))
+        if ('artist', artist_id) not in found:
+            errors.setdefault(index, []).append('artist {} does not exist'.format(artist_id))
+    for index, messages in find_conflicts(candidates, booked, duration).items():
+        errors.setdefault(index, []).extend(messages)
+
+    if errors and not partial:
+        db.session.rollback()
+        return 0, errors
+    new_shows = [{'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time}
+                 for index, venue_id, artist_id, start_time in candidates if index not in errors]
+    if new_shows:
+        db.session.execute(Show.__table__.insert(), new_shows)
+    db.session.commit()
+    return len(new_shows), errors
+
+
+class StaleVersion(Exception):
+    # Raised by update_entity when the row changed since the editor read it.
+
+    def __init__(self, version):
+        super(StaleVersion, self).__init__(version)
+        self.version = version
+
+
+def update_entity(model, entity, entity_id, version, changes):
+    # PATCH-style update guarded by optimistic concurrency. Only the
+    # submitted columns and the row version are read; the columns whose value
+    # differs are written in a single UPDATE ... WHERE id = ? AND version = ?
+    # that also bumps the version, so an edit based on an older version is
+    # reported instead of silently overwriting someone else's. Returns
+    # (version, changed column names), or None if the row does not exist.
+    names = set(changes)
+    if names & {'city', 'state'}:
+        # a move needs both halves of the new location
+        names |= {'city', 'state'}
+    columns = [getattr(model, name) for name in names]
+    row = db.session.query(model.version, *columns).filter(model.id == entity_id).first()
+    if row is None:
+        return None
+    changed = {name: value for name, value in changes.items() if getattr(row, name) != value}
+    if not changed:
+        # nothing to write, so nothing can be lost either
+        return row.version, []
+    if row.version != version:
+        raise StaleVersion(row.version)
+
+    values = {getattr(model, name): value for name, value in changed.items()}
+    values[model.version] = model.version + 1
+    if 'city' in changed or 'state' in changed:
+        values[model.location_id] = resolve_location(changes.get('city', row.city),
+                                                     changes.get('state', row.state))
+    updated = db.session.query(model).filter(
+        model.id == entity_id, model.version == version).update(values, synchronize_session=False)
+    if updated == 0:
+        # another writer got in between the read and the update
+        db.session.rollback()
+        raise StaleVersion(None)
+    db.session.commit()
+    fragment_cache().invalidate(entity, entity_id)
+    if 'genres' in changed:
+        genre_indexes[entity].set(entity_id, changed['genres'])
+    return version + 1, sorted(changed)
+
+
+def form_changes(form, names):
+    # Column values for the named fields of a validated venue or artist form.
+    changes = {}
+    for name in names:
+        value = form[name].data
+        if name in ('seeking_talent', 'seeking_venue'):
+            value = value == 'Yes'
+        changes[name] = value
+    return changes
+
+
+def edit_form_submission(model, form, entity, entity_id):
+    # Shared by the venue and artist edit pages. Returns a flash message
+    # describing the outcome.
+    if not form.validate() or form.version.data is None:
+        return 'Please double check the fields.'
+    names = [field.name for field in form if field.name != 'version']
+    try:
+        result = update_entity(model, entity, entity_id, form.version.data, form_changes(form, names))
+    except StaleVersion:
+        return ('The {} was changed by someone else while you were editing it. '
+                'Review the current details and submit your changes again.'.format(entity))
+    except SQLAlchemyError:
+        current_app.logger.exception('database error')
+        db.session.rollback()
+        return 'An error occurred. The {} could not be updated.'.format(entity)
+    finally:
+        db.session.close()
+    if result is None:
+        abort(404)
+    return None
+
+
+def patch_entity(model, form_class, entity, entity_id):
+    # JSON PATCH body: {"version": 3, "<field>": <value>, ...}. Only the
+    # fields present are validated and written; seeking_* take booleans.
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or type(body.get('version')) is not int:
+        return jsonify({'success': False,
+                        'message': 'Expected a JSON object with the "version" being edited.'}), 400
+    formdata = MultiDict()
+    for name, value in body.items():
+        if isinstance(value, bool):
+            value = 'Yes' if value else 'No'
+        if isinstance(value, list):
+            formdata.setlist(name, value)
+        elif name != 'version':
+            formdata[name] = value
+    form = form_class(formdata)
+    form.validate()
+    names = [field.name for field in form if field.name in formdata]
+    errors = {name: messages for name, messages in form.errors.items() if name in formdata}
+    for name in set(formdata) - set(names):
+        errors[name] = ['Not an editable field.']
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
 
+    try:
+        result = update_entity(model, entity, entity_id, body['version'], form_changes(form, names))
+    except StaleVersion as e:
+        return jsonify({'success': False, 'version': e.version,
+                        'message': 'The {} was changed since version {}.'.format(entity, body['version'])}), 409
+    except SQLAlchemyError:
+        current_app.logger.exception('database error')
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'The {} could not be updated.'.format(entity)}), 500
+    finally:
+        db.session.close()
+    if result is None:
+        abort(404)
+    return jsonify({'success': True, 'id': entity_id, 'version': result[0], 'updated': result[1]})
+
+
+def delete_venues(venue_ids):
+    # Deletes venues and their shows with set-based DELETEs in one
+    # transaction, a chunk of ids at a time. The show rows are removed
+    # explicitly rather than left to ON DELETE CASCADE so the count can be
+    # reported, and so SQLite without foreign key enforcement behaves the
+    # same. Returns (deleted venue ids, number of shows deleted).
+    venue_ids = sorted(set(venue_ids))
+    deleted = []
+    shows_deleted = 0
+    chunk = current_app.config['DELETE_CHUNK_SIZE']
+    for start in range(0, len(venue_ids), chunk):
+        ids = venue_ids[start:start + chunk]
+        found = [row.id for row in db.session.query(Venue.id).filter(Venue.id.in_(ids))]
+        if not found:
+            continue
+        shows_deleted += db.session.query(Show).filter(
+            Show.venue_id.in_(found)).delete(synchronize_session=False)
+        db.session.query(Venue).filter(Venue.id.in_(found)).delete(synchronize_session=False)
+        deleted.extend(found)
+    db.session.commit()
+    for venue_id in deleted:
+        fragment_cache().invalidate('venue', venue_id)
+        genre_indexes['venue'].remove(venue_id)
+    return deleted, shows_deleted
+
+
+def genre_facets(model, genres):
+    # {genre: count} among the venues or artists that have every selected
+    # genre; served from the in-memory bitmaps unless GENRE_FACETS is 'sql'.
+    if current_app.config['GENRE_FACETS'] == 'sql':
+        return genre_counts(db, model.__tablename__, genres)
+    index = genre_indexes[model.__tablename__]
+    if index.stale(current_app.config['GENRE_INDEX_TTL']):
+        index.load(db.session.query(model.id, model.genres))
+    return index.counts(genres)
+
+
+def resolve_location(city, state):
+    # Id of the (state, city) location, created on first use. A concurrent
+    # insert of the same location loses on the unique constraint inside the
+    # savepoint and reads the winner's row instead.
+    location_id = db.session.query(Location.id).filter_by(state=state, city=city).scalar()
+    if location_id is None:
+        location = Location(state=state, city=city)
+        try:
+            with db.session.begin_nested():
+                db.session.add(location)
+            location_id = location.id
+        except IntegrityError:
+            location_id = db.session.query(Location.id).filter_by(state=state, city=city).scalar()
+    return location_id
+
+
+def location_filter(query, model, joined=False):
+    # ?state= and ?city= narrow a listing to one area through the location
+    # index; a city alone matches that city name in every state.
+    state, city = request.args.get('state'), request.args.get('city')
+    if state or city:
+        if not joined:
+            query = query.join(Location, Location.id == model.location_id)
+        if state:
+            query = query.filter(Location.state == state)
+        if city:
+            query = query.filter(Location.city == city)
+    return query
+
+
+def nearby(model, latitude, longitude, km, limit):
+    # (distance, id, name, city, state) of the venues or artists within km
+    # of the point, closest first.
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, km)
+    locations = {}
+    for location in db.session.query(Location).filter(
+            Location.latitude.between(min_lat, max_lat),
+            Location.longitude.between(min_lng, max_lng)):
+        distance = distance_km(latitude, longitude, location.latitude, location.longitude)
+        if distance <= km:
+            locations[location.id] = (distance, location)
+    if not locations:
+        return []
+    rows = db.session.query(model.id, model.name, model.location_id) \
+        .filter(model.location_id.in_(list(locations))).all()
+    found = sorted((locations[row.location_id][0], row.id, row.name, locations[row.location_id][1])
+                   for row in rows)[:limit]
+    return [(distance, entity_id, name, location.city, location.state)
+            for distance, entity_id, name, location in found]
+
+
+def nearby_response(model, key):
+    # GET ?lat=&lng=&km= as JSON, closest first.
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    km = request.args.get('km', current_app.config['NEARBY_KM'], type=float)
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 or km <= 0:
+        return jsonify({'success': False, 'message': 'Expected numeric lat and lng query parameters.'}), 400
+    limit = max(1, min(request.args.get('limit', current_app.config['NEARBY_LIMIT'], type=int),
+                       current_app.config['NEARBY_LIMIT']))
+    return jsonify({
+        'success': True,
+        key: [{'id': entity_id, 'name': name, 'city': city, 'state': state,
+               'distance_km': round(distance, 1)}
+              for distance, entity_id, name, city, state in nearby(model, latitude, longitude, km, limit)]
+    })
 
 #----------------------------------------------------------------------------#
 # Filters.
@@ -100,6 +466,8 @@ class Artist(db.Model):
 
 
 def format_datetime(value, format='medium'):
+    import babel.dates
+    import dateutil.parser
     date = dateutil.parser.parse(value)
     if format == 'full':
         format = "EEEE MMMM, d, y 'at' h:mma"
@@ -108,14 +476,12 @@ def format_datetime(value, format='medium'):
     return babel.dates.format_datetime(date, format, locale='en')
 
 
-app.jinja_env.filters['datetime'] = format_datetime
-
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -123,31 +489,37 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues')
+@bp.route('/venues')
 def venues():
-    #   num_shows should be aggregated based on number of upcoming shows per venue.
+    # Venues grouped by area, a (state, city) location, in one query; the
+    # upcoming show count is a correlated subquery on the show index.
+    genres = request.args.getlist('genre')
+    upcoming = db.session.query(db.func.count()).filter(
+        Show.venue_id == Venue.id, Show.start_time >= datetime.now()).correlate(Venue).as_scalar()
+    query = db.session.query(Venue.id, Venue.name, Location.city, Location.state, upcoming) \
+        .join(Location, Location.id == Venue.location_id)
+    query = location_filter(query, Venue, joined=True)
+    query = genre_filter(db, query, 'venue', genres) \
+        .order_by(Location.state, Location.city, Venue.name, Venue.id)
+
     data = []
+    for (area_city, area_state), rows in groupby(query, key=lambda row: (row[2], row[3])):
+        data.append({
+            "city": area_city,
+            "state": area_state,
+            "venues": [{"id": venue_id, "name": name, "num_upcoming_shows": num_upcoming_shows}
+                       for venue_id, name, _, _, num_upcoming_shows in rows]
+        })
+    return render_template('pages/venues.html', areas=data, selected_genres=genres,
+                           genre_facets=sorted(genre_facets(Venue, genres).items()))
 
-    cities = db.session.query(Venue.city).group_by('city').all()
-    for city in cities:
-        exampleVenue = Venue.query.filter_by(city=city).first()
-        cityDic = {"city": exampleVenue.city,
-                   "state": exampleVenue.state,
-                   "venues": []
-                   }
-        venues = Venue.query.filter_by(city=city).all()
-        for venue in venues:
-            venueDic = {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": Show.query.filter_by(venue_id=venue.id).filter(Show.start_time >= datetime.now()).count()
-            }
-            cityDic["venues"].append(venueDic)
-        data.append(cityDic)
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+
+@bp.route('/venues/near')
+def venues_near():
+    return nearby_response(Venue, 'venues')
+
+
+@bp.route('/venues/search', methods=['POST'])
 def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
@@ -169,61 +541,55 @@ def search_venues():
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    data = []
-    for venue in Venue.query.all():
-        venueDic = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": venue.genres,
-            "address": venue.address,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "website": venue.website,
-            "facebook_link": venue.facebook_link,
-            "seeking_talent": venue.seeking_talent,
-            "seeking_description": venue.seeking_description,
-            "image_link": venue.image_link,
-            "past_shows": [],
-            "upcoming_shows": [],
-            "past_shows_count": Show.query.filter_by(venue_id=venue.id).filter(Show.start_time < datetime.now()).count(),
-            "upcoming_shows_count": Show.query.filter_by(venue_id=venue.id).filter(Show.start_time >= datetime.now()).count(),
-        }
- 
-        shows = Show.query.join(Venue, Show.venue_id == venue.id).all()
-        for show in shows:
-            artist = Artist.query.filter_by(id=show.artist_id).one()
-            showDic = {
-                "artist_id": show.artist_id,
-                "artist_name": artist.name,
-                "artist_image_link": artist.image_link,
-                "start_time": format_datetime(show.start_time.strftime("%Y-%m-%d, %H:%M:%S"))
-            }
-            if isPast(show.start_time):
-                venueDic["past_shows"].append(showDic)
-            else:
-                venueDic["upcoming_shows"].append(showDic)
-        data.append(venueDic)
-
-    data = list(filter(lambda d: d['id'] ==
-                       venue_id, data))[0]
+    # shows the venue page with the given venue_id: the venue, then its
+    # shows with their artists in one joined query
+    venue = Venue.query.get_or_404(venue_id)
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": [],
+        "upcoming_shows": [],
+    }
+    shows = db.session.query(Show.artist_id, Artist.name, Artist.image_link, Show.start_time) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.venue_id == venue_id).order_by(Show.start_time)
+    for artist_id, artist_name, artist_image_link, start_time in shows:
+        data["past_shows" if isPast(start_time) else "upcoming_shows"].append({
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": artist_image_link,
+            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+    data["past_shows_count"] = len(data["past_shows"])
+    data["upcoming_shows_count"] = len(data["upcoming_shows"])
     return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
+    from forms import VenueForm
     form = VenueForm(request.form)
     error = False
 
@@ -240,10 +606,12 @@ def create_venue_submission():
                 facebook_link=request.form['facebook_link'],
                 website=request.form['website'],
                 seeking_talent=request.form['seeking_talent'] == 'Yes',
-                seeking_description=request.form['seeking_description']
+                seeking_description=request.form['seeking_description'],
+                location_id=resolve_location(request.form['city'], request.form['state'])
             )
             db.session.add(newVenue)
             db.session.commit()
+            genre_indexes['venue'].set(newVenue.id, newVenue.genres)
             flash('Venue ' + request.form['name'] + ' has been created!')
         except:
             error = True
@@ -262,38 +630,73 @@ def create_venue_submission():
         return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    # Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    return delete_venues_response([venue_id])
+
+
+@bp.route('/venues', methods=['DELETE'])
+def delete_venues_bulk():
+    # Deletes many venues, and all of their shows, from a JSON body:
+    #   {"venue_ids": [1, 2, 3]}
+    body = request.get_json(silent=True)
+    venue_ids = body.get('venue_ids') if isinstance(body, dict) else None
+    if not isinstance(venue_ids, list) or len(venue_ids) == 0 or \
+            not all(type(venue_id) is int for venue_id in venue_ids):
+        return jsonify({'success': False,
+                        'message': 'Expected a JSON object with a non-empty "venue_ids" list of integers.'}), 400
+    if len(venue_ids) > current_app.config['BULK_DELETE_MAX']:
+        return jsonify({'success': False, 'message': 'At most {} venues per request.'.format(
+            current_app.config['BULK_DELETE_MAX'])}), 413
+    return delete_venues_response(venue_ids)
+
+
+def delete_venues_response(venue_ids):
     try:
-        venue = Venue.query.filter_by(id=venue_id).one()
-        db.session.delete(venue)
-        db.session.commit()
-    except:
+        deleted, shows_deleted = delete_venues(venue_ids)
+    except SQLAlchemyError:
+        current_app.logger.exception('database error')
         db.session.rollback()
+        return jsonify({'success': False, 'message': 'Venues could not be deleted.'}), 500
     finally:
         db.session.close()
 
-    # TODO: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
-
-    print("DELETE")
-    return render_template('pages/home.html')
+    missing = sorted(set(venue_ids) - set(deleted))
+    return jsonify({
+        'success': not missing,
+        'deleted': deleted,
+        'shows_deleted': shows_deleted,
+        'missing': missing
+    }), 404 if not deleted else 200
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@bp.route('/artists')
 def artists():
-    data = []
-    artists = Artist.query.all()
-    for artist in artists:
-        artistDic = {"id": artist.id, "name": artist.name}
-        data.append(artistDic)
-    return render_template('pages/artists.html', artists=data)
-
-
-@app.route('/artists/search', methods=['POST'])
+    # Only id and name are shown, so only those columns are loaded, one
+    # alphabetical page at a time, resuming after the (name, id) cursor.
+    per_page = max(1, min(request.args.get('limit', current_app.config['ARTISTS_PER_PAGE'], type=int),
+                          current_app.config['ARTISTS_MAX_PER_PAGE']))
+    genres = request.args.getlist('genre')
+    query = location_filter(db.session.query(Artist.id, Artist.name), Artist)
+    query = genre_filter(db, query, 'artist', genres).order_by(Artist.name, Artist.id)
+    cursor = request.args.get('after')
+    if cursor:
+        name, artist_id = decode_cursor(cursor, (str, int))
+        query = query.filter(db.or_(Artist.name > name,
+                                    db.and_(Artist.name == name, Artist.id > artist_id)))
+    page = KeysetPage(query, per_page)
+    facets = sorted(genre_facets(Artist, genres).items())
+    return Response(stream_with_context(stream_template(
+        'pages/artists.html', artists=page, selected_genres=genres, genre_facets=facets)))
+
+
+@bp.route('/artists/near')
+def artists_near():
+    return nearby_response(Artist, 'artists')
+
+
+@bp.route('/artists/search', methods=['POST'])
 def search_artists():
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
@@ -315,129 +718,108 @@ def search_artists():
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    # shows the artist page with the given artist_id
-    data = []
-
-    artists = Artist.query.all()
-    print(Artist.query)
-    for artist in artists:
-        artistDic = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": artist.genres,
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "seeking_venue": artist.seeking_venue,
-            "image_link": artist.image_link,
-            "past_shows": [],
-            "upcoming_shows": [],
-            "past_shows_count": Show.query.filter_by(artist_id=artist.id).filter(Show.start_time < datetime.now()).count(),
-            "upcoming_shows_count": Show.query.filter_by(artist_id=artist.id).filter(Show.start_time >= datetime.now()).count(),
-        }
-        shows = Show.query.filter_by(artist_id=artist.id).all()
-        for show in shows:
-            venue = Venue.query.filter_by(id=show.venue_id).one()
-            showDic = {
-                "venue_id": show.venue_id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": format_datetime(show.start_time.strftime("%Y-%m-%d, %H:%M:%S"))
-            }
-            if isPast(show.start_time):
-                artistDic["past_shows"].append(showDic)
-            else:
-                artistDic["upcoming_shows"].append(showDic)
-        data.append(artistDic)
-    data = list(filter(lambda d: d['id'] ==
-                       artist_id, data))[0]
+    # shows the artist page with the given artist_id: the artist, then its
+    # shows with their venues in one joined query
+    artist = Artist.query.get_or_404(artist_id)
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "seeking_venue": artist.seeking_venue,
+        "image_link": artist.image_link,
+        "past_shows": [],
+        "upcoming_shows": [],
+    }
+    shows = db.session.query(Show.venue_id, Venue.name, Venue.image_link, Show.start_time) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .filter(Show.artist_id == artist_id).order_by(Show.start_time)
+    for venue_id, venue_name, venue_image_link, start_time in shows:
+        data["past_shows" if isPast(start_time) else "upcoming_shows"].append({
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "venue_image_link": venue_image_link,
+            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+    data["past_shows_count"] = len(data["past_shows"])
+    data["upcoming_shows_count"] = len(data["upcoming_shows"])
     return render_template('pages/show_artist.html', artist=data)
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@use_primary
 def edit_artist(artist_id):
-    form = ArtistForm()
+    from forms import ArtistForm
     artist = db.session.query(Artist).filter_by(id=artist_id).one()
-    # BUG can't populate select fields with default values
+    form = ArtistForm(obj=artist)
+    form.seeking_venue.data = 'Yes' if artist.seeking_venue else 'No'
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-    # take values from the form submitted, and update existing
-    # artist record with ID <artist_id> using the new attributes
-    form = ArtistForm()
-    try:
-        artist = Artist.query.filter_by(id=artist_id).one()
-        artist.name = request.form['name'],
-        artist.image_link = request.form['image_link'],
-        artist.city = request.form['city'],
-        artist.state = request.form['state'],
-        artist.phone = request.form['phone'],
-        artist.genres = request.form.getlist('genres'),
-        # artist.seeking_venue = request.form['seeking_venue'] == 'Yes',
-        artist.seeking_description = request.form['seeking_description'],
-        artist.facebook_link = request.form['facebook_link'],
-        artist.website = request.form['website']
-        db.session.commit()
-    except RuntimeError as e:
-        db.session.rollback()
-        print("ERROR!!!")
-        print(e)
-    finally:
-        db.session.close()
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    from forms import ArtistForm
+    # take values from the form submitted, and update the columns that
+    # changed on artist record with ID <artist_id>
+    error = edit_form_submission(Artist, ArtistForm(request.form), 'artist', artist_id)
+    if error:
+        flash(error)
+        return redirect(url_for('fyyur.edit_artist', artist_id=artist_id))
+    return redirect(url_for('fyyur.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>', methods=['PATCH'])
+def patch_artist(artist_id):
+    from forms import ArtistForm
+    return patch_entity(Artist, ArtistForm, 'artist', artist_id)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@use_primary
 def edit_venue(venue_id):
-    form = VenueForm()
+    from forms import VenueForm
     venue = Venue.query.filter_by(id=venue_id).one()
-    # BUG can't populate select fields with default values
+    form = VenueForm(obj=venue)
+    form.seeking_talent.data = 'Yes' if venue.seeking_talent else 'No'
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-    # take values from the form submitted, and update existing
-    # venue record with ID <venue_id> using the new attributes
+    from forms import VenueForm
+    # take values from the form submitted, and update the columns that
+    # changed on venue record with ID <venue_id>
+    error = edit_form_submission(Venue, VenueForm(request.form), 'venue', venue_id)
+    if error:
+        flash(error)
+        return redirect(url_for('fyyur.edit_venue', venue_id=venue_id))
+    return redirect(url_for('fyyur.show_venue', venue_id=venue_id))
 
-    try:
-        venue = db.session.query(Venue).filter_by(id=venue_id).one()
-        print(venue)
-        venue.name = request.form['name'],
-        vanue.image_link = request.form['image_link'],
-        venue.city = request.form['city'],
-        venue.state = request.form['state'],
-        venue.address = request.form['address'],
-        venue.phone = request.form['phone'],
-        venue.genres = request.form.getlist('genres'),
-        venue.seeking_talent = request.form['seeking_talent'] == 'Yes',
-        venue.seeking_description = request.form['seeking_description'],
-        venue.facebook_link = request.form['facebook_link'],
-        venue.website = request.form['website']
-        db.session.commit()
-    except:
-        db.session.rollback()
-    finally:
-        db.session.close()
-    return redirect(url_for('show_venue', venue_id=venue_id))
+
+@bp.route('/venues/<int:venue_id>', methods=['PATCH'])
+def patch_venue(venue_id):
+    from forms import VenueForm
+    return patch_entity(Venue, VenueForm, 'venue', venue_id)
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
+    from forms import ArtistForm
     # called upon submitting the new artist listing form
     form = ArtistForm(request.form)
     error = False
@@ -454,10 +836,12 @@ def create_artist_submission():
                 facebook_link=request.form['facebook_link'],
                 website=request.form['website'],
                 seeking_venue=request.form['seeking_venue'] == 'Yes',
-                seeking_description=request.form['seeking_description']
+                seeking_description=request.form['seeking_description'],
+                location_id=resolve_location(request.form['city'], request.form['state'])
             )
             db.session.add(newArtist)
             db.session.commit()
+            genre_indexes['artist'].set(newArtist.id, newArtist.genres)
             flash('Artist ' + request.form['name'] + ' has been created!')
         except RuntimeError as e:
             error = True
@@ -471,7 +855,7 @@ def create_artist_submission():
         else:
             return render_template('pages/home.html')
     else:
-        print(form.errors)
+        current_app.logger.info('artist form rejected: %s', form.errors)
         flash('Artist ' + request.form['name'] +
               ' cannot be listed. Please double check the fields.')
         return render_template('forms/new_artist.html', form=form)
@@ -480,50 +864,52 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
 def shows():
     # displays list of shows at /shows
     #       num_shows should be aggregated based on number of upcoming shows per venue.
     data = []
-    shows = Show.query.all()
-    for show in shows:
+    shows = db.session.query(Show.venue_id, Show.artist_id, Show.start_time,
+                             Venue.name, Artist.name, Artist.image_link) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id).all()
+    for venue_id, artist_id, start_time, venue_name, artist_name, artist_image_link in shows:
         showDic = {
-            "venue_id": show.venue_id,
-            "venue_name": Venue.query.filter_by(id=show.venue_id).first().name,
-            "artist_id": show.artist_id,
-            "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-            "start_time": format_datetime(show.start_time.strftime("%Y-%m-%d, %H:%M:%S"))
+            "venue_id": venue_id,
+            "venue_name": venue_name,
+            "artist_id": artist_id,
+            "artist_name": artist_name,
+            "artist_image_link": artist_image_link,
+            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S")
         }
         data.append(showDic)
     return render_template('pages/shows.html', shows=data)
 
 
-@app.route('/shows/create')
+@bp.route('/shows/create')
 def create_shows():
+    from forms import ShowForm
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
+    from forms import ShowForm
     form = ShowForm(request.form)
     error = False
 
     if form.validate():
         try:
-            start_time_string = request.form['start_time']
-            newShow = Show(
-                venue_id=request.form['venue_id'],
-                artist_id=request.form['artist_id'],
-                start_time=datetime.strptime(
-                    start_time_string, '%Y-%m-%d %H:%M:%S')
-            )
-            db.session.add(newShow)
-            db.session.commit()
-            flash('Show was successfully listed!')
-        except RuntimeError as e:
-            print(e)
+            # A new show only adds its own row fragment, nothing to retire.
+            created, conflicts = schedule_shows([{
+                'venue_id': request.form['venue_id'],
+                'artist_id': request.form['artist_id'],
+                'start_time': request.form['start_time']
+            }])
+        except SQLAlchemyError:
+            current_app.logger.exception('database error')
             error = True
             db.session.rollback()
         finally:
@@ -531,45 +917,72 @@ def create_show_submission():
         if error:
             flash('An error occurred. Show could not be listed.')
             return render_template('forms/new_show.html', form=form)
+        elif conflicts:
+            flash('Show could not be listed: ' + '; '.join(conflicts[0]) + '.')
+            return render_template('forms/new_show.html', form=form)
         else:
+            flash('Show was successfully listed!')
             return render_template('pages/home.html')
     else:
         flash('Artist or Venue id does not exist. Please check all the fields.')
         return render_template('forms/new_show.html', form=form)
 
 
-@app.errorhandler(404)
+@bp.route('/shows/bulk', methods=['POST'])
+def create_shows_bulk():
+    # Schedules many shows at once from a JSON body:
+    #   {"shows": [{"venue_id": 1, "artist_id": 2, "start_time": "..."}],
+    #    "partial": false}
+    # Nothing is inserted if any row conflicts unless "partial" is true, in
+    # which case the clean rows are inserted and the rest reported.
+    body = request.get_json(silent=True)
+    rows = body.get('shows') if isinstance(body, dict) else None
+    if not isinstance(rows, list) or len(rows) == 0:
+        return jsonify({'success': False,
+                        'message': 'Expected a JSON object with a non-empty "shows" list.'}), 400
+    if len(rows) > current_app.config['BULK_SHOWS_MAX']:
+        return jsonify({'success': False, 'message': 'At most {} shows per request.'.format(
+            current_app.config['BULK_SHOWS_MAX'])}), 413
+
+    try:
+        created, errors = schedule_shows(rows, partial=bool(body.get('partial')))
+    except SQLAlchemyError:
+        current_app.logger.exception('database error')
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Shows could not be listed.'}), 500
+    finally:
+        db.session.close()
+
+    conflicts = [{'index': index, 'show': rows[index], 'errors': errors[index]}
+                 for index in sorted(errors)]
+    return jsonify({
+        'success': not errors,
+        'created': created,
+        'conflicts': conflicts
+    }), 409 if errors and not created else 200
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,212 @@
+#----------------------------------------------------------------------------#
+# Rendered fragment cache.
+#
+# Templates wrap expensive, rarely changing markup in a cache block:
+#
+#   {% cache 'venue_card', ('venue', venue.id) %} ... {% endcache %}
+#
+# The first argument names the fragment. Every (entity, id) pair after it is
+# a dependency whose current version becomes part of the key, so bumping the
+# version with invalidate('venue', 3) retires every fragment built from
+# venue 3 without having to find them. Any other argument is used verbatim.
+#
+# With read replicas, a page rendered on a replica just after an edit may
+# predate it, although the version in its key is already the new one. For
+# replica_lag seconds (REPLICA_STICKY_SECONDS) after a dependency changed,
+# such a fragment is served but not stored.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from fsnd_common.metrics import CACHE_REQUESTS
+
+
+class LRUBackend(object):
+    # In-process store; fastest, but every worker keeps its own copy and
+    # only sees its own invalidations.
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileBackend(object):
+    # One file per key in a local directory, shared by all workers on the
+    # host. Writes go through a temp file and os.replace so readers never
+    # see a partial fragment.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp, self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+
+def reading_replica():
+    # whether this request's db.session reads a replica (fsnd_common.replicas)
+    return has_request_context() and g.get('db_bind') is not None
+
+
+class FragmentCache(object):
+
+    def __init__(self, backend, replica_lag=0):
+        self.backend = backend
+        self.replica_lag = replica_lag
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def version(self, entity, entity_id):
+        # '<n>/<time of the change>', or '0' for an entity never changed
+        return self.backend.get('version:{}:{}'.format(entity, entity_id)) \
+            or '0'
+
+    def invalidate(self, entity, entity_id):
+        # Retires every fragment that depends on this entity.
+        version = int(self.version(entity, entity_id).split('/')[0]) + 1
+        self.backend.set('version:{}:{}'.format(entity, entity_id),
+                         '{}/{:.3f}'.format(version, time.time()))
+
+    def key(self, name, parts):
+        return self._key(name, parts)[0]
+
+    def _key(self, name, parts):
+        # the key, and when the newest of its dependencies changed
+        key = [name]
+        changed = 0.0
+        for part in parts:
+            if isinstance(part, tuple) and len(part) == 2:
+                version = self.version(*part)
+                key.append('{}:{}@{}'.format(part[0], part[1], version))
+                if '/' in version:
+                    changed = max(changed, float(version.split('/')[1]))
+            else:
+                key.append(str(part))
+        return '|'.join(key), changed
+
+    def fetch(self, name, parts, render):
+        key, changed = self._key(name, parts)
+        value = self.backend.get(key)
+        self._count(name, value is not None)
+        if value is None:
+            value = render()
+            if not (time.time() - changed < self.replica_lag and reading_replica()):
+                self.backend.set(key, value)
+        return value
+
+    def _count(self, name, hit):
+        CACHE_REQUESTS.inc(('fragment', name, 'hit' if hit else 'miss'))
+        with self._lock:
+            stats = self._stats.setdefault(name, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+
+    def stats(self):
+        # Hit/miss counters per fragment name, plus the hit ratio.
+        with self._lock:
+            stats = {}
+            for name, counts in self._stats.items():
+                total = counts['hits'] + counts['misses']
+                stats[name] = dict(counts, ratio=(
+                    counts['hits'] / float(total) if total else 0.0))
+            return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def clear(self):
+        self.backend.clear()
+        self.reset_stats()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        parts = []
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [name, nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, name, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return Markup(cache.fetch(name, parts, lambda: str(caller())))
+
+
+def create_cache(config):
+    backend = config.get('FRAGMENT_CACHE_BACKEND', 'lru')
+    if backend == 'file':
+        return FragmentCache(FileBackend(config['FRAGMENT_CACHE_DIR']))
+    if backend == 'lru':
+        return FragmentCache(LRUBackend(config.get('FRAGMENT_CACHE_SIZE',
+                                                   10000)))
+    raise ValueError('Unknown fragment cache backend: {}'.format(backend))
+
+
+def init_cache(app):
+    cache = create_cache(app.config)
+    if 'replicas' in app.extensions:
+        # call init_replicas first
+        cache.replica_lag = app.config['REPLICA_STICKY_SECONDS']
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = cache
+    app.extensions['fragment_cache'] = cache
+    return cache
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -10,7 +11,63 @@ DEBUG = True
 
 
 # IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://gogumalatte@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgres://gogumalatte@localhost:5432/fyyur')
+
+# Read replicas: GET requests read from one of these, other requests and
+# anyone who wrote in the last REPLICA_STICKY_SECONDS from the primary.
+SQLALCHEMY_REPLICA_URIS = [url for url in os.environ.get(
+    'DATABASE_REPLICA_URLS', '').split(',') if url]
+REPLICA_STICKY_SECONDS = 10
 
 # Disable CSRF checks in all views
 WTF_CSRF_ENABLED = False
+
+# Rendered fragment cache: 'lru' keeps fragments in each worker's memory,
+# 'file' shares them between workers through FRAGMENT_CACHE_DIR.
+FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'lru')
+FRAGMENT_CACHE_SIZE = 10000
+FRAGMENT_CACHE_DIR = os.environ.get(
+    'FRAGMENT_CACHE_DIR', os.path.join(basedir, '.fragment_cache'))
+
+# Artists listed per page on /artists; ?limit= may raise it up to the max.
+ARTISTS_PER_PAGE = 100
+ARTISTS_MAX_PER_PAGE = 1000
+
+# How long a show blocks its venue and artist, and the largest batch
+# accepted by POST /shows/bulk.
+SHOW_DURATION = timedelta(hours=3)
+BULK_SHOWS_MAX = 5000
+
+# Largest batch accepted by DELETE /venues, and how many ids go into each
+# IN (...) list while deleting.
+BULK_DELETE_MAX = 5000
+DELETE_CHUNK_SIZE = 500
+
+# Async JSON API (api.py). Defaults to SQLALCHEMY_DATABASE_URI with the
+# matching async driver.
+API_DATABASE_URL = os.environ.get('API_DATABASE_URL')
+API_PER_PAGE = 100
+API_MAX_PER_PAGE = 1000
+
+# Genre facet counts on /venues and /artists: 'bitmap' serves them from an
+# in-memory index per worker, reloaded after GENRE_INDEX_TTL seconds; 'sql'
+# runs one aggregate query per page view.
+GENRE_FACETS = os.environ.get('GENRE_FACETS', 'bitmap')
+GENRE_INDEX_TTL = 60
+
+# Default radius and largest result of /venues/near and /artists/near.
+NEARBY_KM = 50
+NEARBY_LIMIT = 100
+
+# Cold start budget for one worker (import app, create_app() and the first
+# request), checked by `python startup.py`; see the README.
+STARTUP_BUDGET_MS = 400
+
+# Logs are JSON lines written by a background thread (fsnd_common/logs.py):
+# to error.log, rotated at LOG_MAX_BYTES, when DEBUG is off, to stderr
+# otherwise, or to $LOG_FILE. Only one in LOG_SAMPLE_EVERY info lines of a
+# kind is kept.
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 1))
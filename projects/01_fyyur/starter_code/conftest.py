@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from fsnd_common import testing
+
+# config reads DATABASE_URL when app is imported
+os.environ['DATABASE_URL'] = testing.database_url('fyyur')
+
+
+@pytest.fixture(scope='session')
+def fyyur():
+    import app as fyyur
+    from generate import generate
+
+    with fyyur.app.app_context():
+        fyyur.db.create_all()
+        testing.prepare(fyyur.db.engine)
+        generate(fyyur.db, (fyyur.Venue, fyyur.Artist, fyyur.Show, fyyur.Location),
+                 venues=50, artists=50, shows=500, cities=10, log=lambda msg: None)
+    return fyyur
+
+
+@pytest.fixture(scope='session')
+def app(fyyur):
+    return fyyur.app
+
+
+@pytest.fixture(autouse=True)
+def transaction(fyyur):
+    # what the previous test cached was rolled back with it
+    fyyur.cache.clear()
+    for index in fyyur.genre_indexes.values():
+        index.loaded_at = None
+    with fyyur.app.app_context(), testing.rollback(fyyur.db) as session:
+        yield session
@@ -1,7 +1,98 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
+from markupsafe import Markup
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, IntegerField
 from wtforms.validators import DataRequired, AnyOf, URL, Optional, ValidationError
+from wtforms.widgets import html_params, HiddenInput
+
+
+class ChoiceRegistry(object):
+    # An immutable set of select options shared by every form instance: the
+    # (value, label) tuples, a frozenset for membership checks, and each
+    # <option> pre-rendered both plain and selected.
+
+    def __init__(self, values):
+        self.choices = tuple((value, value) for value in values)
+        self.values = frozenset(values)
+        self.options = tuple(
+            (value,
+             Markup('<option value="%s">%s</option>') % (value, value),
+             Markup('<option selected value="%s">%s</option>') % (value, value))
+            for value in values)
+
+
+STATES = ChoiceRegistry([
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI',
+    'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH',
+    'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN',
+    'MS', 'MO', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+    'WV', 'WI', 'WY',
+])
+ARTIST_GENRES = ChoiceRegistry([
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+    'Other',
+])
+VENUE_GENRES = ChoiceRegistry([
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+    'Swing', 'Other',
+])
+YES_NO = ChoiceRegistry(['Yes', 'No'])
+
+
+class RegistrySelect(object):
+    # Renders a <select> by joining the registry's pre-rendered options.
+
+    def __init__(self, multiple=False):
+        self.multiple = multiple
+
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        if self.multiple:
+            kwargs['multiple'] = True
+        if 'required' not in kwargs and 'required' in getattr(field, 'flags', []):
+            kwargs['required'] = True
+        if self.multiple:
+            selected = frozenset(field.data or ())
+        else:
+            selected = frozenset((field.data,))
+        html = [Markup('<select %s>') % Markup(html_params(name=field.name, **kwargs))]
+        for value, plain, chosen in field.registry.options:
+            html.append(chosen if value in selected else plain)
+        html.append(Markup('</select>'))
+        return Markup('').join(html)
+
+
+class RegistrySelectField(SelectField):
+    widget = RegistrySelect()
+
+    def __init__(self, label=None, validators=None, registry=None, **kwargs):
+        # choices is the registry's tuple itself; SelectField would copy it
+        super(RegistrySelectField, self).__init__(label, validators, **kwargs)
+        self.registry = registry
+        self.choices = registry.choices
+
+    def pre_validate(self, form):
+        if self.data not in self.registry.values:
+            raise ValidationError(self.gettext('Not a valid choice'))
+
+
+class RegistrySelectMultipleField(SelectMultipleField):
+    widget = RegistrySelect(multiple=True)
+
+    def __init__(self, label=None, validators=None, registry=None, **kwargs):
+        super(RegistrySelectMultipleField, self).__init__(label, validators, **kwargs)
+        self.registry = registry
+        self.choices = registry.choices
+
+    def pre_validate(self, form):
+        for value in self.data or ():
+            if value not in self.registry.values:
+                raise ValidationError(self.gettext("'%(value)s' is not a valid choice for this field") % dict(value=value))
+
 
 class ShowForm(Form):
 
@@ -14,7 +105,7 @@ class ShowForm(Form):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default=datetime.today()
+        default=datetime.today
     )
 
     # def validate_artist_id(self, artist_id):
@@ -41,61 +132,9 @@ class VenueForm(Form):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = RegistrySelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        registry=STATES
     )
     address = StringField(
         'address', validators=[DataRequired()]
@@ -106,30 +145,9 @@ class VenueForm(Form):
     image_link = StringField(
         'image_link', validators=[URL(), Optional()]
     )
-    genres = SelectMultipleField(
+    genres = RegistrySelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Swing', 'Swing'),
-            ('Other', 'Other'),
-        ]
+        registry=VENUE_GENRES
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL(), Optional()]
@@ -137,16 +155,17 @@ class VenueForm(Form):
     website = StringField(
         'website', validators=[URL(), Optional()]
     )
-    seeking_talent = SelectField(
+    seeking_talent = RegistrySelectField(
         'seeking_talent', validators=[DataRequired()],
-        choices=[
-            ('Yes', 'Yes'),
-            ('No', 'No')
-        ]
+        registry=YES_NO
     )
     seeking_description = StringField(
         'seeking_description'
     )
+    # the row version the edit page was built from; see update_entity
+    version = IntegerField(
+        'version', widget=HiddenInput(), validators=[Optional()]
+    )
 
 
 class ArtistForm(Form):
@@ -156,61 +175,9 @@ class ArtistForm(Form):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = RegistrySelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        registry=STATES
     )
     phone = StringField(
         'phone'
@@ -218,29 +185,9 @@ class ArtistForm(Form):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
+    genres = RegistrySelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        registry=ARTIST_GENRES
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL(), Optional()]
@@ -248,15 +195,16 @@ class ArtistForm(Form):
     website = StringField(
         'website', validators=[URL(), Optional()]
     )
-    seeking_venue = SelectField(
+    seeking_venue = RegistrySelectField(
         'seeking_venue', validators=[DataRequired()],
-        choices=[
-            ('Yes', 'Yes'),
-            ('No', 'No')
-        ]
+        registry=YES_NO
     )
     seeking_description = StringField(
         'seeking_description'
     )
+    # the row version the edit page was built from; see update_entity
+    version = IntegerField(
+        'version', widget=HiddenInput(), validators=[Optional()]
+    )
 
 
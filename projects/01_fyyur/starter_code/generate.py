@@ -0,0 +1,287 @@
+#----------------------------------------------------------------------------#
+# Synthetic data generator.
+#
+#   python generate.py --venues 100000 --artists 200000 --shows 2000000
+#
+# Bulk-loads locations, venues, artists and shows into the database configured in
+# config.py (DATABASE_URL). Postgres is loaded with COPY, anything else with
+# batched executemany inserts. The same --seed and --anchor always produce
+# the same rows.
+#----------------------------------------------------------------------------#
+
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+BATCH_SIZE = 50000
+
+# Popular cities first; the skewed picker below favours the head of the list.
+CITIES = [
+    ('New York', 'NY', 40.71, -74.01), ('Los Angeles', 'CA', 34.05, -118.24),
+    ('Chicago', 'IL', 41.88, -87.63), ('Nashville', 'TN', 36.16, -86.78),
+    ('Austin', 'TX', 30.27, -97.74), ('San Francisco', 'CA', 37.77, -122.42),
+    ('Seattle', 'WA', 47.61, -122.33), ('New Orleans', 'LA', 29.95, -90.07),
+    ('Atlanta', 'GA', 33.75, -84.39), ('Portland', 'OR', 45.52, -122.68),
+    ('Denver', 'CO', 39.74, -104.99), ('Boston', 'MA', 42.36, -71.06),
+    ('Philadelphia', 'PA', 39.95, -75.17), ('Detroit', 'MI', 42.33, -83.05),
+    ('Minneapolis', 'MN', 44.98, -93.27), ('Miami', 'FL', 25.76, -80.19),
+    ('Memphis', 'TN', 35.15, -90.05), ('Las Vegas', 'NV', 36.17, -115.14),
+    ('Phoenix', 'AZ', 33.45, -112.07), ('Salt Lake City', 'UT', 40.76, -111.89),
+]
+STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA',
+          'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE',
+          'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD',
+          'MA', 'MI', 'MN', 'MS', 'MO', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX',
+          'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY']
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic',
+          'Folk', 'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Swing', 'Other']
+WORDS = ['Blue', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver',
+         'Wild', 'Lucky', 'Painted', 'Crimson', 'Hollow', 'Neon']
+NOUNS = ['Room', 'Hall', 'Lounge', 'Garden', 'Cellar', 'Barn', 'Stage',
+         'Club', 'Tavern', 'Theatre', 'Loft', 'Yard']
+
+LOCATION_COLUMNS = ('id', 'state', 'city', 'latitude', 'longitude')
+VENUE_COLUMNS = ('id', 'name', 'city', 'state', 'address', 'phone',
+                 'image_link', 'facebook_link', 'genres', 'website',
+                 'seeking_talent', 'seeking_description', 'location_id')
+ARTIST_COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'genres',
+                  'image_link', 'facebook_link', 'website', 'seeking_venue',
+                  'seeking_description', 'location_id')
+SHOW_COLUMNS = ('venue_id', 'artist_id', 'start_time')
+
+
+def skewed_index(rng, n, skew):
+    # int(n * u ** skew) puts most of the mass on small indices: with skew=3
+    # the first 1% of entities receive ~21% of the picks.
+    return int(n * rng.random() ** skew)
+
+
+def city_pool(size):
+    # (city, state, latitude, longitude); the made-up cities are scattered
+    # over the contiguous US, each always at the same spot.
+    pool = list(CITIES)
+    for i in range(len(pool), size):
+        rng = random.Random(i)
+        pool.append(('Springfield {}'.format(i), STATES[i % len(STATES)],
+                     round(rng.uniform(25.0, 49.0), 4),
+                     round(rng.uniform(-124.0, -67.0), 4)))
+    return pool[:size]
+
+
+def pick_genres(rng):
+    return rng.sample(GENRES, rng.randint(1, 3))
+
+
+def venue_rows(rng, first_id, count, cities):
+    for venue_id in range(first_id, first_id + count):
+        city, state, location_id = cities[skewed_index(rng, len(cities), 4)]
+        seeking = rng.random() < 0.3
+        yield (venue_id,
+               'The {} {}'.format(rng.choice(WORDS), rng.choice(NOUNS)),
+               city, state,
+               '{} {} St'.format(rng.randint(1, 9999), rng.choice(WORDS)),
+               '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999),
+                                             rng.randint(200, 999),
+                                             rng.randint(0, 9999)),
+               'https://images.example.com/venues/{}.jpg'.format(venue_id),
+               'https://www.facebook.com/venue{}'.format(venue_id),
+               pick_genres(rng),
+               'https://venue{}.example.com'.format(venue_id),
+               seeking,
+               'Looking for local acts' if seeking else None,
+               location_id)
+
+
+def artist_rows(rng, first_id, count, cities):
+    for artist_id in range(first_id, first_id + count):
+        city, state, location_id = cities[skewed_index(rng, len(cities), 3)]
+        seeking = rng.random() < 0.4
+        yield (artist_id,
+               '{} {}s'.format(rng.choice(WORDS), rng.choice(NOUNS)),
+               city, state,
+               '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999),
+                                             rng.randint(200, 999),
+                                             rng.randint(0, 9999)),
+               pick_genres(rng),
+               'https://images.example.com/artists/{}.jpg'.format(artist_id),
+               'https://www.facebook.com/artist{}'.format(artist_id),
+               'https://artist{}.example.com'.format(artist_id),
+               seeking,
+               'Looking for a residency' if seeking else None,
+               location_id)
+
+
+def show_rows(rng, count, venue_ids, artist_ids, anchor, past_ratio):
+    first_venue, n_venues = venue_ids
+    first_artist, n_artists = artist_ids
+    for i in range(count):
+        if rng.random() < past_ratio:
+            day = -rng.randint(1, 730)
+        else:
+            day = rng.randint(0, 365)
+        # The show primary key is (venue_id, artist_id, start_time). Folding
+        # the row number into the sub-minute part of start_time keeps every
+        # generated key unique without tracking the keys already used.
+        start_time = anchor + timedelta(days=day,
+                                        hours=rng.randint(17, 23),
+                                        seconds=(i // 1000000) % 60,
+                                        microseconds=i % 1000000)
+        yield (first_venue + skewed_index(rng, n_venues, 2),
+               first_artist + skewed_index(rng, n_artists, 3),
+               start_time)
+
+
+def next_id(db, table):
+    return (db.session.execute(
+        'SELECT COALESCE(MAX(id), 0) FROM {}'.format(table)).scalar()) + 1
+
+
+def copy_rows(db, table, columns, rows, batch_size):
+    # Postgres: stream each batch through COPY ... FROM STDIN as CSV.
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        table, ', '.join(columns))
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        pending = 0
+        for row in rows:
+            writer.writerow([
+                '{' + ','.join('"{}"'.format(v) for v in value) + '}'
+                if isinstance(value, list) else value
+                for value in row])
+            pending += 1
+            if pending == batch_size:
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+                connection.commit()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def insert_rows(db, table, columns, rows, batch_size):
+    # Everything else: one executemany INSERT and one commit per batch.
+    batch = []
+    for row in rows:
+        batch.append(dict(zip(columns, row)))
+        if len(batch) == batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+
+
+def fix_sequence(db, table):
+    # Ids are assigned here, so move the serial past them afterwards.
+    db.session.execute(
+        "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+        "(SELECT MAX(id) FROM {0}))".format(table))
+    db.session.commit()
+
+
+def generate(db, models, venues, artists, shows, seed=0, cities=500,
+             past_ratio=0.7, anchor=None, batch_size=BATCH_SIZE,
+             method='auto', log=print):
+    Venue, Artist, Show, Location = models
+    rng = random.Random(seed)
+    if anchor is None:
+        anchor = datetime.combine(datetime.today(), datetime.min.time())
+    postgres = db.engine.dialect.name == 'postgresql'
+    use_copy = method == 'copy' or (method == 'auto' and postgres)
+
+    def load(model, columns, rows, count):
+        started = time.perf_counter()
+        if use_copy:
+            copy_rows(db, model.__tablename__, columns, rows, batch_size)
+        else:
+            insert_rows(db, model.__table__, columns, rows, batch_size)
+        elapsed = time.perf_counter() - started
+        log('{:>8} {:>10} rows in {:.1f}s ({:,.0f} rows/s)'.format(
+            model.__tablename__, count, elapsed,
+            count / elapsed if elapsed else 0))
+
+    # Locations already in the database are reused, so repeated runs can
+    # share the city pool.
+    pool = city_pool(cities)
+    known = dict(((state, city), location_id) for location_id, state, city
+                 in db.session.query(Location.id, Location.state,
+                                     Location.city))
+    first_location = next_id(db, 'location')
+    new_locations = [(city, state, latitude, longitude) for
+                     city, state, latitude, longitude in pool
+                     if (state, city) not in known]
+    for offset, (city, state, _, _) in enumerate(new_locations):
+        known[(state, city)] = first_location + offset
+    load(Location, LOCATION_COLUMNS,
+         ((first_location + offset, state, city, latitude, longitude)
+          for offset, (city, state, latitude, longitude)
+          in enumerate(new_locations)), len(new_locations))
+    pool = [(city, state, known[(state, city)])
+            for city, state, _, _ in pool]
+
+    first_venue = next_id(db, 'venue')
+    first_artist = next_id(db, 'artist')
+    load(Venue, VENUE_COLUMNS,
+         venue_rows(rng, first_venue, venues, pool), venues)
+    load(Artist, ARTIST_COLUMNS,
+         artist_rows(rng, first_artist, artists, pool), artists)
+    if postgres:
+        fix_sequence(db, 'location')
+        fix_sequence(db, 'venue')
+        fix_sequence(db, 'artist')
+    if shows:
+        load(Show, SHOW_COLUMNS,
+             show_rows(rng, shows, (first_venue, venues),
+                       (first_artist, artists), anchor, past_ratio), shows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Bulk-load synthetic locations, venues, artists and shows.')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--cities', type=int, default=500,
+                        help='size of the city pool venues are spread over')
+    parser.add_argument('--past-ratio', type=float, default=0.7,
+                        help='fraction of shows in the past')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--anchor', type=lambda s: datetime.strptime(
+        s, '%Y-%m-%d'), help='date splitting past and upcoming shows '
+                             '(YYYY-MM-DD, defaults to today)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--method', choices=['auto', 'copy', 'executemany'],
+                        default='auto')
+    parser.add_argument('--create-tables', action='store_true',
+                        help='run create_all first instead of migrations')
+    args = parser.parse_args()
+    if (args.venues < 1 or args.artists < 1) and args.shows:
+        parser.error('shows need at least one venue and one artist')
+
+    from app import app, db, Venue, Artist, Show, Location
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        generate(db, (Venue, Artist, Show, Location), args.venues, args.artists,
+                 args.shows, seed=args.seed, cities=args.cities,
+                 past_ratio=args.past_ratio, anchor=args.anchor,
+                 batch_size=args.batch_size, method=args.method)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Genre filters and facet counts.
+#
+# Venues and artists keep their genres in an array column (JSON on SQLite).
+# genre_clause() filters a table down to the rows that have every selected
+# genre, using the GIN index on Postgres, and genre_counts() computes the
+# per-genre counts of such a selection in one aggregate query.
+#
+# GenreIndex answers the same counts from memory: one bitmap per genre, held
+# in a Python int with bit <id> set for every entity that has the genre, so
+# a selection is an AND of bitmaps and a count is a popcount.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+
+
+def genre_clause(db, table, genres):
+    # Returns (sql, params) for a WHERE clause matching rows of `table` that
+    # have every genre in `genres`.
+    if db.engine.dialect.name == 'postgresql':
+        return ('{}.genres @> CAST(:genres AS VARCHAR[])'.format(table),
+                {'genres': list(genres)})
+    clauses = ['EXISTS (SELECT 1 FROM json_each({}.genres) '
+               'WHERE json_each.value = :genre_{})'.format(table, i)
+               for i in range(len(genres))]
+    return (' AND '.join(clauses) or '1 = 1',
+            {'genre_{}'.format(i): genre for i, genre in enumerate(genres)})
+
+
+def genre_filter(db, query, table, genres):
+    if not genres:
+        return query
+    sql, params = genre_clause(db, table, genres)
+    return query.filter(db.text(sql).bindparams(**params))
+
+
+def genre_counts(db, table, genres=()):
+    # {genre: number of rows with that genre} among the rows of `table`
+    # that have every genre in `genres`.
+    if db.engine.dialect.name == 'postgresql':
+        source, column = 'unnest({}.genres) AS g(genre)'.format(table), 'g.genre'
+    else:
+        source, column = 'json_each({}.genres) AS g'.format(table), 'g.value'
+    where, params = genre_clause(db, table, genres)
+    sql = 'SELECT {1}, COUNT(*) FROM {0}, {2} WHERE {3} GROUP BY {1}'.format(
+        table, column, source, where)
+    return dict(db.session.execute(db.text(sql), params).fetchall())
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(bitmap):
+        return bin(bitmap).count('1')
+
+
+class GenreIndex(object):
+    # Per-process; every worker loads its own copy and reloads it once it is
+    # older than the configured TTL, so writes made by other workers show up
+    # within that time. Writes made here are applied immediately.
+
+    def __init__(self):
+        self._bitmaps = {}
+        self._genres = {}
+        self._all = 0
+        self._lock = threading.Lock()
+        self.loaded_at = None
+
+    def stale(self, ttl):
+        return self.loaded_at is None or time.time() - self.loaded_at > ttl
+
+    def load(self, rows):
+        # rows: (id, genres) for every entity. The bitmaps are filled in as
+        # byte arrays first; OR-ing bits into a growing int would copy it on
+        # every row.
+        genres_of = dict((entity_id, tuple(genres or ())) for entity_id, genres in rows)
+        size = max(genres_of, default=0) // 8 + 1
+        everything, arrays = bytearray(size), {}
+        for entity_id, genres in genres_of.items():
+            byte, bit = entity_id >> 3, 1 << (entity_id & 7)
+            everything[byte] |= bit
+            for genre in genres:
+                if genre not in arrays:
+                    arrays[genre] = bytearray(size)
+                arrays[genre][byte] |= bit
+        bitmaps = dict((genre, int.from_bytes(array, 'little')) for genre, array in arrays.items())
+        with self._lock:
+            self._bitmaps, self._genres = bitmaps, genres_of
+            self._all = int.from_bytes(everything, 'little')
+            self.loaded_at = time.time()
+
+    def set(self, entity_id, genres):
+        with self._lock:
+            self._remove(entity_id)
+            bit = 1 << entity_id
+            self._all |= bit
+            self._genres[entity_id] = tuple(genres or ())
+            for genre in self._genres[entity_id]:
+                self._bitmaps[genre] = self._bitmaps.get(genre, 0) | bit
+
+    def remove(self, entity_id):
+        with self._lock:
+            self._remove(entity_id)
+
+    def _remove(self, entity_id):
+        bit = 1 << entity_id
+        self._all &= ~bit
+        for genre in self._genres.pop(entity_id, ()):
+            self._bitmaps[genre] &= ~bit
+
+    def _selection(self, genres):
+        selection = self._all
+        for genre in genres:
+            selection &= self._bitmaps.get(genre, 0)
+        return selection
+
+    def counts(self, genres=()):
+        # Same result as genre_counts().
+        with self._lock:
+            selection = self._selection(genres)
+            counts = {}
+            for genre, bitmap in self._bitmaps.items():
+                count = popcount(bitmap & selection)
+                if count:
+                    counts[genre] = count
+            return counts
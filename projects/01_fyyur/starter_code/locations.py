@@ -0,0 +1,30 @@
+#----------------------------------------------------------------------------#
+# Distances between locations.
+#
+# "Near me" lookups first narrow the location table down to a latitude /
+# longitude box around the point, which the (latitude, longitude) index can
+# serve, then keep the locations whose great-circle distance is within the
+# radius.
+#----------------------------------------------------------------------------#
+
+from math import asin, cos, radians, sin, sqrt
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195
+
+
+def bounding_box(latitude, longitude, km):
+    # (min_lat, max_lat, min_lng, max_lng) enclosing the circle. Degrees of
+    # longitude shrink towards the poles, so the box widens with latitude.
+    dlat = km / KM_PER_DEGREE
+    dlng = km / (KM_PER_DEGREE * max(cos(radians(latitude)), 0.01))
+    return (latitude - dlat, latitude + dlat,
+            longitude - dlng, longitude + dlng)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # Haversine formula.
+    lat1, lng1, lat2, lng2 = map(radians, (lat1, lng1, lat2, lng2))
+    a = sin((lat2 - lat1) / 2) ** 2 + \
+        cos(lat1) * cos(lat2) * sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(a))
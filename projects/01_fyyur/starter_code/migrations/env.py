@@ -83,6 +83,9 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            # online_migrations commits mid-migration; a transaction per
+            # revision keeps alembic_version in step with what committed
+            transaction_per_migration=True,
             **current_app.extensions['migrate'].configure_args
         )
 
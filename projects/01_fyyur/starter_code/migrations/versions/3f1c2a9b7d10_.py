@@ -0,0 +1,26 @@
+"""Index artist names for keyset pagination
+
+Revision ID: 3f1c2a9b7d10
+Revises: 905295df2f88
+Create Date: 2026-10-19 10:12:41.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = '905295df2f88'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_artist_name_id', 'artist', ['name', 'id'])
+
+
+def downgrade():
+    drop_index('ix_artist_name_id', 'artist')
@@ -0,0 +1,28 @@
+"""Cascade venue deletes to their shows
+
+Revision ID: 5d8b3e61a4c9
+Revises: e2a9c4f7b813
+Create Date: 2026-10-19 14:22:10.604513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import add_foreign_key, drop_constraint
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8b3e61a4c9'
+down_revision = 'e2a9c4f7b813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    drop_constraint('show_venue_id_fkey', 'show', type_='foreignkey')
+    add_foreign_key('show_venue_id_fkey', 'show', 'venue', ['venue_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    drop_constraint('show_venue_id_fkey', 'show', type_='foreignkey')
+    add_foreign_key('show_venue_id_fkey', 'show', 'venue', ['venue_id'], ['id'])
@@ -9,6 +9,8 @@ from alembic import op
 import sqlalchemy as sa
 from sqlalchemy.dialects import postgresql
 
+from online_migrations import set_not_null
+
 # revision identifiers, used by Alembic.
 revision = '905295df2f88'
 down_revision = '224eee752625'
@@ -17,41 +19,12 @@ depends_on = None
 
 
 def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    op.alter_column('artist', 'city',
-                    existing_type=sa.VARCHAR(length=120),
-                    nullable=False)
-    op.alter_column('artist', 'genres',
-                    existing_type=postgresql.ARRAY(sa.VARCHAR()),
-                    nullable=False)
-    op.alter_column('artist', 'name',
-                    existing_type=sa.VARCHAR(),
-                    nullable=False)
-    op.alter_column('artist', 'seeking_venue',
-                    existing_type=sa.BOOLEAN(),
-                    nullable=False)
-    op.alter_column('artist', 'state',
-                    existing_type=sa.VARCHAR(length=120),
-                    nullable=False)
-    op.alter_column('venue', 'address',
-                    existing_type=sa.VARCHAR(length=120),
-                    nullable=False)
-    op.alter_column('venue', 'city',
-                    existing_type=sa.VARCHAR(length=120),
-                    nullable=False)
-    op.alter_column('venue', 'genres',
-                    existing_type=postgresql.ARRAY(sa.VARCHAR()),
-                    nullable=False)
-    op.alter_column('venue', 'name',
-                    existing_type=sa.VARCHAR(),
-                    nullable=False)
-    op.alter_column('venue', 'seeking_talent',
-                    existing_type=sa.BOOLEAN(),
-                    nullable=False)
-    op.alter_column('venue', 'state',
-                    existing_type=sa.VARCHAR(length=120),
-                    nullable=False)
-    # ### end Alembic commands ###
+    # NOT VALID check, VALIDATE, then SET NOT NULL: see online_migrations
+    for table, columns in (
+            ('artist', ('city', 'genres', 'name', 'seeking_venue', 'state')),
+            ('venue', ('address', 'city', 'genres', 'name', 'seeking_talent', 'state'))):
+        for column in columns:
+            set_not_null(table, column)
 
 
 def downgrade():
@@ -0,0 +1,28 @@
+"""GIN indexes on venue and artist genres
+
+Revision ID: 9a6f02d8c3e4
+Revises: 5d8b3e61a4c9
+Create Date: 2026-10-19 15:48:02.731946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6f02d8c3e4'
+down_revision = '5d8b3e61a4c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_venue_genres', 'venue', ['genres'], postgresql_using='gin')
+    create_index('ix_artist_genres', 'artist', ['genres'], postgresql_using='gin')
+
+
+def downgrade():
+    drop_index('ix_artist_genres', 'artist')
+    drop_index('ix_venue_genres', 'venue')
@@ -0,0 +1,28 @@
+"""Index shows by venue and by artist start time
+
+Revision ID: b7e4d1c05a2f
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-19 11:40:07.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d1c05a2f'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'])
+    create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    drop_index('ix_show_artist_id_start_time', 'show')
+    drop_index('ix_show_venue_id_start_time', 'show')
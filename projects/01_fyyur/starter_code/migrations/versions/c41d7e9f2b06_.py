@@ -0,0 +1,61 @@
+"""Normalize venue and artist city/state into an indexed location table
+
+Revision ID: c41d7e9f2b06
+Revises: 9a6f02d8c3e4
+Create Date: 2026-10-19 16:37:25.119034
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import add_foreign_key, backfill, create_index, set_not_null
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9f2b06'
+down_revision = '9a6f02d8c3e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('location',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('state', sa.String(length=120), nullable=False),
+                    sa.Column('city', sa.String(length=120), nullable=False),
+                    sa.Column('latitude', sa.Float(), nullable=True),
+                    sa.Column('longitude', sa.Float(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('state', 'city', name='uq_location_state_city')
+                    )
+    op.create_index('ix_location_latitude_longitude', 'location', ['latitude', 'longitude'], unique=False)
+    op.add_column('venue', sa.Column('location_id', sa.Integer(), nullable=True))
+    op.add_column('artist', sa.Column('location_id', sa.Integer(), nullable=True))
+
+    # Backfill: one location per distinct (state, city) in use, then point
+    # every row at its location through the unique (state, city) index.
+    op.execute("""
+        INSERT INTO location (state, city)
+        SELECT COALESCE(state, ''), COALESCE(city, '') FROM venue
+        UNION
+        SELECT COALESCE(state, ''), COALESCE(city, '') FROM artist
+    """)
+    for table in ('venue', 'artist'):
+        # in batches, committing each, so the table stays writable
+        backfill(table, """location_id = (
+                SELECT location.id FROM location
+                WHERE location.state = COALESCE({0}.state, '')
+                  AND location.city = COALESCE({0}.city, ''))""".format(table),
+                 where='location_id IS NULL')
+        set_not_null(table, 'location_id')
+        create_index('ix_{}_location_id'.format(table), table, ['location_id'])
+        add_foreign_key('{}_location_id_fkey'.format(table), table, 'location', ['location_id'], ['id'])
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_constraint('{}_location_id_fkey'.format(table), table, type_='foreignkey')
+        op.drop_index('ix_{}_location_id'.format(table), table_name=table)
+        op.drop_column(table, 'location_id')
+    op.drop_index('ix_location_latitude_longitude', table_name='location')
+    op.drop_table('location')
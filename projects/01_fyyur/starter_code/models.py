@@ -0,0 +1,111 @@
+#----------------------------------------------------------------------------#
+# Models.
+#
+# db is bound to an app by create_app() (app.py) through db.init_app(), so
+# the models import without building one.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+class Show(db.Model):
+    __tablename__ = 'show'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'venue.id', ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'artist.id'), primary_key=True)
+    start_time = db.Column(db.DateTime, nullable=False,
+                           default=datetime.now, primary_key=True)
+
+    # double-booking checks look up a venue's or an artist's shows by time
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    def __repr__(self):
+        return f'<Show: Venue {self.venue_id} & Artist {self.artist_id} starts @ {self.start_time}>'
+
+
+class Location(db.Model):
+    __tablename__ = 'location'
+
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(120), nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+
+    # the unique constraint doubles as the (state, city) lookup index
+    __table_args__ = (
+        db.UniqueConstraint('state', 'city', name='uq_location_state_city'),
+        db.Index('ix_location_latitude_longitude', 'latitude', 'longitude'),
+    )
+
+    def __repr__(self):
+        return f'<Location {self.id}: {self.city}, {self.state}>'
+
+
+class Venue(db.Model):
+    __tablename__ = 'venue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    address = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    genres = db.Column(db.ARRAY(db.String).with_variant(
+        db.JSON, 'sqlite'), nullable=False)
+    website = db.Column(db.String(500))
+    seeking_talent = db.Column(db.Boolean, nullable=False)
+    seeking_description = db.Column(db.String())
+    # city and state stay on the row for display; lookups go through the
+    # location, see resolve_location
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False, index=True)
+    # bumped by every edit; see update_entity
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    artists = db.relationship('Artist', secondary="show",
+                              backref=db.backref('venues'))
+
+    # Genre filters use array containment (@>), which only a GIN index can
+    # serve; on SQLite, where genres is JSON, it is a plain index.
+    __table_args__ = (db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),)
+
+    def __repr__(self):
+        return f'<Venue {self.id}: {self.name} @ {self.city}>'
+
+
+class Artist(db.Model):
+    __tablename__ = 'artist'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120))
+    genres = db.Column(db.ARRAY(db.String).with_variant(
+        db.JSON, 'sqlite'), nullable=False)
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(500))
+    seeking_venue = db.Column(db.Boolean, nullable=False)
+    seeking_description = db.Column(db.String())
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # /artists pages through artists in (name, id) order; genres as for Venue
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
+
+    def __repr__(self):
+        return f'<Artist {self.id}: {self.name} @ {self.city}>'
+
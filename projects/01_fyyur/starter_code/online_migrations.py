@@ -0,0 +1,277 @@
+#----------------------------------------------------------------------------#
+# Schema changes that keep big tables writable, for use in migrations.
+#
+#   from online_migrations import backfill, create_index, set_not_null
+#
+#   def upgrade():
+#       op.add_column('show', sa.Column('ends_at', sa.DateTime()))
+#       backfill('show', "ends_at = start_time + interval '3 hours'",
+#                where='ends_at IS NULL', key=('venue_id', 'artist_id', 'start_time'))
+#       set_not_null('show', 'ends_at')
+#       create_index('ix_show_ends_at', 'show', ['ends_at'])
+#
+# On PostgreSQL a plain ALTER or UPDATE in the migration's transaction holds
+# its table lock until the whole migration commits. These helpers commit
+# what precedes them and run outside that transaction:
+#
+#   backfill        updates BATCH_SIZE rows at a time, in key order, each
+#                   batch its own transaction, logging progress as it goes
+#   create_index    CREATE INDEX CONCURRENTLY; writes go on while it builds
+#   set_not_null    a NOT VALID check constraint, then VALIDATE (which scans
+#                   without blocking writes), then SET NOT NULL, which trusts
+#                   the validated check and does not scan again (PG 12+)
+#   add_foreign_key NOT VALID, then VALIDATE
+#
+# Each DDL statement that needs a strong lock waits at most LOCK_TIMEOUT for
+# it and is retried, so a long-running query delays the migration instead
+# of queueing every other query behind it. Every helper skips work that is
+# already done, so a migration that failed halfway can be run again.
+#
+# A migration using them is not atomic: what ran before a failure stays
+# committed. `flask db upgrade --sql` writes the same statements, with
+# COMMIT/BEGIN around them, but backfill as a single UPDATE and without the
+# checks or retries, which need a connection. On other databases (SQLite
+# in the tests) they fall back to the plain operations, with backfill
+# still batched.
+#----------------------------------------------------------------------------#
+
+import logging
+import time
+from contextlib import contextmanager
+
+from alembic import op
+from sqlalchemy import exc, text
+
+BATCH_SIZE = 10000
+LOCK_TIMEOUT = '5s'
+LOCK_ATTEMPTS = 10
+
+log = logging.getLogger('alembic.online')
+
+
+class Progress(object):
+    # Logs "label: done/total rows (pct), rate, time left" at most every
+    # `every` seconds, and once at the end.
+
+    def __init__(self, label, total, every=5.0, emit=log.info):
+        self.label = label
+        self.total = total
+        self.every = every
+        self.emit = emit
+        self.done = 0
+        self.started = self.logged = time.perf_counter()
+
+    def update(self, rows):
+        self.done += rows
+        now = time.perf_counter()
+        if now - self.logged >= self.every:
+            self.logged = now
+            self.report(now)
+
+    def finish(self):
+        self.report(time.perf_counter(), finished=True)
+
+    def report(self, now, finished=False):
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.done / elapsed
+        if finished:
+            self.emit('%s: %s rows in %.1fs (%s rows/s)', self.label,
+                      '{:,}'.format(self.done), elapsed, '{:,.0f}'.format(rate))
+            return
+        total = max(self.total, self.done)
+        left = (total - self.done) / rate if rate else 0
+        self.emit('%s: %s/%s rows (%.1f%%), %s rows/s, about %.0fs left', self.label,
+                  '{:,}'.format(self.done), '{:,}'.format(total),
+                  100.0 * self.done / total if total else 100.0,
+                  '{:,.0f}'.format(rate), left)
+
+
+def is_postgres():
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def is_offline():
+    return op.get_context().as_sql
+
+
+@contextmanager
+def outside_transaction():
+    # commits the migration so far; statements inside commit one by one
+    with op.get_context().autocommit_block():
+        yield
+
+
+def run_ddl(statement, attempts=LOCK_ATTEMPTS, timeout=LOCK_TIMEOUT, wait=1.0):
+    # Runs one statement that takes a strong lock, giving up on the lock
+    # after `timeout` and trying again, up to `attempts` times. Call it
+    # inside outside_transaction().
+    if not is_postgres() or is_offline():
+        op.execute(statement)
+        return
+    connection = op.get_bind()
+    connection.execute(text("SET lock_timeout = '{}'".format(timeout)))
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                connection.execute(text(statement) if isinstance(statement, str) else statement)
+                return
+            except exc.OperationalError as e:
+                # 55P03: lock_not_available
+                if getattr(e.orig, 'pgcode', None) != '55P03' or attempt == attempts:
+                    raise
+                log.warning('lock timeout (attempt %d of %d): %s', attempt, attempts, statement)
+                time.sleep(wait * attempt)
+    finally:
+        connection.execute(text('RESET lock_timeout'))
+
+
+def columns_sql(columns):
+    return '({})'.format(', '.join(columns))
+
+
+def estimate_rows(table):
+    connection = op.get_bind()
+    if is_postgres():
+        # the planner's estimate; count(*) would scan the table
+        estimate = connection.execute(text(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+            table=table).scalar()
+        if estimate and estimate > 0:
+            return estimate
+    return connection.execute(text('SELECT count(*) FROM {}'.format(table))).scalar()
+
+
+def backfill(table, assignments, where=None, key=('id',), batch_size=BATCH_SIZE,
+             pause=0.0, progress_every=5.0):
+    """UPDATE table SET assignments [WHERE where], batch_size rows at a time.
+
+    Walks the table in `key` order (the primary key columns), so each batch
+    is an index range scan, and commits every batch on its own. `where` should
+    exclude rows already done, so a rerun picks up where it stopped; `pause`
+    sleeps between batches to leave the database some room.
+    """
+    condition = ' AND ({})'.format(where) if where else ''
+    if is_offline():
+        op.execute('UPDATE {} SET {} WHERE true{}'.format(table, assignments, condition))
+        return
+
+    keys = columns_sql(key)
+    bound = columns_sql(':last_{}'.format(i) for i in range(len(key)))
+    upper = columns_sql(':upper_{}'.format(i) for i in range(len(key)))
+    # the key of the batch's last row; None once fewer than batch_size are left
+    next_upper = 'SELECT {} FROM {} WHERE {{}} ORDER BY {} LIMIT 1 OFFSET {}'.format(
+        ', '.join(key), table, ', '.join(key), batch_size - 1)
+    progress = Progress('backfill {}'.format(table), estimate_rows(table), progress_every)
+
+    with outside_transaction():
+        connection = op.get_bind()
+        last = None
+        while True:
+            after = '{} > {}'.format(keys, bound) if last is not None else 'true'
+            params = {'last_{}'.format(i): value for i, value in enumerate(last or ())}
+            row = connection.execute(text(next_upper.format(after)), **params).first()
+            if row is None:
+                result = connection.execute(text('UPDATE {} SET {} WHERE {}{}'.format(
+                    table, assignments, after, condition)), **params)
+                progress.update(max(result.rowcount, 0))
+                break
+            params.update(('upper_{}'.format(i), value) for i, value in enumerate(row))
+            connection.execute(text('UPDATE {} SET {} WHERE {} AND {} <= {}{}'.format(
+                table, assignments, after, keys, upper, condition)), **params)
+            progress.update(batch_size)
+            last = tuple(row)
+            if pause:
+                time.sleep(pause)
+    progress.finish()
+
+
+def index_state(name):
+    # None when the index does not exist, else whether it is valid
+    return op.get_bind().execute(text(
+        'SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'),
+        name=name).scalar()
+
+
+def create_index(name, table, columns, unique=False, **kw):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL, a plain index elsewhere."""
+    if not is_postgres():
+        op.create_index(name, table, columns, unique=unique, **kw)
+        return
+    with outside_transaction():
+        state = None if is_offline() else index_state(name)
+        if state:
+            return
+        if state is False:
+            # left INVALID by an interrupted concurrent build
+            run_ddl('DROP INDEX CONCURRENTLY {}'.format(name))
+        started = time.perf_counter()
+        op.create_index(name, table, columns, unique=unique,
+                        postgresql_concurrently=True, **kw)
+        log.info('index %s built in %.1fs', name, time.perf_counter() - started)
+
+
+def drop_index(name, table):
+    if not is_postgres():
+        op.drop_index(name, table_name=table)
+        return
+    with outside_transaction():
+        run_ddl('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(name))
+
+
+def is_nullable(table, column):
+    return op.get_bind().execute(text(
+        'SELECT is_nullable FROM information_schema.columns '
+        'WHERE table_name = :table AND column_name = :column'),
+        table=table, column=column).scalar() == 'YES'
+
+
+def set_not_null(table, column, existing_type=None):
+    """ALTER COLUMN ... SET NOT NULL without a scan under an exclusive lock."""
+    if not is_postgres():
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(column, existing_type=existing_type, nullable=False)
+        return
+    check = 'ck_{}_{}_not_null'.format(table, column)
+    with outside_transaction():
+        if not is_offline() and not is_nullable(table, column):
+            return
+        run_ddl('ALTER TABLE {} DROP CONSTRAINT IF EXISTS {}'.format(table, check))
+        run_ddl('ALTER TABLE {} ADD CONSTRAINT {} CHECK ({} IS NOT NULL) NOT VALID'.format(
+            table, check, column))
+        started = time.perf_counter()
+        # SHARE UPDATE EXCLUSIVE: reads and writes carry on while it scans
+        op.execute('ALTER TABLE {} VALIDATE CONSTRAINT {}'.format(table, check))
+        log.info('%s.%s validated NOT NULL in %.1fs', table, column,
+                 time.perf_counter() - started)
+        run_ddl('ALTER TABLE {} ALTER COLUMN {} SET NOT NULL'.format(table, column))
+        run_ddl('ALTER TABLE {} DROP CONSTRAINT {}'.format(table, check))
+
+
+def constraint_exists(table, name):
+    return op.get_bind().execute(text(
+        'SELECT 1 FROM information_schema.table_constraints '
+        'WHERE table_name = :table AND constraint_name = :name'),
+        table=table, name=name).scalar() is not None
+
+
+def add_foreign_key(name, source, referent, local_columns, remote_columns, ondelete=None):
+    """ADD CONSTRAINT ... NOT VALID, then VALIDATE, on PostgreSQL."""
+    if not is_postgres():
+        op.create_foreign_key(name, source, referent, local_columns, remote_columns,
+                              ondelete=ondelete)
+        return
+    with outside_transaction():
+        if is_offline() or not constraint_exists(source, name):
+            run_ddl('ALTER TABLE {} ADD CONSTRAINT {} FOREIGN KEY {} REFERENCES {} {}{} '
+                    'NOT VALID'.format(source, name, columns_sql(local_columns), referent,
+                                       columns_sql(remote_columns),
+                                       ' ON DELETE {}'.format(ondelete) if ondelete else ''))
+        op.execute('ALTER TABLE {} VALIDATE CONSTRAINT {}'.format(source, name))
+
+
+def drop_constraint(name, table, type_=None):
+    if not is_postgres():
+        op.drop_constraint(name, table, type_=type_)
+        return
+    with outside_transaction():
+        run_ddl('ALTER TABLE {} DROP CONSTRAINT IF EXISTS {}'.format(table, name))
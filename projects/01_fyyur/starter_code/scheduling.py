@@ -0,0 +1,51 @@
+#----------------------------------------------------------------------------#
+# Show scheduling conflicts.
+#
+# A show blocks its venue and its artist for SHOW_DURATION from its start
+# time. Slots are grouped per venue and per artist and swept in time order,
+# so each slot is only compared with the few slots still open when it
+# starts instead of with every other show.
+#----------------------------------------------------------------------------#
+
+from collections import defaultdict
+
+
+def find_conflicts(candidates, booked, duration):
+    # candidates: (index, venue_id, artist_id, start_time) rows to schedule
+    # booked: (venue_id, artist_id, start_time) shows already in the db
+    # Returns {index: [messages]} for every candidate that overlaps a booked
+    # show or another candidate.
+    slots = defaultdict(list)
+    for venue_id, artist_id, start_time in booked:
+        slots[('venue', venue_id)].append((start_time, None))
+        slots[('artist', artist_id)].append((start_time, None))
+    for index, venue_id, artist_id, start_time in candidates:
+        slots[('venue', venue_id)].append((start_time, index))
+        slots[('artist', artist_id)].append((start_time, index))
+
+    conflicts = defaultdict(list)
+    for (kind, entity_id), entity_slots in slots.items():
+        entity_slots.sort(key=lambda slot: slot[0])
+        open_slots = []
+        for start_time, index in entity_slots:
+            open_slots = [slot for slot in open_slots
+                          if start_time - slot[0] < duration]
+            for other_time, other_index in open_slots:
+                if index is None and other_index is None:
+                    continue
+                if index is not None:
+                    conflicts[index].append(_describe(
+                        kind, entity_id, other_time, other_index))
+                if other_index is not None:
+                    conflicts[other_index].append(_describe(
+                        kind, entity_id, start_time, index))
+            open_slots.append((start_time, index))
+    return dict(conflicts)
+
+
+def _describe(kind, entity_id, start_time, index):
+    if index is None:
+        return '{} {} already has a show at {}'.format(
+            kind, entity_id, start_time.strftime('%Y-%m-%d %H:%M:%S'))
+    return '{} {} is also booked by row {} at {}'.format(
+        kind, entity_id, index, start_time.strftime('%Y-%m-%d %H:%M:%S'))
@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Startup report: where a cold worker's time goes.
+#
+#   python startup.py [--top 15] [--budget-ms 400]
+#   flask startup-report
+#
+# Starts a fresh interpreter under `python -X importtime` that imports app,
+# builds it with create_app() and serves GET / once, as a new worker does.
+# Prints the slowest imports, with the ones app pulls in itself listed by
+# name, and the time each phase took. Exits 1 when the cold start (import,
+# create_app and first request) is over the budget, STARTUP_BUDGET_MS in
+# config.py unless --budget-ms is given.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first request': served - created}))
+'''
+
+
+class Import(object):
+
+    def __init__(self, name, self_us, cumulative_us, children):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.children = children
+
+
+def parse_importtime(lines):
+    # The top-level imports of a -X importtime log, as a tree. The log lists
+    # every module after the modules it imported, indented one level deeper.
+    pending = {}
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        pending.setdefault(depth, []).append(Import(
+            name.strip(), int(self_us), int(cumulative_us),
+            pending.pop(depth + 1, [])))
+    return pending.get(0, [])
+
+
+def measure(env=None):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', CHILD],
+        cwd=BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return phases, parse_importtime(result.stderr.splitlines())
+
+
+def report(top=15, budget_ms=None, out=sys.stdout):
+    phases, imports = measure()
+    # what `import app` pulls in directly, plus whatever is imported later
+    # (by create_app or the first request)
+    rows = []
+    for module in imports:
+        if module.name == 'app':
+            rows.extend(module.children)
+            rows.append(Import('app (own code)', module.self_us, module.self_us, []))
+        else:
+            rows.append(module)
+    rows.sort(key=lambda module: module.cumulative_us, reverse=True)
+
+    out.write('{:<40} {:>10} {:>10}\n'.format('import', 'total ms', 'self ms'))
+    for module in rows[:top]:
+        out.write('{:<40} {:>10.1f} {:>10.1f}\n'.format(
+            module.name, module.cumulative_us / 1000.0, module.self_us / 1000.0))
+    out.write('\n')
+    for phase, seconds in phases.items():
+        out.write('{:<40} {:>10.1f}\n'.format(phase, seconds * 1000))
+    cold_start_ms = sum(phases.values()) * 1000
+    out.write('{:<40} {:>10.1f}\n'.format('cold start', cold_start_ms))
+
+    if budget_ms is not None:
+        within = cold_start_ms <= budget_ms
+        out.write('\ncold start {:.0f}ms is {} the {:.0f}ms budget\n'.format(
+            cold_start_ms, 'within' if within else 'OVER', budget_ms))
+        return within
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start report for a fyyur worker.')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float)
+    args = parser.parse_args()
+
+    budget_ms = args.budget_ms
+    if budget_ms is None:
+        import config
+        budget_ms = config.STARTUP_BUDGET_MS
+    sys.exit(0 if report(args.top, budget_ms) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,3 +2,21 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+document.addEventListener('DOMContentLoaded', function () {
+  var button = document.getElementById('delete-venue');
+  if (!button) {
+    return;
+  }
+  button.addEventListener('click', function () {
+    fetch('/venues/' + button.dataset.id, { method: 'DELETE' })
+      .then(function (response) { return response.json(); })
+      .then(function (result) {
+        if (result.success) {
+          window.location.href = '/';
+        } else {
+          window.alert(result.message || 'Venue could not be deleted.');
+        }
+      });
+  });
+});
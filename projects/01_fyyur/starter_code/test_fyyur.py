@@ -0,0 +1,588 @@
+import asyncio
+import html
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    @pytest.fixture(autouse=True)
+    def use_app(self, fyyur):
+        """The app is built and seeded once per session (see conftest.py);
+        each test runs in a transaction that is rolled back."""
+        self.fyyur = fyyur
+        self.client = fyyur.app.test_client
+
+    def venue(self, venue_id):
+        return self.fyyur.Venue.query.get(venue_id)
+
+    def test_venues(self):
+        res = self.client().get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(self.venue(1).name.encode(), res.data)
+
+    def test_metrics_count_fragment_cache(self):
+        self.client().get('/venues')
+        self.client().get('/venues')
+        res = self.client().get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'cache_requests_total{cache="fragment",name="venue_card",result="hit"}',
+                      res.data)
+        self.assertIn(b'http_requests_total{endpoint="fyyur.venues",method="GET",status="200"}',
+                      res.data)
+
+    def test_artists_bad_cursor(self):
+        import base64
+        for values in ('["a", "x"]', '["a", true]', '[1, 2]', '["a"]', 'not json'):
+            cursor = base64.urlsafe_b64encode(values.encode()).decode()
+            res = self.client().get('/artists', query_string={'after': cursor})
+
+            self.assertEqual(res.status_code, 400, values)
+
+    def test_bulk_shows_mixed_time_zones(self):
+        res = self.client().post('/shows/bulk', json={'shows': [
+            {'venue_id': 1, 'artist_id': 1, 'start_time': '2090-01-01T20:00:00+02:00'},
+            {'venue_id': 2, 'artist_id': 2, 'start_time': '2090-01-02T20:00:00'},
+        ]})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['created'], 2)
+
+    def test_nearby_limit_at_least_one(self):
+        location = self.fyyur.Location.query.get(self.venue(1).location_id)
+        for limit in (0, -5):
+            res = self.client().get('/venues/near', query_string={
+                'lat': location.latitude, 'lng': location.longitude, 'km': 1, 'limit': limit})
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(len(json.loads(res.data)['venues']), 1, limit)
+
+    def bulk_shows(self, shows, partial=False):
+        res = self.client().post('/shows/bulk', json={'shows': shows, 'partial': partial})
+        return res.status_code, json.loads(res.data)
+
+    def test_bulk_shows_conflict_with_booked_show(self):
+        Show = self.fyyur.Show
+        venue_id, artist_id, booked = self.fyyur.db.session.query(
+            Show.venue_id, Show.artist_id, Show.start_time).first()
+        status, data = self.bulk_shows([{'venue_id': venue_id, 'artist_id': artist_id,
+                                         'start_time': (booked + timedelta(hours=1)).isoformat()}])
+
+        self.assertEqual(status, 409)
+        self.assertEqual(data['created'], 0)
+        conflict, = data['conflicts']
+        self.assertEqual(conflict['index'], 0)
+        self.assertIn('venue {} already has a show at {}'.format(
+            venue_id, booked.strftime('%Y-%m-%d %H:%M:%S')), conflict['errors'])
+
+    def test_bulk_shows_conflict_within_batch(self):
+        status, data = self.bulk_shows([
+            {'venue_id': 1, 'artist_id': 1, 'start_time': '2090-01-01T20:00:00'},
+            {'venue_id': 1, 'artist_id': 2, 'start_time': '2090-01-01T21:00:00'},
+            {'venue_id': 2, 'artist_id': 3, 'start_time': '2090-01-01T20:00:00'},
+        ])
+
+        self.assertEqual(status, 409)
+        conflicts = {conflict['index']: conflict['errors'] for conflict in data['conflicts']}
+        self.assertEqual(sorted(conflicts), [0, 1])
+        self.assertIn('venue 1 is also booked by row 1 at 2090-01-01 21:00:00', conflicts[0])
+        self.assertIn('venue 1 is also booked by row 0 at 2090-01-01 20:00:00', conflicts[1])
+
+    def test_bulk_shows_unknown_ids(self):
+        status, data = self.bulk_shows([
+            {'venue_id': 100000, 'artist_id': 100001, 'start_time': '2090-01-01T20:00:00'},
+            {'venue_id': 1, 'start_time': '2090-01-02T20:00:00'},
+        ])
+
+        self.assertEqual(status, 409)
+        errors = [conflict['errors'] for conflict in data['conflicts']]
+        self.assertEqual(errors, [
+            ['venue 100000 does not exist', 'artist 100001 does not exist'],
+            ['venue_id, artist_id and start_time are required'],
+        ])
+
+    def test_bulk_shows_all_or_nothing(self):
+        Show = self.fyyur.Show
+        shows = [{'venue_id': 1, 'artist_id': 1, 'start_time': '2090-01-01T20:00:00'},
+                 {'venue_id': 100000, 'artist_id': 1, 'start_time': '2090-01-02T20:00:00'}]
+        total = Show.query.count()
+
+        status, data = self.bulk_shows(shows)
+        self.assertEqual(status, 409)
+        self.assertEqual(data['created'], 0)
+        self.assertEqual(Show.query.count(), total)
+
+        status, data = self.bulk_shows(shows, partial=True)
+        self.assertEqual(status, 200)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([conflict['index'] for conflict in data['conflicts']], [1])
+        self.assertEqual(Show.query.count(), total + 1)
+
+    def test_bulk_shows_too_many(self):
+        config = self.fyyur.app.config
+        self.addCleanup(config.__setitem__, 'BULK_SHOWS_MAX', config['BULK_SHOWS_MAX'])
+        config['BULK_SHOWS_MAX'] = 2
+        status, data = self.bulk_shows([
+            {'venue_id': 1, 'artist_id': 1, 'start_time': '2090-01-0{}T20:00:00'.format(day)}
+            for day in (1, 2, 3)])
+
+        self.assertEqual(status, 413)
+        self.assertEqual(data['success'], False)
+
+    def test_bulk_shows_not_an_object(self):
+        for body in ([1, 2], 'shows', 3, {}, {'shows': []}):
+            res = self.client().post('/shows/bulk', json=body)
+
+            self.assertEqual(res.status_code, 400, body)
+
+    def configure(self, **settings):
+        config = self.fyyur.app.config
+        for name, value in settings.items():
+            self.addCleanup(config.__setitem__, name, config[name])
+            config[name] = value
+
+    def artists_by_genre(self, genre):
+        """The artist ids listed under ?genre= and the facet counts shown."""
+        res = self.client().get('/artists', query_string={'genre': genre, 'limit': 1000})
+        self.assertEqual(res.status_code, 200)
+        page = html.unescape(res.data.decode())
+        facets = re.findall(r'class="genre(?: selected)?" href="[^"]*">([^<]*) \((\d+)\)', page)
+        return (set(int(artist_id) for artist_id in re.findall(r'href="/artists/(\d+)"', page)),
+                dict((name, int(count)) for name, count in facets))
+
+    def expected_by_genre(self, genre):
+        """The same, computed from the artist table."""
+        Artist = self.fyyur.Artist
+        rows = [(artist_id, genres) for artist_id, genres
+                in self.fyyur.db.session.query(Artist.id, Artist.genres) if genre in genres]
+        return (set(artist_id for artist_id, genres in rows),
+                dict(Counter(name for artist_id, genres in rows for name in genres)))
+
+    def test_artists_by_genre(self):
+        genre = self.fyyur.Artist.query.get(1).genres[0]
+        for facets in ('bitmap', 'sql'):
+            self.configure(GENRE_FACETS=facets)
+            ids, counts = self.artists_by_genre(genre)
+
+            self.assertIn(1, ids)
+            self.assertEqual((ids, counts), self.expected_by_genre(genre), facets)
+
+    def test_genre_index_reloads_after_ttl(self):
+        db, Artist = self.fyyur.db, self.fyyur.Artist
+        self.configure(GENRE_FACETS='bitmap', GENRE_INDEX_TTL=60)
+        genre = Artist.query.get(1).genres[0]
+        before = self.artists_by_genre(genre)[1][genre]
+        # another worker's writes: an edited artist and a new one
+        edited = next(artist_id for artist_id, genres
+                      in db.session.query(Artist.id, Artist.genres) if genre not in genres)
+        Artist.query.filter_by(id=edited).update({'genres': [genre]})
+        db.session.add(Artist(name='The New Band', city='Austin', state='TX', genres=[genre],
+                              seeking_venue=False, location_id=Artist.query.get(1).location_id))
+        db.session.commit()
+
+        ids, counts = self.artists_by_genre(genre)
+        self.assertIn(edited, ids)
+        self.assertEqual(counts[genre], before)
+
+        self.fyyur.genre_indexes['artist'].loaded_at -= 61
+        ids, counts = self.artists_by_genre(genre)
+        self.assertEqual(counts[genre], before + 2)
+        self.assertEqual((ids, counts), self.expected_by_genre(genre))
+
+    def test_genre_index_updated_by_own_edit(self):
+        Artist = self.fyyur.Artist
+        self.configure(GENRE_FACETS='bitmap', GENRE_INDEX_TTL=60)
+        genre = Artist.query.get(1).genres[0]
+        before = self.artists_by_genre(genre)[1][genre]
+        version = Artist.query.get(1).version
+        res = self.client().patch('/artists/1', json={'version': version, 'genres': ['Other']})
+        self.assertEqual(res.status_code, 200)
+
+        ids, counts = self.artists_by_genre(genre)
+        self.assertNotIn(1, ids)
+        self.assertEqual(counts.get(genre, 0), before - 1)
+        self.assertEqual((ids, counts), self.expected_by_genre(genre))
+
+    def statements(self, path):
+        """The response to GET path and the number of SQL statements it ran."""
+        from sqlalchemy import event
+
+        count = []
+
+        def before_cursor_execute(*args):
+            count.append(1)
+        engine = self.fyyur.db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            res = self.client().get(path)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return res, len(count)
+
+    def test_detail_pages_query_only_their_row(self):
+        for path in ('/venues/1', '/artists/1'):
+            res, statements = self.statements(path)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertLessEqual(statements, 3, path)
+
+    def test_detail_page_missing(self):
+        for path in ('/venues/100000', '/artists/100000'):
+            self.assertEqual(self.client().get(path).status_code, 404, path)
+
+    def test_patch_venue(self):
+        version = self.venue(1).version
+        res = self.client().patch('/venues/1', json={'version': version, 'name': 'The Patched Room'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['updated'], ['name'])
+        self.assertEqual(data['version'], version + 1)
+        self.assertEqual(self.venue(1).name, 'The Patched Room')
+
+    def test_patch_venue_stale_version(self):
+        version = self.venue(1).version
+        self.client().patch('/venues/1', json={'version': version, 'name': 'First'})
+        res = self.client().patch('/venues/1', json={'version': version, 'name': 'Second'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(data['version'], version + 1)
+        self.assertEqual(self.venue(1).name, 'First')
+
+    def test_patch_venue_invalid_field(self):
+        res = self.client().patch('/venues/1', json={'version': 1, 'state': 'XX'})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_delete_venue(self):
+        res = self.client().delete('/venues/2')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], [2])
+        self.assertIsNone(self.venue(2))
+        self.assertEqual(self.fyyur.Show.query.filter_by(venue_id=2).count(), 0)
+
+    def test_delete_missing_venue(self):
+        res = self.client().delete('/venues/100000')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_delete_venues_bad_body(self):
+        for body in ([1, 2], 'venue_ids', 3, {}, {'venue_ids': []}, {'venue_ids': ['1']}):
+            res = self.client().delete('/venues', json=body)
+
+            self.assertEqual(res.status_code, 400, body)
+
+    def test_venues_near(self):
+        location = self.fyyur.Location.query.get(self.venue(1).location_id)
+        res = self.client().get('/venues/near', query_string={
+            'lat': location.latitude, 'lng': location.longitude})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(1, [venue['id'] for venue in data['venues']])
+
+    def test_venues_near_without_point(self):
+        res = self.client().get('/venues/near')
+
+        self.assertEqual(res.status_code, 400)
+
+
+class ApiTestCase(unittest.TestCase):
+    """The async JSON API (api.py), called as an ASGI app"""
+
+    @pytest.fixture(autouse=True)
+    def use_api(self, fyyur):
+        # needs SQLAlchemy 1.4+, asgiref and the async driver
+        self.api = pytest.importorskip('api')
+        self.fyyur = fyyur
+
+    def get(self, path, **query):
+        """(status, JSON body) of GET path?query."""
+        from urllib.parse import urlencode
+
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        async def call():
+            try:
+                await self.api.application({
+                    'type': 'http', 'method': 'GET', 'path': path, 'headers': [],
+                    'query_string': urlencode(query).encode()}, receive, send)
+            finally:
+                # pooled connections belong to this call's event loop
+                await self.api.engine.dispose()
+        asyncio.run(call())
+        return sent[0]['status'], json.loads(sent[1]['body'])
+
+    def walk(self, path, key, **query):
+        """Every row of a list endpoint, a page of 20 at a time, and the
+        number of pages."""
+        rows, pages, after = [], 0, None
+        while True:
+            if after:
+                query['after'] = after
+            status, data = self.get(path, limit=20, **query)
+            self.assertEqual(status, 200)
+            self.assertLessEqual(len(data[key]), 20)
+            rows.extend(data[key])
+            pages += 1
+            after = data['next']
+            if not after:
+                return rows, pages
+
+    def test_venues_pages(self):
+        venues, pages = self.walk('/api/venues', 'venues')
+
+        self.assertGreaterEqual(pages, 2)
+        self.assertEqual(len(venues), self.fyyur.Venue.query.count())
+        self.assertEqual([(v['name'], v['id']) for v in venues],
+                         sorted((v['name'], v['id']) for v in venues))
+
+    def test_artists_pages(self):
+        artists, pages = self.walk('/api/artists', 'artists')
+
+        self.assertGreaterEqual(pages, 2)
+        self.assertEqual(len(artists), self.fyyur.Artist.query.count())
+        self.assertEqual([(a['name'], a['id']) for a in artists],
+                         sorted((a['name'], a['id']) for a in artists))
+
+    def test_shows_pages(self):
+        Show = self.fyyur.Show
+        now = datetime.now()
+        for past, expected in ((False, Show.query.filter(Show.start_time >= now).count()),
+                               (True, Show.query.filter(Show.start_time < now).count())):
+            shows, pages = self.walk('/api/shows', 'shows', past=int(past))
+            # shown to the second; ties are broken by microseconds and ids
+            times = [show['start_time'] for show in shows]
+
+            self.assertGreaterEqual(pages, 2)
+            self.assertEqual(len(shows), expected)
+            self.assertEqual(times, sorted(times, reverse=past))
+
+    def test_bad_cursor(self):
+        import base64
+        for path in ('/api/venues', '/api/artists', '/api/shows'):
+            for values in ('["a", "x"]', '[1, 2, 3]', 'not json'):
+                cursor = base64.urlsafe_b64encode(values.encode()).decode()
+                status, data = self.get(path, after=cursor)
+
+                self.assertEqual(status, 400, (path, values))
+                self.assertEqual(data['success'], False)
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    """Edits and deletes retiring cached fragments, on the LRU backend"""
+
+    @pytest.fixture(autouse=True)
+    def use_app(self, fyyur):
+        self.fyyur = fyyur
+        self.client = fyyur.app.test_client
+        self.cache = fyyur.cache
+        self.use_backend()
+
+    def use_backend(self):
+        """The configured backend, LRUBackend."""
+
+    def render_twice(self, path, fragment):
+        """GETs path twice; the second one is served from the cache."""
+        # the pages stream, so the body is read for the template to run
+        self.client().get(path).data
+        hits = self.cache.stats()[fragment]['hits']
+        self.client().get(path).data
+        self.assertGreater(self.cache.stats()[fragment]['hits'], hits)
+
+    def patch(self, kind, model, entity_id, name):
+        version = model.query.get(entity_id).version
+        res = self.client().patch('/{}/{}'.format(kind, entity_id),
+                                  json={'version': version, 'name': name})
+        self.assertEqual(res.status_code, 200)
+
+    def test_venue_edit_retires_fragments(self):
+        for path, fragment in (('/venues', 'venue_card'), ('/venues/1', 'venue_detail')):
+            self.render_twice(path, fragment)
+        self.patch('venues', self.fyyur.Venue, 1, 'The Renamed Room')
+
+        for path in ('/venues', '/venues/1'):
+            self.assertIn(b'The Renamed Room', self.client().get(path).data, path)
+
+    def test_artist_edit_retires_fragments(self):
+        for path, fragment in (('/artists?limit=1000', 'artist_card'),
+                               ('/artists/1', 'artist_detail')):
+            self.render_twice(path, fragment)
+        self.patch('artists', self.fyyur.Artist, 1, 'The Renamed Band')
+
+        for path in ('/artists?limit=1000', '/artists/1'):
+            self.assertIn(b'The Renamed Band', self.client().get(path).data, path)
+
+    def test_venue_delete_retires_fragments(self):
+        self.render_twice('/venues/2', 'venue_detail')
+        key = self.cache.key('venue_detail', [('venue', 2)])
+        self.assertIsNotNone(self.cache.backend.get(key))
+
+        self.assertEqual(self.client().delete('/venues/2').status_code, 200)
+
+        self.assertNotEqual(self.cache.key('venue_detail', [('venue', 2)]), key)
+        self.assertIsNone(self.cache.backend.get(self.cache.key('venue_detail', [('venue', 2)])))
+
+
+class FileFragmentCacheTestCase(FragmentCacheTestCase):
+    """The same, on the FileBackend that workers share"""
+
+    def use_backend(self):
+        from cache import FileBackend
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, self.cache, 'backend', self.cache.backend)
+        self.cache.backend = FileBackend(directory)
+
+
+class ReplicaCacheTestCase(unittest.TestCase):
+    """The fragment cache on an app reading from a lagging replica"""
+
+    def replicated_app(self):
+        """Fyyur on two SQLite files, each holding venue 1, 'The Room'."""
+        import config
+        from app import create_app
+        from models import db, Location, Venue
+        from sqlalchemy import create_engine
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        urls = ['sqlite:///' + os.path.join(directory, name) for name in ('primary.db', 'replica.db')]
+        settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+        settings.update(SQLALCHEMY_DATABASE_URI=urls[0], SQLALCHEMY_REPLICA_URIS=urls[1:],
+                        FRAGMENT_CACHE_BACKEND='lru')
+        # init_replicas gives db a routing session of its own
+        self.addCleanup(setattr, db, 'session', db.session)
+        app = create_app(type('ReplicaConfig', (object,), settings))
+        self.replica = create_engine(urls[1])
+        self.addCleanup(self.replica.dispose)
+        for url in urls:
+            engine = create_engine(url)
+            db.Model.metadata.create_all(engine)
+            engine.execute(Location.__table__.insert(), id=1, state='CA', city='San Francisco')
+            engine.execute(Venue.__table__.insert(), id=1, name='The Room', city='San Francisco',
+                           state='CA', address='1 Main St', genres=['Jazz'], seeking_talent=False,
+                           location_id=1, version=1)
+            engine.dispose()
+        return app
+
+    def test_fragment_from_lagging_replica_not_cached(self):
+        from models import Venue
+        app = self.replicated_app()
+        res = app.test_client().patch('/venues/1', json={'version': 1, 'name': 'The New Room'})
+        self.assertEqual(res.status_code, 200)
+
+        # another client, on the replica, which has not seen the edit yet
+        self.assertIn(b'The Room', app.test_client().get('/venues/1').data)
+        self.replica.execute(Venue.__table__.update().where(Venue.id == 1).values(
+            name='The New Room', version=2))
+
+        self.assertIn(b'The New Room', app.test_client().get('/venues/1').data)
+
+    def test_fragment_from_replica_cached_after_lag(self):
+        app = self.replicated_app()
+        cache = app.extensions['fragment_cache']
+        app.test_client().patch('/venues/1', json={'version': 1, 'name': 'The New Room'})
+        cache.replica_lag = 0
+        for _ in range(2):
+            app.test_client().get('/venues/1')
+
+        self.assertEqual(cache.stats()['venue_detail']['hits'], 1)
+
+
+class OnlineMigrationsTestCase(unittest.TestCase):
+    """The migration helpers on a database of their own"""
+
+    def setUp(self):
+        from alembic.migration import MigrationContext
+        from alembic.operations import Operations
+        from sqlalchemy import create_engine
+
+        self.engine = create_engine('sqlite://')
+        self.connection = self.engine.connect()
+        self.connection.execute(
+            'CREATE TABLE show (venue_id INTEGER, artist_id INTEGER, start_time TEXT, '
+            'ends_at TEXT, PRIMARY KEY (venue_id, artist_id, start_time))')
+        self.connection.execute(
+            'INSERT INTO show (venue_id, artist_id, start_time) VALUES (?, ?, ?)',
+            [(v, a, '2026-10-{:02d} 20:00'.format(d))
+             for v in range(1, 6) for a in range(1, 11) for d in range(1, 51)])
+        context = MigrationContext.configure(self.connection)
+        self.operations = Operations.context(context)
+        self.operations.__enter__()
+
+    def tearDown(self):
+        self.operations.__exit__(None, None, None)
+        self.connection.close()
+
+    def scalar(self, sql):
+        return self.connection.execute(sql).scalar()
+
+    def test_backfill_in_batches(self):
+        from online_migrations import backfill
+        from sqlalchemy import event
+        updates = []
+
+        @event.listens_for(self.engine, 'before_cursor_execute')
+        def count(conn, cursor, statement, *args):
+            if statement.startswith('UPDATE'):
+                updates.append(statement)
+
+        with self.assertLogs('alembic.online', 'INFO') as logs:
+            backfill('show', "ends_at = start_time || ' +3h'", where='ends_at IS NULL',
+                     key=('venue_id', 'artist_id', 'start_time'), batch_size=1000,
+                     progress_every=0)
+
+        self.assertEqual(self.scalar('SELECT count(*) FROM show WHERE ends_at IS NULL'), 0)
+        self.assertEqual(self.scalar("SELECT ends_at FROM show WHERE venue_id = 5 "
+                                     "AND artist_id = 10 AND start_time = '2026-10-50 20:00'"),
+                         '2026-10-50 20:00 +3h')
+        self.assertEqual(len(updates), 3)
+        self.assertIn('backfill show: 1,000/2,500 rows (40.0%)', logs.output[0])
+        self.assertIn('backfill show: 2,500 rows in', logs.output[-1])
+
+    def test_set_not_null(self):
+        from online_migrations import backfill, set_not_null
+        from sqlalchemy import exc
+        backfill('show', "ends_at = start_time", key=('venue_id', 'artist_id', 'start_time'))
+        set_not_null('show', 'ends_at')
+
+        with self.assertRaises(exc.IntegrityError):
+            self.connection.execute(
+                "INSERT INTO show (venue_id, artist_id, start_time) VALUES (9, 9, 'x')")
+
+    def test_create_and_drop_index(self):
+        from online_migrations import create_index, drop_index
+        indexes = "SELECT count(*) FROM sqlite_master WHERE name = 'ix_show_artist_id'"
+        create_index('ix_show_artist_id', 'show', ['artist_id'])
+        self.assertEqual(self.scalar(indexes), 1)
+        drop_index('ix_show_artist_id', 'show')
+        self.assertEqual(self.scalar(indexes), 0)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
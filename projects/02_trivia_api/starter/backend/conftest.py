@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from fsnd_common import testing
+
+# models reads DATABASE_URL when it is imported
+os.environ['DATABASE_URL'] = testing.database_url('trivia')
+SEED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from flaskr import create_app
+    from models import db, Question, Category
+
+    app = create_app()
+    with app.app_context():
+        testing.prepare(db.engine)
+        testing.seed(db, Category.__table__, testing.copy_rows(SEED, 'categories'))
+        testing.seed(db, Question.__table__, testing.copy_rows(SEED, 'questions'))
+    return app
+
+
+@pytest.fixture(autouse=True)
+def transaction(app):
+    from models import db
+
+    app.extensions['response_cache'].clear()
+    with app.app_context(), testing.rollback(db) as session:
+        yield session
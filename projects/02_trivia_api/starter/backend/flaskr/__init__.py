@@ -1,10 +1,19 @@
 import os
-from flask import Flask, request, abort, jsonify
+import sys
+from flask import Flask, request, abort
 from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', '..'))
+if ROOT_DIR not in sys.path:
+  sys.path.append(ROOT_DIR)
+
+from models import db, setup_db, Question, Category
+from fsnd_common.cors import init_cors
+from fsnd_common.logs import init_logging
+from fsnd_common.metrics import init_metrics
+from fsnd_common.profiling import init_profiling
+from fsnd_common.responses import ENCODINGS, init_responses, jsonify
 
 QUESTIONS_PER_PAGE = 10
 
@@ -21,23 +30,44 @@ def paginate_questions(request, selection):
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
+  if test_config is not None:
+    app.config.update(test_config)
+  setup_db(app, create_all=app.config.get('CREATE_ALL', True))
+
+  '''
+  GET requests read from a replica when SQLALCHEMY_REPLICA_URIS (or
+  DATABASE_REPLICA_URLS) lists any (see fsnd_common/replicas.py)
+  '''
+  if app.config.get('SQLALCHEMY_REPLICA_URIS', os.environ.get('DATABASE_REPLICA_URLS')):
+    from fsnd_common.replicas import init_replicas
+    init_replicas(app, db)
+  responses = init_responses(app)
   
   '''
-  Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
+  Set up CORS. Allow '*' for origins. Preflights are answered before routing
+  and every response gets the Access-Control-Allow-* headers exactly once
+  (see fsnd_common/cors.py)
+  '''
+  init_cors(app)
+
+  '''
+  Log JSON lines (request id, latency, SQL count) through a background
+  thread, to LOG_FILE when it is set and stderr otherwise
+  (see fsnd_common/logs.py)
+  '''
+  init_logging(app)
+
+  '''
+  Request latency, SQL and response cache metrics, served in the Prometheus
+  text format on /metrics (see fsnd_common/metrics.py)
   '''
-  CORS(app)
+  init_metrics(app)
 
   '''
-  Use the after_request decorator to set Access-Control-Allow
+  Profile requests slower than PROFILE_THRESHOLD_MS, only when PROFILE_DIR
+  is set (see fsnd_common/profiling.py)
   '''
-  @app.after_request
-  def after_request(response):
-      response.headers.add('Access-Control-Allow-Headers',
-                           'Content-Type, Authorization')
-      response.headers.add('Access-Control-Allow-Methods',
-                           'Get, POST, PATCH, DELETE, OPTIONS')
-      return response
+  init_profiling(app)
 
   '''
   Create an endpoint to handle GET requests 
@@ -45,18 +75,21 @@ def create_app(test_config=None):
   '''
   @app.route('/categories')
   def get_categories():
-    categories = {}
-    for category in Category.query.order_by(Category.id).all():
-      categories[category.format()['id']] = category.format()['type']
+    def build():
+      categories = {}
+      for category in Category.query.order_by(Category.id).all():
+        categories[category.format()['id']] = category.format()['type']
 
-    if len(categories) == 0:
-      abort(404)
+      if len(categories) == 0:
+        abort(404)
 
-    return jsonify({
-        'success': True,
-        'categories': categories,
-        'total_categories': len(Category.query.all())
-    })
+      return {
+          'success': True,
+          'categories': categories,
+          'total_categories': len(Category.query.all())
+      }
+
+    return responses.response('categories', build)
 
   '''
   Create an endpoint to handle GET requests for questions, 
@@ -71,25 +104,29 @@ def create_app(test_config=None):
   '''
   @app.route('/questions')
   def get_questions():
-    questions = Question.query.order_by(Question.id).all()
-    current_questions = paginate_questions(request, questions)
+    def build():
+      questions = Question.query.order_by(Question.id).all()
+      current_questions = paginate_questions(request, questions)
+
+      if len(current_questions) == 0:
+        abort(404)
 
-    if len(current_questions) == 0:
-      abort(404)
+      categories = {}
+      for category in Category.query.order_by(Category.id).all():
+        categories[category.format()['id']] = category.format()['type']
 
-    categories = {}
-    for category in Category.query.order_by(Category.id).all():
-      categories[category.format()['id']] = category.format()['type']
+      if len(categories) == 0:
+        abort(404)
 
-    if len(categories) == 0:
-      abort(404)
-    
-    return jsonify({
-      'success': True,
-      'questions': current_questions,
-      'total_questions': len(Question.query.all()),
-      'categories': categories
-    })
+      return {
+        'success': True,
+        'questions': current_questions,
+        'total_questions': len(Question.query.all()),
+        'categories': categories
+      }
+
+    page = request.args.get('page', 1, type=int)
+    return responses.response(('questions', page), build)
 
   '''
   Create an endpoint to DELETE question using a question ID. 
@@ -101,13 +138,14 @@ def create_app(test_config=None):
   def delete_question(question_id):
     try:
       question = Question.query.get(question_id).delete()
+      responses.clear()
       return jsonify({
         'success': True,
         'deleted': question_id,
         'total_questions': len(Question.query.all())
         })
-    except Exception as error:
-      print("\nerror => {}\n".format(error))
+    except Exception:
+      app.logger.exception('request failed')
       abort(422)
 
   '''
@@ -151,13 +189,14 @@ def create_app(test_config=None):
       else:
         newQuestion = Question(question, answer, difficulty, category)
         newQuestion.insert()
+        responses.clear()
 
         return jsonify({
           'success': True,
           'question_created': newQuestion.format()
         })
-    except Exception as error:
-      print("\nerror => {}\n".format(error))
+    except Exception:
+      app.logger.exception('request failed')
       abort(422)
 
 
@@ -170,14 +209,18 @@ def create_app(test_config=None):
   '''
   @app.route('/categories/<int:category_id>/questions')
   def get_questions_by_category(category_id):
-    questions = Question.query.filter_by(category=category_id).all()
-    current_questions = paginate_questions(request, questions)
+    def build():
+      questions = Question.query.filter_by(category=category_id).all()
+      current_questions = paginate_questions(request, questions)
 
-    return jsonify({
-        'success': True,
-        'questions': current_questions,
-        'total_questions': len(current_questions)
-    })
+      return {
+          'success': True,
+          'questions': current_questions,
+          'total_questions': len(current_questions)
+      }
+
+    page = request.args.get('page', 1, type=int)
+    return responses.response(('category', category_id, page), build)
 
   '''
   Create a POST endpoint to get questions to play the quiz. 
@@ -207,7 +250,7 @@ def create_app(test_config=None):
 
       formatted_questions = [question.format() for question in questions]
 
-      print('previous questions', previous_questions)
+      app.logger.debug('previous questions: %s', previous_questions)
 
       possible_questions = []
       for q in formatted_questions:
@@ -230,8 +273,8 @@ def create_app(test_config=None):
         'quizCategory': quiz_category
       })
     
-    except Exception as error:
-      print("\nerror => {}\n".format(error))
+    except Exception:
+      app.logger.exception('request failed')
       abort(422)
 
   '''
@@ -256,4 +299,12 @@ def create_app(test_config=None):
   
   return app
 
-    
+
+def warm_up(app):
+  # Serves the cacheable endpoints once in every encoding, so the mappers are
+  # configured, the dialect initialized and the response cache filled before
+  # the workers that inherit them are forked (see wsgi.py).
+  client = app.test_client()
+  for path in ('/categories', '/questions'):
+    for encoding in ('identity',) + ENCODINGS:
+      client.get(path, headers={'Accept-Encoding': encoding})
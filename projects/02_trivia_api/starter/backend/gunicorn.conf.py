@@ -0,0 +1,62 @@
+'''
+gunicorn settings for wsgi.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker logs how long after the fork it was ready to serve and how
+long its first request took. Workers write their metrics to METRICS_DIR,
+so /metrics reports the sum over all of them.
+'''
+import multiprocessing
+import os
+import tempfile
+import time
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'trivia-metrics'))
+
+
+def on_starting(server):
+    # runs after the app is preloaded: drops the files of the last run and
+    # the master's warm-up requests
+    from fsnd_common.metrics import clear_directory
+    clear_directory(os.environ['METRICS_DIR'])
+
+
+def when_ready(server):
+    import wsgi
+    server.log.info('app built and warmed up in %.1fms',
+                    wsgi.boot_seconds * 1000)
+
+
+def pre_fork(server, worker):
+    # runs in the master; the worker object is copied into the child
+    worker.forked_at = time.perf_counter()
+
+
+def post_fork(server, worker):
+    import wsgi
+    from fsnd_common.prefork import dispose_after_fork
+    for engine in [wsgi.engine] + wsgi.replica_engines:
+        dispose_after_fork(engine)
+
+
+def post_worker_init(worker):
+    worker.log.info('worker %s ready %.1fms after fork', worker.pid,
+                    (time.perf_counter() - worker.forked_at) * 1000)
+
+
+def pre_request(worker, req):
+    worker.request_started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    if not getattr(worker, 'served', False):
+        worker.served = True
+        worker.log.info('worker %s first request %s %s in %.1fms',
+                        worker.pid, req.method, req.path,
+                        (time.perf_counter() - worker.request_started) * 1000)
@@ -4,20 +4,24 @@ from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    "DATABASE_URL", "postgres://{}/{}".format('localhost:5432', database_name))
 
 db = SQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    create_all=False skips creating missing tables, which costs a round
+    trip per table
 '''
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, create_all=True):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
-    db.create_all()
+    if create_all:
+        db.create_all()
 
 '''
 Question
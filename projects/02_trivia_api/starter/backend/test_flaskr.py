@@ -1,23 +1,27 @@
 import os
+import sys
+import gzip
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+import pytest
+
+from models import Question, Category
+from fsnd_common import testing
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
-    def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
-        self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+    @pytest.fixture(autouse=True)
+    def use_app(self, app):
+        """The app is built and seeded once per session (see conftest.py);
+        each test runs in a transaction that is rolled back."""
+        self.app = app
+        self.client = app.test_client
 
+    def setUp(self):
+        """Define test variables."""
         self.new_question = {
             'question': 'What display technology does Kindle use?',
             'answer': 'ELink',
@@ -29,16 +33,8 @@ class TriviaTestCase(unittest.TestCase):
             'searchTerm': 'boxer'
         }
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
-    def tearDown(self):
-        """Executed after reach test"""
-        pass
+    def metric(self, sample):
+        return testing.metric(self.client(), sample)
 
     """
     TODO
@@ -78,6 +74,101 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(res.status_code, 404)
         self.assertEqual(data['success'], False)
 
+    def test_get_paginated_questions_gzip(self):
+        res = self.client().get('/questions', headers={'Accept-Encoding': 'gzip'})
+        data = json.loads(gzip.decompress(res.data))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['questions']))
+
+    def test_cached_questions_cleared_by_new_question(self):
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+        self.client().post('/questions', json=self.new_question)
+        data = json.loads(self.client().get('/questions').data)
+
+        self.assertEqual(data['total_questions'], total + 1)
+
+    def test_cors_preflight(self):
+        res = self.client().options('/questions', headers={
+            'Origin': 'http://localhost:3000',
+            'Access-Control-Request-Method': 'POST'})
+
+        self.assertEqual(res.status_code, 204)
+        self.assertEqual(res.headers['Access-Control-Allow-Origin'], '*')
+        self.assertTrue(res.headers['Access-Control-Max-Age'])
+        self.assertEqual(len(res.headers.getlist('Access-Control-Allow-Methods')), 1)
+
+    def test_cors_headers_not_duplicated(self):
+        res = self.client().get('/categories', headers={'Origin': 'http://localhost:3000'})
+
+        self.assertEqual(res.headers.getlist('Access-Control-Allow-Origin'), ['*'])
+
+    def test_request_logged_as_json(self):
+        self.addCleanup(self.app.config.__setitem__, 'LOG_REQUESTS', self.app.config['LOG_REQUESTS'])
+        self.app.config['LOG_REQUESTS'] = True
+        with testing.captured_logs(self.app) as lines:
+            res = self.client().get('/questions', headers={'X-Request-ID': 'req-1'})
+
+        self.assertEqual(res.headers['X-Request-ID'], 'req-1')
+        entry, = [line for line in lines if line.get('status')]
+        self.assertEqual(entry['request_id'], 'req-1')
+        self.assertEqual(entry['message'], 'GET /questions 200')
+        self.assertGreater(entry['sql_count'], 0)
+        self.assertGreaterEqual(entry['latency_ms'], 0)
+
+    def test_request_not_logged_by_default(self):
+        with testing.captured_logs(self.app) as lines:
+            self.client().get('/questions')
+
+        self.assertEqual([line for line in lines if line.get('status')], [])
+
+    def test_request_id_generated(self):
+        first = self.client().get('/categories').headers['X-Request-ID']
+        second = self.client().get('/categories').headers['X-Request-ID']
+
+        self.assertTrue(first)
+        self.assertNotEqual(first, second)
+
+    def test_error_logged_with_traceback(self):
+        with testing.captured_logs(self.app) as lines:
+            res = self.client().delete('/questions/1000000', headers={'X-Request-ID': 'req-2'})
+
+        self.assertEqual(res.status_code, 422)
+        entry, = [line for line in lines if line['level'] == 'ERROR']
+        self.assertEqual(entry['request_id'], 'req-2')
+        self.assertIn('Traceback', entry['exc'])
+
+    def test_metrics_exposed(self):
+        requests = 'http_requests_total{endpoint="get_questions",method="GET",status="200"}'
+        latency = 'http_request_duration_seconds_count{endpoint="get_questions",method="GET"}'
+        statements = 'db_statements_total{endpoint="get_questions"}'
+        before = [self.metric(sample) for sample in (requests, latency, statements)]
+
+        self.client().get('/questions')
+        self.client().get('/questions')
+
+        after = [self.metric(sample) for sample in (requests, latency, statements)]
+        self.assertEqual(after[0] - before[0], 2)
+        self.assertEqual(after[1] - before[1], 2)
+        self.assertGreater(after[2], before[2])
+        res = self.client().get('/metrics')
+        self.assertTrue(res.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE http_request_duration_seconds histogram', res.data)
+
+    def test_metrics_count_response_cache_hits(self):
+        hit = 'cache_requests_total{cache="response",name="categories",result="hit"}'
+        miss = 'cache_requests_total{cache="response",name="categories",result="miss"}'
+        hits, misses = self.metric(hit), self.metric(miss)
+
+        for _ in range(3):
+            self.client().get('/categories')
+
+        self.assertEqual(self.metric(miss) - misses, 1)
+        self.assertEqual(self.metric(hit) - hits, 2)
+
     def test_delete_question(self):
         res = self.client().delete('/questions/5')
         data = json.loads(res.data)
@@ -108,4 +199,4 @@ class TriviaTestCase(unittest.TestCase):
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
-    unittest.main()
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,30 @@
+'''
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master, so the app is built,
+and warmed up, once, and every worker is forked from it.
+'''
+import time
+
+started = time.perf_counter()
+
+from flaskr import create_app, warm_up
+from models import db
+from fsnd_common.prefork import register_fork_guard
+
+# The tables are created from trivia.psql, not on every boot.
+app = create_app({'CREATE_ALL': False})
+with app.app_context():
+    engine = db.engine
+replicas = app.extensions.get('replicas')
+replica_engines = replicas.engines() if replicas else []
+for each in [engine] + replica_engines:
+    register_fork_guard(each)
+warm_up(app)
+# Nothing the workers inherit may hold a connection.
+for each in [engine] + replica_engines:
+    each.dispose()
+
+boot_seconds = time.perf_counter() - started
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from fsnd_common import testing
+
+# src.database.models reads DATABASE_URL when it is imported
+os.environ['DATABASE_URL'] = testing.database_url('coffee')
+
+# The roles the tests send tokens for, and their permissions.
+TOKENS = {
+    'barista': ['get:drinks-detail'],
+    'manager': ['get:drinks-detail', 'post:drinks', 'patch:drinks',
+                'delete:drinks'],
+}
+
+DRINKS = [
+    {'id': 1, 'title': 'water',
+     'recipe': json.dumps([{'name': 'water', 'color': 'blue', 'parts': 1}])},
+    {'id': 2, 'title': 'flatwhite',
+     'recipe': json.dumps([{'name': 'milk', 'color': 'grey', 'parts': 1},
+                           {'name': 'coffee', 'color': 'brown', 'parts': 1}])},
+]
+
+
+@pytest.fixture(scope='session')
+def signing_key(tmp_path_factory):
+    # Tokens are signed locally; the public key is pinned through
+    # AUTH0_JWKS_FILE, so verification never contacts Auth0.
+    pem, jwks = testing.rsa_keys('coffee-test')
+    path = tmp_path_factory.mktemp('auth') / 'jwks.json'
+    path.write_text(json.dumps(jwks))
+    os.environ['AUTH0_JWKS_FILE'] = str(path)
+    return pem, 'coffee-test'
+
+
+@pytest.fixture(scope='session')
+def app(signing_key):
+    # importing the api drops and creates the tables
+    from src.api import app
+    from src.database.models import db, Drink
+
+    with app.app_context():
+        testing.prepare(db.engine)
+        testing.seed(db, Drink.__table__, DRINKS)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def transaction(app):
+    from src.database.models import db
+
+    app.extensions['response_cache'].clear()
+    with app.app_context(), testing.rollback(db) as session:
+        yield session
+
+
+@pytest.fixture
+def tokens(app, signing_key):
+    from src.auth import auth
+
+    def mint(permissions, pem=signing_key[0], kid=signing_key[1], **claims):
+        return testing.mint_token(pem, kid, auth.auth.issuer,
+                                  auth.API_AUDIENCE, permissions, **claims)
+    tokens = {role: mint(permissions) for role, permissions in TOKENS.items()}
+    tokens['mint'] = mint
+    tokens['keys'] = auth.auth.keys
+    return tokens
@@ -1,5 +1,4 @@
-import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
@@ -7,9 +6,21 @@ from flask_cors import CORS
 from .database.models import db_drop_and_create_all, setup_db, Drink
 from .auth.auth import AuthError, requires_auth
 
+from fsnd_common.logs import init_logging
+from fsnd_common.metrics import init_metrics
+from fsnd_common.profiling import init_profiling
+from fsnd_common.responses import init_responses, jsonify
+
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+responses = init_responses(app)
+# JSON log lines with request id, latency and SQL count (fsnd_common/logs.py)
+init_logging(app)
+# request, SQL, token verification and cache metrics on /metrics
+init_metrics(app)
+# slow request profiles, when PROFILE_DIR is set
+init_profiling(app)
 
 '''
 Uncomment the following line to initialize the datbase
@@ -29,14 +40,16 @@ db_drop_and_create_all()
 '''
 @app.route('/drinks')
 def get_drinks():
-    drinks_list = Drink.query.all()
-    drinks = []
-    for drink in drinks_list:
-        drinks.append(drink.short())
-    return jsonify({
-        "success": True, 
-        "drinks": drinks
-    })
+    def build():
+        drinks_list = Drink.query.all()
+        drinks = []
+        for drink in drinks_list:
+            drinks.append(drink.short())
+        return {
+            "success": True,
+            "drinks": drinks
+        }
+    return responses.response('drinks', build)
 
 '''
 @TODO implement endpoint
@@ -49,14 +62,16 @@ def get_drinks():
 @app.route('/drinks-detail')
 @requires_auth(permission='get:drinks-detail')
 def get_drinks_detail(jwt):
-    drinks_list = Drink.query.all()
-    drinks = []
-    for drink in drinks_list:
-        drinks.append(drink.long())
-    return jsonify({
-        "success": True, 
-        "drinks": drinks
-    })
+    def build():
+        drinks_list = Drink.query.all()
+        drinks = []
+        for drink in drinks_list:
+            drinks.append(drink.long())
+        return {
+            "success": True,
+            "drinks": drinks
+        }
+    return responses.response('drinks-detail', build)
 
 
 '''
@@ -78,6 +93,7 @@ def create_drinks(jwt):
         abort(422)
     drink = Drink(title=body.get('title'), recipe=json.dumps([body.get('recipe')]))
     drink.insert()
+    responses.clear()
 
     return jsonify({
         "success": True,
@@ -107,6 +123,7 @@ def edit_drinks(jwt, id):
     if (body.get('recipe') is not None):
         drink.recipe = json.dumps([body.get('recipe')])
     drink.update()
+    responses.clear()
     return jsonify({"success": True, "drinks": [drink.long()]})
 
 '''
@@ -127,6 +144,7 @@ def delete_drinks(jwt, id):
         abort(404)
     id = drink.id
     drink.delete()
+    responses.clear()
     return jsonify({"success": True, "delete": id})
 
 
@@ -171,6 +189,7 @@ Implement error handler for AuthError
 '''
 @app.errorhandler(AuthError)
 def autherror(error):
+    app.logger.info('auth rejected: %s', error.error["code"])
     return jsonify({
         "success": False,
         "code": error.status_code,
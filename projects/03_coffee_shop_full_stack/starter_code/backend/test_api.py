@@ -0,0 +1,156 @@
+import json
+import sys
+import unittest
+
+import pytest
+
+from fsnd_common import testing
+
+
+class CoffeeShopTestCase(unittest.TestCase):
+    """This class represents the coffee shop test case"""
+
+    @pytest.fixture(autouse=True)
+    def use_app(self, app, tokens):
+        """The app is built and seeded once per session (see conftest.py);
+        each test runs in a transaction that is rolled back."""
+        self.client = app.test_client
+        self.mint = tokens['mint']
+        self.keys = tokens['keys']
+        self.manager = self.bearer(tokens['manager'])
+        self.barista = self.bearer(tokens['barista'])
+
+    def bearer(self, token):
+        return {'Authorization': 'Bearer ' + token}
+
+    def metric(self, sample):
+        return testing.metric(self.client(), sample)
+
+    def setUp(self):
+        self.new_drink = {
+            'title': 'matcha shake',
+            'recipe': {'name': 'matcha', 'color': 'green', 'parts': 1}
+        }
+
+    def test_get_drinks(self):
+        res = self.client().get('/drinks')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(len(data['drinks']), 2)
+        self.assertNotIn('name', data['drinks'][0]['recipe'][0])
+
+    def test_get_drinks_detail(self):
+        res = self.client().get('/drinks-detail', headers=self.barista)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'][0]['recipe'][0]['name'], 'water')
+
+    def test_get_drinks_detail_without_token(self):
+        res = self.client().get('/drinks-detail')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(data['success'], False)
+
+    def test_get_drinks_detail_with_invalid_token(self):
+        res = self.client().get('/drinks-detail',
+                                headers={'Authorization': 'Bearer forged'})
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_get_drinks_detail_with_expired_token(self):
+        token = self.mint(['get:drinks-detail'], expires_in=-60)
+        res = self.client().get('/drinks-detail', headers=self.bearer(token))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(data['error'], 'token_expired')
+
+    def test_get_drinks_detail_with_wrong_audience(self):
+        token = self.mint(['get:drinks-detail'], aud='image')
+        res = self.client().get('/drinks-detail', headers=self.bearer(token))
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_auth_verification_timed(self):
+        ok = 'auth_verification_duration_seconds_count{outcome="ok"}'
+        expired = 'auth_verification_duration_seconds_count{outcome="token_expired"}'
+        before = self.metric(ok), self.metric(expired)
+
+        self.client().get('/drinks-detail', headers=self.barista)
+        self.client().get('/drinks-detail', headers=self.bearer(
+            self.mint(['get:drinks-detail'], expires_in=-60)))
+
+        self.assertEqual(self.metric(ok) - before[0], 1)
+        self.assertEqual(self.metric(expired) - before[1], 1)
+
+    def test_rotated_signing_key(self):
+        with open(self.keys.path) as f:
+            pinned = f.read()
+        pem, jwks = testing.rsa_keys('rotated')
+        token = self.mint(['get:drinks-detail'], pem=pem, kid='rotated')
+        try:
+            with open(self.keys.path, 'w') as f:
+                json.dump(jwks, f)
+            # what the watcher thread does when it sees the file change; it
+            # may get there first, so check the keys rather than the result
+            self.keys.reload()
+            self.assertIsNotNone(self.keys.get('rotated'))
+
+            res = self.client().get('/drinks-detail', headers=self.bearer(token))
+            self.assertEqual(res.status_code, 200)
+            res = self.client().get('/drinks-detail', headers=self.barista)
+            self.assertEqual(res.status_code, 401)
+        finally:
+            with open(self.keys.path, 'w') as f:
+                f.write(pinned)
+            self.keys.reload()
+
+    def test_post_drink(self):
+        res = self.client().post('/drinks', json=self.new_drink,
+                                 headers=self.manager)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'][0]['title'], 'matcha shake')
+
+        drinks = json.loads(self.client().get('/drinks').data)['drinks']
+        self.assertEqual(len(drinks), 3)
+
+    def test_post_drink_without_permission(self):
+        res = self.client().post('/drinks', json=self.new_drink,
+                                 headers=self.barista)
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_patch_drink(self):
+        res = self.client().patch('/drinks/1', json={'title': 'sparkling'},
+                                  headers=self.manager)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'][0]['title'], 'sparkling')
+
+    def test_patch_missing_drink(self):
+        res = self.client().patch('/drinks/1000', json={'title': 'x'},
+                                  headers=self.manager)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_delete_drink(self):
+        res = self.client().delete('/drinks/2', headers=self.manager)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['delete'], 2)
+
+        drinks = json.loads(self.client().get('/drinks').data)['drinks']
+        self.assertEqual([drink['id'] for drink in drinks], [1])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
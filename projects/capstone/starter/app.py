@@ -1,12 +1,25 @@
 import os
+import sys
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
+# fsnd_common lives at the repository root
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from fsnd_common.metrics import init_metrics
+from fsnd_common.profiling import init_profiling
+
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
   CORS(app)
+  # request metrics on /metrics (see fsnd_common/metrics.py)
+  init_metrics(app)
+  # slow request profiles, when PROFILE_DIR is set
+  init_profiling(app)
 
   return app
 